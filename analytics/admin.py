@@ -1,3 +1,57 @@
 from django.contrib import admin
+from users.models import User
+from whatsapp_analytics.paginators import EstimatedCountPaginator
+from .models import GroupStatistics, UserDailyStatistics, UserStatistics
+from .rollups import DailyRollupService
+from .services import AnalyticsService
 
-# Register your models here.
+
+@admin.action(description='Recompute statistics of the selected users')
+def recompute_user_statistics(modeladmin, request, queryset):
+    """Works for any admin whose rows are users or belong to one; runs in batches of ANALYTICS_MAX_BATCH_USERS."""
+    user_field = 'pk' if queryset.model is User else 'user_id'
+    refreshed = AnalyticsService().refresh_user_statistics(
+        list(queryset.order_by().values_list(user_field, flat=True).distinct())
+    )
+    modeladmin.message_user(request, f'Recomputed statistics of {refreshed} users.')
+
+
+@admin.action(description='Recompute the daily rollups of the selected dates')
+def recompute_daily_rollups(modeladmin, request, queryset):
+    days = set(queryset.order_by().values_list('date', flat=True).distinct())
+    DailyRollupService().refresh_days(days)
+    modeladmin.message_user(request, f'Recomputed the rollups of {len(days)} days.')
+
+
+@admin.register(UserStatistics)
+class UserStatisticsAdmin(admin.ModelAdmin):
+    list_display = (
+        'user', 'total_messages', 'media_messages', 'active_days',
+        'avg_message_length', 'peak_activity_hour', 'last_calculated'
+    )
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [recompute_user_statistics]
+
+
+@admin.register(GroupStatistics)
+class GroupStatisticsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'total_messages', 'active_users', 'media_count', 'peak_hour')
+    fields = ('date', 'total_messages', 'active_users', 'media_count', 'peak_hour', 'hourly_counts')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+    actions = [recompute_daily_rollups]
+
+
+@admin.register(UserDailyStatistics)
+class UserDailyStatisticsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'user', 'message_count', 'media_count', 'text_count', 'text_length')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [recompute_daily_rollups, recompute_user_statistics]
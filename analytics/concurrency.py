@@ -0,0 +1,60 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, List, Optional
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ANALYTICS_QUERY_WORKERS,
+                thread_name_prefix='analytics-query'
+            )
+        return _executor
+
+
+def run_concurrently(*calls: Callable) -> List:
+    """Run independent read-only callables at the same time and return their results in order.
+
+    Each call runs on a pool thread with its own database connection, so
+    an action waits for its slowest query instead of the sum of them. The
+    caller's ``execute_wrapper`` hooks (query timing, profiling) and
+    context variables (the replica read routing) carry over to the pool.
+
+    Calls run one after another on the caller's connection when the pool
+    is disabled (``ANALYTICS_QUERY_WORKERS`` below 2) or inside a
+    transaction, whose uncommitted rows other connections cannot see.
+    """
+    if (len(calls) < 2 or settings.ANALYTICS_QUERY_WORKERS < 2
+            or any(connection.in_atomic_block for connection in connections.all())):
+        return [call() for call in calls]
+
+    wrappers = {
+        connection.alias: list(connection.execute_wrappers) for connection in connections.all()
+    }
+    executor = _get_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, _run_with_wrappers, call, wrappers)
+        for call in calls
+    ]
+    return [future.result() for future in futures]
+
+
+def _run_with_wrappers(call: Callable, wrappers: dict):
+    try:
+        with ExitStack() as stack:
+            for alias, hooks in wrappers.items():
+                for hook in hooks:
+                    stack.enter_context(connections[alias].execute_wrapper(hook))
+            return call()
+    finally:
+        # Pool threads never see request_finished; honour CONN_MAX_AGE here instead
+        close_old_connections()
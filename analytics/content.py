@@ -0,0 +1,191 @@
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from django.db import transaction
+from django.db.models import Q, Sum
+from whatsapp_messages import partitions
+from whatsapp_messages.models import Message
+from .models import TermFrequency
+from .sketches import FrequentItems
+
+# Number of counters kept per (user, month, kind) bucket; all of them are persisted
+# with the bucket's floor so imports can keep merging into the stored sketch.
+SKETCH_CAPACITY = 1000
+# Most terms of each kind the API serves.
+TERMS_PER_BUCKET = 200
+
+GROUP = None
+
+URL_PATTERN = re.compile(r'(?:https?://|www\.)[^\s<>"]+', re.IGNORECASE)
+EMOJI_PATTERN = re.compile(
+    r'(?:[\U0001F1E6-\U0001F1FF]{2}'
+    r'|[\u2600-\u27BF\U0001F000-\U0001FAFF]'
+    r'[\U0001F3FB-\U0001F3FF\uFE0F]?'
+    r'(?:\u200D[\u2600-\u27BF\U0001F000-\U0001FAFF][\U0001F3FB-\U0001F3FF\uFE0F]?)*)'
+)
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have he her his i if in is it its
+    me my no not of on or our she so that the their them they this to was we
+    were what when which who will with you your am im its dont just do did
+    been can all there here than then too very
+""".split())
+
+Bucket = Tuple[Optional[str], date, str]
+
+
+class MessageTokenizer:
+    """Split message content into words, emojis and links."""
+
+    def tokenize(self, content: str) -> Dict[str, List[str]]:
+        links = [link.rstrip('.,;:!?)\'"') for link in URL_PATTERN.findall(content)]
+        text = URL_PATTERN.sub(' ', content)
+        emojis = EMOJI_PATTERN.findall(text)
+        words = [
+            word for word in (w.lower() for w in WORD_PATTERN.findall(text))
+            if len(word) > 1 and word not in STOP_WORDS
+        ]
+        return {
+            TermFrequency.WORD: words,
+            TermFrequency.EMOJI: emojis,
+            TermFrequency.LINK: [link[:200] for link in links],
+        }
+
+
+def month_of_date(value) -> date:
+    if hasattr(value, 'date'):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def count_chunk(rows: List[Tuple[str, date, str]]) -> Dict[Bucket, Counter]:
+    """Map step: count terms of ``(phone_number, local_date, content)`` rows per bucket."""
+    tokenizer = MessageTokenizer()
+    counts: Dict[Bucket, Counter] = {}
+    for phone_number, local_date, content in rows:
+        month = local_date.replace(day=1)
+        for kind, terms in tokenizer.tokenize(content).items():
+            if not terms:
+                continue
+            for owner in (phone_number, GROUP):
+                counts.setdefault((owner, month, kind), Counter()).update(terms)
+    return counts
+
+
+class ContentStatsService:
+    """Top words, emojis and links per user and per month, counted map-reduce style."""
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+
+    def reduce(self, partials: Iterable[Dict[Bucket, Counter]]) -> Dict[Bucket, FrequentItems]:
+        """Reduce step: fold per-chunk counts into one bounded summary per bucket."""
+        sketches: Dict[Bucket, FrequentItems] = {}
+        for partial in partials:
+            for bucket, counter in partial.items():
+                chunk_sketch = FrequentItems(self.capacity)
+                for term, count in counter.items():
+                    chunk_sketch.add(term, count)
+                if bucket in sketches:
+                    sketches[bucket].merge(chunk_sketch)
+                else:
+                    sketches[bucket] = chunk_sketch
+        return sketches
+
+    def rebuild(self, chunk_size: int = 5000, workers: int = 1) -> int:
+        """Recount the whole message history and replace all stored term frequencies."""
+        chunks = self._iter_chunks(chunk_size)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                sketches = self.reduce(executor.map(count_chunk, chunks))
+        else:
+            sketches = self.reduce(map(count_chunk, chunks))
+
+        with transaction.atomic():
+            TermFrequency.objects.all().delete()
+            return self._persist(sketches)
+
+    @transaction.atomic
+    def ingest(self, rows: List[Tuple[str, date, str]]) -> int:
+        """Merge an imported batch's ``(phone_number, local_date, content)`` text rows into the stored counts."""
+        if not rows:
+            return 0
+
+        sketches = self.reduce([count_chunk(rows)])
+        owners = {owner for owner, _, _ in sketches if owner is not GROUP}
+        months = {month for _, month, _ in sketches}
+
+        stored = TermFrequency.objects.filter(
+            Q(user__in=owners) | Q(user__isnull=True),
+            month__in=months
+        )
+        for bucket, sketch in self._load(stored).items():
+            if bucket in sketches:
+                sketches[bucket].merge(sketch)
+            else:
+                sketches[bucket] = sketch
+
+        stored.delete()
+        return self._persist(sketches)
+
+    def top_terms(self, user=None, date_range: tuple = None, limit: int = 20) -> dict:
+        """Return the most frequent terms of each kind for a user, or the group when ``user`` is None."""
+        terms = TermFrequency.objects.all()
+        terms = terms.filter(user=user) if user else terms.filter(user__isnull=True)
+        if date_range:
+            start_date, end_date = date_range
+            terms = terms.filter(month__range=(month_of_date(start_date), end_date))
+
+        result = {}
+        for kind, key in ((TermFrequency.WORD, 'words'),
+                          (TermFrequency.EMOJI, 'emojis'),
+                          (TermFrequency.LINK, 'links')):
+            result[key] = list(
+                terms.filter(kind=kind)
+                .values('term')
+                .annotate(count=Sum('count'))
+                .order_by('-count', 'term')[:limit]
+            )
+        return result
+
+    def _iter_chunks(self, chunk_size: int) -> Iterator[List[Tuple[str, date, str]]]:
+        rows = partitions.stream(
+            Message.objects.filter(is_media=False).values_list(
+                'sender_id', 'local_date', 'content'
+            ).order_by(),
+            chunk_size=chunk_size
+        )
+
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _load(self, queryset) -> Dict[Bucket, FrequentItems]:
+        """Rebuild the stored sketches, floor included, so new counts merge as if never persisted."""
+        sketches: Dict[Bucket, FrequentItems] = {}
+        for owner, month, kind, term, count, floor in queryset.values_list(
+            'user_id', 'month', 'kind', 'term', 'count', 'floor'
+        ):
+            sketch = sketches.get((owner, month, kind))
+            if sketch is None:
+                sketch = sketches[owner, month, kind] = FrequentItems(self.capacity)
+            sketch.counts[term] = count
+            sketch.floor = max(sketch.floor, floor)
+        return sketches
+
+    def _persist(self, sketches: Dict[Bucket, FrequentItems]) -> int:
+        rows = [
+            TermFrequency(user_id=owner, month=month, kind=kind, term=term, count=count, floor=sketch.floor)
+            for (owner, month, kind), sketch in sketches.items()
+            for term, count in sketch.counts.items()
+        ]
+        TermFrequency.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
@@ -0,0 +1,186 @@
+"""Read-only fast path for turning analytics results into JSON-ready data.
+
+``encode(SomeSerializer, data)`` returns what ``SomeSerializer(data).data``
+would, without building field instances, ``ReturnDict`` wrappers or the
+per-field ``get_attribute``/``to_representation`` dispatch on every row.
+Each serializer class is compiled once into a ``FieldMap``: a flat tuple
+of (name, getter, encoder) with dates and decimals encoded directly.
+
+The serializer classes stay the single description of each response,
+so the OpenAPI schema (built from them) and the fast path cannot drift.
+Fields without a direct encoder fall back to their own
+``to_representation``.
+"""
+import datetime
+import decimal
+import threading
+from collections.abc import Mapping
+from typing import Callable, Dict, Tuple, Type
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.manager import BaseManager
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import is_simple_callable
+from rest_framework.settings import api_settings
+
+Encoder = Callable[[object], object]
+
+# The current time zone, looked up once per ``encode`` call rather than per datetime
+_active = threading.local()
+
+
+def _getter(source_attrs) -> Callable[[object], object]:
+    """Follow ``source_attrs`` through dicts and objects like DRF's ``get_attribute``."""
+    if not source_attrs:
+        # source='*'
+        return lambda instance: instance
+
+    def get(instance):
+        for attr in source_attrs:
+            if instance is None:
+                return None
+            if type(instance) is dict or isinstance(instance, Mapping):
+                instance = instance[attr]
+            else:
+                try:
+                    instance = getattr(instance, attr)
+                except ObjectDoesNotExist:
+                    return None
+                if is_simple_callable(instance):
+                    instance = instance()
+        return instance
+
+    if len(source_attrs) == 1:
+        attr = source_attrs[0]
+
+        def get_one(instance):
+            if type(instance) is dict:
+                return instance[attr]
+            return get(instance)
+        return get_one
+    return get
+
+
+def _date_encoder(field: serializers.DateField) -> Encoder:
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+
+    def encode(value):
+        if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return field.to_representation(value)
+    return encode
+
+
+def _datetime_encoder(field: serializers.DateTimeField) -> Encoder:
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    fixed_timezone = getattr(field, 'timezone', None)
+
+    def encode(value):
+        field_timezone = fixed_timezone or getattr(_active, 'timezone', None)
+        # Naive values, and everything when USE_TZ is off, keep DRF's handling
+        if field_timezone is None or not isinstance(value, datetime.datetime) or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return encode
+
+
+def _decimal_encoder(field: serializers.DecimalField) -> Encoder:
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize:
+        return field.to_representation
+
+    def encode(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return format(field.quantize(value), 'f')
+    return encode
+
+
+def _list_encoder(child: Encoder) -> Encoder:
+    return lambda value: [None if item is None else child(item) for item in value]
+
+
+def _dict_encoder(child: Encoder) -> Encoder:
+    return lambda value: {
+        str(key): None if item is None else child(item) for key, item in value.items()
+    }
+
+
+def _field_encoder(field: serializers.Field) -> Encoder:
+    if isinstance(field, serializers.ListSerializer):
+        items = _list_encoder(_field_encoder(field.child))
+        # Related managers are read through .all(), as ListSerializer does
+        return lambda value: items(value.all() if isinstance(value, BaseManager) else value)
+    if isinstance(field, serializers.Serializer):
+        return FieldMap(field)
+    if isinstance(field, serializers.ListField):
+        return _list_encoder(_field_encoder(field.child))
+    if isinstance(field, serializers.DictField):
+        return _dict_encoder(_field_encoder(field.child))
+    # Subclasses may override to_representation, so match exact types only
+    field_type = type(field)
+    if field_type is serializers.IntegerField:
+        return int
+    if field_type is serializers.FloatField:
+        return float
+    if field_type is serializers.CharField:
+        return str
+    if field_type is serializers.BooleanField:
+        return lambda value: value if type(value) is bool else field.to_representation(value)
+    if field_type is serializers.DateField:
+        return _date_encoder(field)
+    if field_type is serializers.DateTimeField:
+        return _datetime_encoder(field)
+    if field_type is serializers.DecimalField:
+        return _decimal_encoder(field)
+    return field.to_representation
+
+
+class FieldMap:
+    """The readable fields of a serializer, compiled to (name, getter, encoder) triples."""
+
+    def __init__(self, serializer: serializers.Serializer):
+        self.fields: Tuple[tuple, ...] = tuple(
+            (field.field_name, _getter(field.source_attrs), _field_encoder(field))
+            for field in serializer.fields.values()
+            if not field.write_only
+        )
+
+    def __call__(self, instance) -> dict:
+        result = {}
+        for name, get, encode_value in self.fields:
+            value = get(instance)
+            result[name] = None if value is None else encode_value(value)
+        return result
+
+
+_field_maps: Dict[Type[serializers.Serializer], FieldMap] = {}
+_field_maps_lock = threading.Lock()
+
+
+def field_map(serializer_class: Type[serializers.Serializer]) -> FieldMap:
+    """The compiled ``FieldMap`` of ``serializer_class``, built on first use."""
+    compiled = _field_maps.get(serializer_class)
+    if compiled is None:
+        with _field_maps_lock:
+            compiled = _field_maps.get(serializer_class)
+            if compiled is None:
+                compiled = _field_maps[serializer_class] = FieldMap(serializer_class())
+    return compiled
+
+
+def encode(serializer_class: Type[serializers.Serializer], instance, many: bool = False):
+    """Equivalent of ``serializer_class(instance, many=many).data`` for read-only responses."""
+    compiled = field_map(serializer_class)
+    _active.timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+    if many:
+        return [compiled(item) for item in instance]
+    return compiled(instance)
@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from whatsapp_messages import partitions
+from whatsapp_messages.models import Message
+from users.models import User
+from .models import AnalyticsCursor, Interaction
+
+CURSOR_NAME = 'interaction_graph'
+
+Edge = Tuple[str, str]
+
+
+class DecayedWeight:
+    """Exponentially decayed counter, stored as a weight valued at a reference time."""
+
+    __slots__ = ('count', 'weight', 'at')
+
+    def __init__(self, count: int = 0, weight: float = 0.0, at: Optional[datetime] = None):
+        self.count = count
+        self.weight = weight
+        self.at = at
+
+    def value_at(self, when: datetime, half_life: timedelta) -> float:
+        if self.at is None:
+            return 0.0
+        return self.weight * 0.5 ** ((when - self.at) / half_life)
+
+    def add(self, when: datetime, half_life: timedelta, count: int = 1, weight: float = 1.0) -> None:
+        if self.at is not None and when < self.at:
+            # Fold an older contribution in at the current reference time
+            self.weight += weight * 0.5 ** ((self.at - when) / half_life)
+        else:
+            self.weight = self.value_at(when, half_life) + weight
+            self.at = when
+        self.count += count
+
+
+class InteractionGraphBuilder:
+    """Single streaming pass that pairs each message with the previous one of another sender."""
+
+    def __init__(self, reply_window: timedelta, half_life: timedelta,
+                 last: Optional[Tuple[datetime, str]] = None):
+        self.reply_window = reply_window
+        self.half_life = half_life
+        self.last = last
+        self.edges: Dict[Edge, DecayedWeight] = {}
+
+    def feed(self, timestamp: datetime, sender: str) -> None:
+        if self.last is not None:
+            last_timestamp, last_sender = self.last
+            if sender != last_sender and timestamp - last_timestamp <= self.reply_window:
+                self.edges.setdefault((sender, last_sender), DecayedWeight()).add(
+                    timestamp, self.half_life
+                )
+        self.last = (timestamp, sender)
+
+    def consume(self, messages: Iterable[tuple]) -> None:
+        for timestamp, sender in messages:
+            self.feed(timestamp, sender)
+
+
+class InteractionGraphService:
+    """Maintain the sparse sender x sender reply graph and answer partner queries from it."""
+
+    def __init__(self):
+        self.reply_window = timedelta(minutes=settings.ANALYTICS_REPLY_WINDOW_MINUTES)
+        self.half_life = timedelta(days=settings.ANALYTICS_INTERACTION_HALF_LIFE_DAYS)
+
+    def rebuild(self) -> int:
+        with transaction.atomic():
+            Interaction.objects.all().delete()
+            AnalyticsCursor.objects.filter(name=CURSOR_NAME).delete()
+            return self.update()
+
+    @transaction.atomic
+    def update(self, since: Optional[datetime] = None) -> int:
+        """Fold messages newer than the cursor into the graph.
+
+        Falls back to a full rebuild when ``since`` lies before the cursor,
+        i.e. when older history was imported after newer history.
+        """
+        cursor, _ = AnalyticsCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+        if since is not None and cursor.position is not None and since < cursor.position:
+            return self.rebuild()
+
+        seen_ids = set(cursor.state.get('ids_at_position', []))
+        last = None
+        if cursor.state.get('last_sender'):
+            last = (cursor.position, cursor.state['last_sender'])
+
+        messages = Message.objects.order_by('timestamp', 'id')
+        first_day = None
+        if cursor.position is not None:
+            messages = messages.filter(timestamp__gte=cursor.position)
+            first_day = timezone.localdate(cursor.position)
+
+        builder = InteractionGraphBuilder(self.reply_window, self.half_life, last)
+        position, ids_at_position = cursor.position, seen_ids
+        for message_id, timestamp, sender in partitions.stream(
+            messages.values_list('id', 'timestamp', 'sender_id'), first_day, key=itemgetter(1)
+        ):
+            if str(message_id) in seen_ids:
+                continue
+            builder.feed(timestamp, sender)
+            if timestamp != position:
+                position, ids_at_position = timestamp, set()
+            ids_at_position.add(str(message_id))
+
+        if builder.last is not None:
+            cursor.position = position
+            cursor.state = {
+                'last_sender': builder.last[1],
+                'ids_at_position': sorted(ids_at_position),
+            }
+            cursor.save()
+        return self._merge(builder.edges)
+
+    def _merge(self, edges: Dict[Edge, DecayedWeight]) -> int:
+        if not edges:
+            return 0
+
+        sources = {source for source, _ in edges}
+        stored = Interaction.objects.filter(source__in=sources).values_list(
+            'source_id', 'target_id', 'reply_count', 'weight', 'weight_at'
+        )
+        for source, target, count, weight, weight_at in stored:
+            edge = edges.get((source, target))
+            if edge is not None:
+                edge.add(weight_at, self.half_life, count=count, weight=weight)
+
+        Interaction.objects.bulk_create(
+            [
+                Interaction(source_id=source, target_id=target, reply_count=edge.count,
+                            weight=edge.weight, weight_at=edge.at)
+                for (source, target), edge in edges.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['source', 'target'],
+            update_fields=['reply_count', 'weight', 'weight_at'],
+            batch_size=1000
+        )
+        return len(edges)
+
+    def reference_time(self) -> Optional[datetime]:
+        """Weights are reported as of the newest message folded into the graph."""
+        return AnalyticsCursor.objects.filter(name=CURSOR_NAME).values_list(
+            'position', flat=True
+        ).first()
+
+    def top_partners(self, user: User, limit: int = 10) -> List[dict]:
+        """Members a user exchanges the most replies with, in either direction."""
+        now = self.reference_time()
+        partners: Dict[str, dict] = {}
+        edges = Interaction.objects.filter(Q(source=user) | Q(target=user)).values_list(
+            'source_id', 'target_id', 'reply_count', 'weight', 'weight_at'
+        )
+        for source, target, count, weight, weight_at in edges:
+            partner = target if source == user.phone_number else source
+            entry = partners.setdefault(partner, {
+                'phone_number': partner, 'replies_sent': 0, 'replies_received': 0, 'weight': 0.0
+            })
+            entry['replies_sent' if source == user.phone_number else 'replies_received'] += count
+            entry['weight'] += DecayedWeight(count, weight, weight_at).value_at(now, self.half_life)
+
+        return self._ranked(partners.values(), limit)
+
+    def strongest_pairs(self, limit: int = 10) -> List[dict]:
+        """Pairs of members with the heaviest two-way reply traffic."""
+        now = self.reference_time()
+        pairs: Dict[Edge, dict] = {}
+        edges = Interaction.objects.values_list(
+            'source_id', 'target_id', 'reply_count', 'weight', 'weight_at'
+        )
+        for source, target, count, weight, weight_at in edges:
+            first, second = sorted((source, target))
+            entry = pairs.setdefault((first, second), {
+                'member': first, 'partner': second, 'reply_count': 0, 'weight': 0.0
+            })
+            entry['reply_count'] += count
+            entry['weight'] += DecayedWeight(count, weight, weight_at).value_at(now, self.half_life)
+
+        return self._ranked(pairs.values(), limit)
+
+    def _ranked(self, rows: Iterable[dict], limit: int) -> List[dict]:
+        ranked = sorted(rows, key=lambda row: row['weight'], reverse=True)[:limit]
+        for row in ranked:
+            row['weight'] = round(row['weight'], 4)
+        return ranked
@@ -0,0 +1,25 @@
+import json
+from django.core.management.base import BaseCommand
+from core.benchmarks.serialization import SerializationBenchmark
+
+class Command(BaseCommand):
+    help = (
+        'Compare the DRF serializers with the analytics fast path on year-long synthetic '
+        'payloads. Checks that both produce identical JSON before timing them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per payload')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument('--output', type=str, default=None,
+                            help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        results = SerializationBenchmark(
+            repeat=options['repeat'], seed=options['seed'], log=self.stdout.write
+        ).run()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from analytics.content import ContentStatsService
+
+class Command(BaseCommand):
+    help = 'Recount top words, emojis and links per user and month from the message history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Messages per map task')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f"Counting terms with {options['workers']} worker(s)"
+        ))
+
+        service = ContentStatsService()
+        try:
+            stored = service.rebuild(
+                chunk_size=options['chunk_size'],
+                workers=options['workers']
+            )
+            self.stdout.write(self.style.SUCCESS(f'Stored {stored} term frequencies'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error while counting terms: {str(e)}'))
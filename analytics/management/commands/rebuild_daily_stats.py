@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from analytics.rollups import DailyRollupService
+
+class Command(BaseCommand):
+    help = 'Recompute the per-day group statistics and active-user sketches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days recomputed per query')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding daily statistics'))
+
+        service = DailyRollupService()
+        try:
+            refreshed = service.rebuild(chunk_days=options['chunk_days'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {refreshed} days'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error while rebuilding statistics: {str(e)}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from analytics.graph import InteractionGraphService
+
+class Command(BaseCommand):
+    help = 'Rebuild the reply-interaction graph from the whole message history'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding interaction graph'))
+
+        service = InteractionGraphService()
+        try:
+            edges = service.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Stored {edges} interaction edges'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error while building interaction graph: {str(e)}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from analytics.sessions import SessionService
+
+class Command(BaseCommand):
+    help = 'Re-segment the whole message history into conversation sessions'
+
+    def handle(self, *args, **options):
+        service = SessionService()
+        self.stdout.write(self.style.SUCCESS(
+            f'Segmenting messages with a {service.gap} gap'
+        ))
+
+        try:
+            created = service.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Stored {created} sessions'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error while segmenting sessions: {str(e)}'))
@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from whatsapp_analytics.db_router import write_heartbeat
+
+class Command(BaseCommand):
+    help = (
+        'Write the replica heartbeat on the primary and, for the local SQLite replica, '
+        'copy the primary to DATABASE_REPLICA_PATH'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat every this many seconds instead of running once')
+        parser.add_argument('--heartbeat-only', action='store_true',
+                            help='Only write the heartbeat, for replicas kept in sync by the database')
+
+    def handle(self, *args, **options):
+        if not options['heartbeat_only'] and not settings.DATABASE_REPLICA_PATH:
+            raise CommandError('DATABASE_REPLICA_PATH is not set')
+
+        while True:
+            heartbeat = write_heartbeat()
+            if not options['heartbeat_only']:
+                self.copy_primary(settings.DATABASE_REPLICA_PATH)
+            self.stdout.write(self.style.SUCCESS(f'Replica refreshed at {heartbeat:%Y-%m-%d %H:%M:%S}'))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy_primary(self, path: str) -> None:
+        """Online backup into a temporary file, then an atomic swap so readers never see half a copy."""
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Backup copies are only supported for a SQLite primary')
+
+        primary.ensure_connection()
+        temporary = f'{path}.tmp'
+        target = sqlite3.connect(temporary)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        os.replace(temporary, path)
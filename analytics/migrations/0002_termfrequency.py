@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermFrequency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('kind', models.CharField(choices=[('WORD', 'Word'), ('EMOJI', 'Emoji'), ('LINK', 'Link')], max_length=5)),
+                ('term', models.CharField(max_length=200)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='term_frequencies', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'kind', 'month'], name='analytics_t_user_id_46a6df_idx'), models.Index(fields=['kind', 'month'], name='analytics_t_kind_6c08d1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_termfrequency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupstatistics',
+            name='active_users_sketch',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_groupstatistics_active_users_sketch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupstatistics',
+            name='hourly_counts',
+            field=models.JSONField(default=list),
+        ),
+        migrations.CreateModel(
+            name='UserDailyStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('message_count', models.IntegerField(default=0)),
+                ('media_count', models.IntegerField(default=0)),
+                ('text_count', models.IntegerField(default=0)),
+                ('text_length', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_statistics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='analytics_u_date_e57ec3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_user_daily_statistics')],
+            },
+        ),
+    ]
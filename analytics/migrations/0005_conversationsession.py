@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_groupstatistics_hourly_counts_userdailystatistics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('message_count', models.IntegerField(default=0)),
+                ('burst_count', models.IntegerField(default=0)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('participants', models.ManyToManyField(related_name='conversation_sessions', to=settings.AUTH_USER_MODEL)),
+                ('starter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='started_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['started_at'],
+                'indexes': [models.Index(fields=['started_at'], name='analytics_c_started_e43ae5_idx'), models.Index(fields=['ended_at'], name='analytics_c_ended_a_d6ba09_idx'), models.Index(fields=['starter', 'started_at'], name='analytics_c_starter_f41630_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_conversationsession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.DateTimeField(null=True)),
+                ('state', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Interaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reply_count', models.IntegerField(default=0)),
+                ('weight', models.FloatField(default=0)),
+                ('weight_at', models.DateTimeField()),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replies_sent', to=settings.AUTH_USER_MODEL)),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replies_received', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['target'], name='analytics_i_target__ec01fe_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'target'), name='unique_interaction_edge')],
+            },
+        ),
+    ]
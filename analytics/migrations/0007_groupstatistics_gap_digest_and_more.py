@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_analyticscursor_interaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupstatistics',
+            name='gap_digest',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='groupstatistics',
+            name='length_digest',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='groupstatistics',
+            name='session_digest',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='userdailystatistics',
+            name='gap_digest',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='userdailystatistics',
+            name='length_digest',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_groupstatistics_gap_digest_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termfrequency',
+            name='floor',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -19,6 +19,108 @@ class GroupStatistics(models.Model):
     active_users = models.IntegerField(default=0)
     media_count = models.IntegerField(default=0)
     peak_hour = models.IntegerField(null=True)
+    active_users_sketch = models.BinaryField(null=True)
+    hourly_counts = models.JSONField(default=list)
+    gap_digest = models.BinaryField(null=True)
+    length_digest = models.BinaryField(null=True)
+    session_digest = models.BinaryField(null=True)
     
     def __str__(self):
         return f"Group stats for {self.date}"
+
+class UserDailyStatistics(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_statistics')
+    date = models.DateField()
+    message_count = models.IntegerField(default=0)
+    media_count = models.IntegerField(default=0)
+    text_count = models.IntegerField(default=0)
+    text_length = models.IntegerField(default=0)
+    gap_digest = models.BinaryField(null=True)
+    length_digest = models.BinaryField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_user_daily_statistics')
+        ]
+        indexes = [
+            models.Index(fields=['date'])
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.user.phone_number} on {self.date}"
+
+class TermFrequency(models.Model):
+    WORD = 'WORD'
+    EMOJI = 'EMOJI'
+    LINK = 'LINK'
+    KINDS = (
+        (WORD, 'Word'),
+        (EMOJI, 'Emoji'),
+        (LINK, 'Link'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='term_frequencies')
+    month = models.DateField()
+    kind = models.CharField(max_length=5, choices=KINDS)
+    term = models.CharField(max_length=200)
+    count = models.IntegerField(default=0)
+    # The bucket sketch's floor: ``count`` overestimates the true frequency by at most this much
+    floor = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'kind', 'month']),
+            models.Index(fields=['kind', 'month']),
+        ]
+
+    def __str__(self):
+        owner = self.user.phone_number if self.user_id else 'group'
+        return f"{self.term} x{self.count} ({owner}, {self.month:%Y-%m})"
+
+class ConversationSession(models.Model):
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    starter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='started_sessions')
+    participants = models.ManyToManyField(User, related_name='conversation_sessions')
+    message_count = models.IntegerField(default=0)
+    burst_count = models.IntegerField(default=0)
+    duration_seconds = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['started_at']),
+            models.Index(fields=['ended_at']),
+            models.Index(fields=['starter', 'started_at']),
+        ]
+        ordering = ['started_at']
+
+    def __str__(self):
+        return f"Session started by {self.starter_id} at {self.started_at}"
+
+class Interaction(models.Model):
+    """One sparse edge of the reply graph: ``source`` replied to ``target``."""
+    source = models.ForeignKey(User, on_delete=models.CASCADE, related_name='replies_sent')
+    target = models.ForeignKey(User, on_delete=models.CASCADE, related_name='replies_received')
+    reply_count = models.IntegerField(default=0)
+    weight = models.FloatField(default=0)
+    weight_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'target'], name='unique_interaction_edge')
+        ]
+        indexes = [
+            models.Index(fields=['target'])
+        ]
+
+    def __str__(self):
+        return f"{self.source_id} -> {self.target_id} ({self.reply_count})"
+
+class AnalyticsCursor(models.Model):
+    """How far an incremental analytics pass has read the message stream."""
+    name = models.CharField(max_length=50, unique=True)
+    position = models.DateTimeField(null=True)
+    state = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
@@ -0,0 +1,174 @@
+import cProfile
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.response import Response
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+DEFAULT_LIMIT = 30
+MAX_LIMIT = 200
+
+
+class SqlProfile:
+    """``execute_wrapper`` hook grouping the queries of a profiled call by statement.
+
+    ``run_concurrently`` installs the hook on its pool threads too, so
+    entries are updated under a lock.
+    """
+
+    def __init__(self):
+        self.statements: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                entry = self.statements.setdefault(sql, {'sql': sql, 'count': 0, 'total_ms': 0.0})
+                entry['count'] += 1
+                entry['total_ms'] += elapsed
+
+    def summary(self) -> dict:
+        statements = sorted(self.statements.values(), key=lambda row: row['total_ms'], reverse=True)
+        for row in statements:
+            row['total_ms'] = round(row['total_ms'], 3)
+        return {
+            'count': sum(row['count'] for row in statements),
+            'total_ms': round(sum(row['total_ms'] for row in statements), 3),
+            'statements': statements,
+        }
+
+
+class RequestProfiler:
+    """cProfile plus per-statement SQL timings around one view call."""
+
+    def __init__(self, sort: str = 'cumulative', limit: int = DEFAULT_LIMIT, save: bool = False):
+        self.sort = sort
+        self.limit = limit
+        self.save = save
+        self.profile = cProfile.Profile()
+        self.sql = SqlProfile()
+        self._stack = ExitStack()
+        self._started = None
+        self._elapsed: Optional[float] = None
+
+    def start(self) -> None:
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self.sql))
+        self._started = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self) -> float:
+        """Disable the profile and remove the SQL hooks; later calls return the same time."""
+        if self._elapsed is None:
+            self.profile.disable()
+            self._elapsed = (time.perf_counter() - self._started) * 1000
+            self._stack.close()
+        return self._elapsed
+
+    def functions(self) -> List[dict]:
+        stats = pstats.Stats(self.profile)
+        stats.sort_stats(self.sort)
+        rows = []
+        for function in stats.fcn_list[:self.limit]:
+            primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[function]
+            filename, line, name = function
+            rows.append({
+                'function': f'{filename}:{line}({name})',
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'total_time_ms': round(total_time * 1000, 3),
+                'cumulative_time_ms': round(cumulative_time * 1000, 3),
+            })
+        return rows
+
+    def dump(self, action: str) -> str:
+        """Write the raw stats for ``pstats``/snakeviz and return the file path."""
+        directory = settings.ANALYTICS_PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r'[^\w.-]', '_', action or 'request')
+        path = os.path.join(directory, f'{name}-{timezone.now():%Y%m%dT%H%M%S%f}.prof')
+        self.profile.dump_stats(path)
+        return path
+
+
+class ProfilingMixin:
+    """Opt-in ``?profile=`` mode for staff on viewset actions.
+
+    ``?profile=cumulative`` (or ``tottime``, ``calls``; any other value means
+    ``cumulative``) runs the action under cProfile and replaces the body with
+    the top functions and a per-statement SQL breakdown. ``profile_limit``
+    sets how many functions are listed and ``profile_save=1`` also writes
+    the raw stats to ``ANALYTICS_PROFILE_DIR``. The parameter is ignored for
+    non-staff users.
+
+    cProfile only sees the request thread: calls handed to
+    ``run_concurrently`` show up as time spent waiting on their futures.
+    Their queries are still listed in the SQL breakdown, since the pool
+    threads inherit the request's ``execute_wrapper`` hooks.
+    """
+
+    profiler: Optional[RequestProfiler] = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # finalize_response is skipped when the action raises an unhandled exception
+            profiler, self.profiler = self.profiler, None
+            if profiler is not None:
+                profiler.stop()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Authentication and permissions have run; profile only the action itself
+        profiler = self._requested_profiler(request)
+        if profiler is not None:
+            self.profiler = profiler
+            profiler.start()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        profiler = self.profiler
+        if profiler is None:
+            return response
+
+        # Rendering is part of the cost being profiled
+        response.render()
+        elapsed = profiler.stop()
+        report = {
+            'action': self.action,
+            'status': response.status_code,
+            'total_ms': round(elapsed, 3),
+            'sort': profiler.sort,
+            'functions': profiler.functions(),
+            'sql': profiler.sql.summary(),
+        }
+        if profiler.save:
+            report['saved_to'] = profiler.dump(self.action)
+        return super().finalize_response(request, Response(report), *args, **kwargs)
+
+    def _requested_profiler(self, request) -> Optional[RequestProfiler]:
+        if 'profile' not in request.query_params or not request.user.is_staff:
+            return None
+
+        sort = request.query_params['profile']
+        try:
+            limit = int(request.query_params.get('profile_limit', DEFAULT_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        return RequestProfiler(
+            sort=sort if sort in SORT_KEYS else 'cumulative',
+            limit=min(max(limit, 1), MAX_LIMIT),
+            save=request.query_params.get('profile_save') in ('1', 'true')
+        )
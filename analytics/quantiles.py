@@ -0,0 +1,54 @@
+from datetime import date
+from typing import Iterable, Optional
+from users.models import User
+from .models import GroupStatistics, UserDailyStatistics
+from .sketches import TDigest
+
+PERCENTILES = (50, 90, 99)
+
+# Metric name -> digest column, shared by GroupStatistics and UserDailyStatistics
+GROUP_METRICS = {
+    'message_gap': 'gap_digest',
+    'message_length': 'length_digest',
+    'session_length': 'session_digest',
+}
+USER_METRICS = {
+    'message_gap': 'gap_digest',
+    'message_length': 'length_digest',
+}
+
+
+class QuantileService:
+    """Percentiles over any date range, merged from the per-day digests built at import time."""
+
+    def group_quantiles(self, first_day: date, last_day: date) -> dict:
+        days = GroupStatistics.objects.filter(date__range=(first_day, last_day))
+        return {
+            metric: self._summarize(days.values_list(column, flat=True))
+            for metric, column in GROUP_METRICS.items()
+        }
+
+    def user_quantiles(self, user: User, first_day: date, last_day: date) -> dict:
+        days = UserDailyStatistics.objects.filter(user=user, date__range=(first_day, last_day))
+        return {
+            metric: self._summarize(days.values_list(column, flat=True))
+            for metric, column in USER_METRICS.items()
+        }
+
+    def merged(self, digests: Iterable[Optional[bytes]]) -> TDigest:
+        merged = TDigest()
+        for digest in digests:
+            if digest:
+                merged.merge(TDigest.from_bytes(digest))
+        return merged
+
+    def _summarize(self, digests: Iterable[Optional[bytes]]) -> dict:
+        merged = self.merged(digests)
+        summary = {'count': len(merged), 'mean': self._round(merged.mean())}
+        for percentile in PERCENTILES:
+            summary[f'p{percentile}'] = self._round(merged.quantile(percentile / 100))
+        return summary
+
+    @staticmethod
+    def _round(value: Optional[float]) -> Optional[float]:
+        return round(value, 2) if value is not None else None
@@ -0,0 +1,341 @@
+from datetime import date, datetime, time, timedelta
+from operator import itemgetter
+from typing import Dict, Iterable, List
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from whatsapp_messages import partitions
+from whatsapp_messages.models import Message
+from .models import GroupStatistics, UserDailyStatistics
+from .sketches import DistinctCounter, TDigest
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+# Gaps between a member's consecutive messages longer than this are not response times
+GAP_CUTOFF = timedelta(hours=1)
+
+
+def local_day_bounds(first_day: date, last_day: date) -> tuple:
+    """Aware datetimes covering ``first_day`` 00:00 up to (excluding) the day after ``last_day``."""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(first_day, time.min), tz),
+        timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz),
+    )
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """First local date of the week (Monday) or month containing ``day``."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_period(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+class DailyRollupService:
+    """Maintain the per-day ``GroupStatistics`` and ``UserDailyStatistics`` rollups.
+
+    Daily rows are the precomputed buckets behind every day, week and month
+    series; only hourly series still group raw messages.
+    """
+
+    def refresh_days(self, days: Iterable[date]) -> int:
+        """Recompute the rollups of the given local dates from their messages."""
+        days = sorted(set(days))
+        if not days:
+            return 0
+
+        messages = Message.objects.filter(
+            local_date__range=(days[0], days[-1])
+        ).order_by()
+
+        stats: Dict[date, dict] = {
+            day: {'total_messages': 0, 'media_count': 0, 'sketch': DistinctCounter(), 'hours': {}}
+            for day in days
+        }
+        user_rows = {}
+
+        per_sender = messages.values('local_date', 'sender_id').annotate(
+            total=Count('id'),
+            media=Count('id', filter=Q(is_media=True)),
+            text=Count('id', filter=Q(is_media=False)),
+            text_length=Sum('content_length', filter=Q(is_media=False))
+        )
+        for row in partitions.collect(per_sender, days[0], days[-1]):
+            day = stats.get(row['local_date'])
+            if day is None:
+                continue
+            day['total_messages'] += row['total']
+            day['media_count'] += row['media']
+            day['sketch'].add(row['sender_id'])
+            user_rows[row['sender_id'], row['local_date']] = UserDailyStatistics(
+                user_id=row['sender_id'],
+                date=row['local_date'],
+                message_count=row['total'],
+                media_count=row['media'],
+                text_count=row['text'],
+                text_length=row['text_length'] or 0
+            )
+
+        per_hour = messages.values('local_date', 'local_hour').annotate(count=Count('id'))
+        for row in partitions.collect(per_hour, days[0], days[-1]):
+            day = stats.get(row['local_date'])
+            if day is not None:
+                day['hours'][row['local_hour']] = row['count']
+
+        self._build_digests(*local_day_bounds(days[0], days[-1]), stats, user_rows)
+
+        rows = [
+            GroupStatistics(
+                date=day,
+                total_messages=values['total_messages'],
+                active_users=values['sketch'].count(),
+                media_count=values['media_count'],
+                peak_hour=max(values['hours'], key=values['hours'].get) if values['hours'] else None,
+                active_users_sketch=values['sketch'].to_bytes(),
+                hourly_counts=[values['hours'].get(hour, 0) for hour in range(24)],
+                gap_digest=values['gap_digest'].to_bytes(),
+                length_digest=values['length_digest'].to_bytes()
+            )
+            for day, values in stats.items() if values['total_messages']
+        ]
+        empty_days = [day for day, values in stats.items() if not values['total_messages']]
+
+        with transaction.atomic():
+            GroupStatistics.objects.filter(date__in=empty_days).delete()
+            GroupStatistics.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['date'],
+                update_fields=[
+                    'total_messages', 'active_users', 'media_count',
+                    'peak_hour', 'active_users_sketch', 'hourly_counts',
+                    'gap_digest', 'length_digest'
+                ]
+            )
+            UserDailyStatistics.objects.filter(date__in=days).delete()
+            UserDailyStatistics.objects.bulk_create(user_rows.values(), batch_size=1000)
+        return len(rows)
+
+    def _build_digests(self, start: datetime, end: datetime, stats: Dict[date, dict],
+                       user_rows: Dict[tuple, UserDailyStatistics]) -> None:
+        """Build message gap and length digests per user-day in one ordered pass.
+
+        The pass starts ``GAP_CUTOFF`` early so gaps that cross into the
+        first refreshed day are counted too.
+        """
+        for values in stats.values():
+            values['gap_digest'] = TDigest()
+            values['length_digest'] = TDigest()
+        user_digests: Dict[tuple, tuple] = {}
+
+        stream = partitions.stream(
+            Message.objects.filter(
+                timestamp__gte=start - GAP_CUTOFF, timestamp__lt=end
+            ).order_by('sender_id', 'timestamp').values_list(
+                'sender_id', 'timestamp', 'local_date', 'is_media', 'content_length'
+            ),
+            timezone.localdate(start - GAP_CUTOFF), timezone.localdate(end),
+            key=itemgetter(0, 1)
+        )
+        previous_sender, previous_timestamp = None, None
+        for sender, timestamp, day, is_media, length in stream:
+            if (sender, day) in user_rows:
+                gaps, lengths = user_digests.setdefault((sender, day), (TDigest(), TDigest()))
+                if sender == previous_sender and timestamp - previous_timestamp < GAP_CUTOFF:
+                    gap = (timestamp - previous_timestamp).total_seconds()
+                    gaps.add(gap)
+                    stats[day]['gap_digest'].add(gap)
+                if not is_media:
+                    lengths.add(length)
+                    stats[day]['length_digest'].add(length)
+            previous_sender, previous_timestamp = sender, timestamp
+
+        for key, (gaps, lengths) in user_digests.items():
+            user_rows[key].gap_digest = gaps.to_bytes()
+            user_rows[key].length_digest = lengths.to_bytes()
+
+    def rebuild(self, chunk_days: int = 31) -> int:
+        """Recompute the rollups of every day that has messages."""
+        bounds = [
+            partition.aggregate(first=models.Min('local_date'), last=models.Max('local_date'))
+            for partition in partitions.querysets(Message.objects.all())
+        ]
+        first_days = [bound['first'] for bound in bounds if bound['first'] is not None]
+        if not first_days:
+            GroupStatistics.objects.all().delete()
+            UserDailyStatistics.objects.all().delete()
+            return 0
+
+        first_day = min(first_days)
+        last_day = max(bound['last'] for bound in bounds if bound['last'] is not None)
+        GroupStatistics.objects.exclude(date__range=(first_day, last_day)).delete()
+        UserDailyStatistics.objects.exclude(date__range=(first_day, last_day)).delete()
+
+        refreshed = 0
+        day = first_day
+        while day <= last_day:
+            chunk_end = min(day + timedelta(days=chunk_days - 1), last_day)
+            refreshed += self.refresh_days(
+                day + timedelta(days=offset) for offset in range((chunk_end - day).days + 1)
+            )
+            day = chunk_end + timedelta(days=1)
+        return refreshed
+
+    def count_active_users(self, first_day: date, last_day: date) -> int:
+        """Distinct senders between two local dates (inclusive), merged from the daily sketches."""
+        merged = DistinctCounter()
+        sketches = GroupStatistics.objects.filter(
+            date__range=(first_day, last_day),
+            active_users_sketch__isnull=False
+        ).values_list('active_users_sketch', flat=True)
+        for sketch in sketches:
+            merged.merge(DistinctCounter.from_bytes(sketch))
+        return merged.count()
+
+    def group_series(self, first_day: date, last_day: date, granularity: str = 'day') -> List[dict]:
+        """Group activity between two local dates, one row per hour, day, week or month."""
+        if granularity == 'hour':
+            return self._group_hourly_series(first_day, last_day)
+
+        buckets: Dict[date, dict] = {}
+        days = GroupStatistics.objects.filter(
+            date__range=(first_day, last_day)
+        ).values_list(
+            'date', 'total_messages', 'media_count', 'active_users_sketch', 'hourly_counts'
+        ).order_by('date')
+        for day, total, media, sketch, hourly in days:
+            bucket = buckets.setdefault(bucket_start(day, granularity), {
+                'total_messages': 0, 'media_count': 0,
+                'sketch': DistinctCounter(), 'hours': [0] * 24
+            })
+            bucket['total_messages'] += total
+            bucket['media_count'] += media
+            if sketch is not None:
+                bucket['sketch'].merge(DistinctCounter.from_bytes(sketch))
+            for hour, count in enumerate(hourly or []):
+                bucket['hours'][hour] += count
+
+        return [
+            {
+                'period': bucket_period(start),
+                'date': start,
+                'total_messages': bucket['total_messages'],
+                'active_users': bucket['sketch'].count(),
+                'media_count': bucket['media_count'],
+                'peak_hour': max(range(24), key=bucket['hours'].__getitem__)
+                if any(bucket['hours']) else None,
+            }
+            for start, bucket in buckets.items()
+        ]
+
+    def user_series(self, user, first_day: date, last_day: date, granularity: str = 'day') -> List[dict]:
+        """A user's activity between two local dates, one row per hour, day, week or month."""
+        if granularity == 'hour':
+            return self._user_hourly_series(user, first_day, last_day)
+
+        days = UserDailyStatistics.objects.filter(
+            user=user, date__range=(first_day, last_day)
+        ).values_list(
+            'date', 'message_count', 'media_count', 'text_count', 'text_length'
+        ).order_by('date')
+        return self._bucket_user_days(days, granularity)
+
+    def users_series(self, users: Iterable, first_day: date, last_day: date) -> Dict[str, List[dict]]:
+        """Daily series for several users from one query, keyed by phone number.
+
+        Users without activity in the range have no entry.
+        """
+        per_user: Dict[str, list] = {}
+        days = UserDailyStatistics.objects.filter(
+            user__in=users, date__range=(first_day, last_day)
+        ).values_list(
+            'user_id', 'date', 'message_count', 'media_count', 'text_count', 'text_length'
+        ).order_by('user_id', 'date')
+        for user_id, *day in days:
+            per_user.setdefault(user_id, []).append(day)
+        return {
+            user_id: self._bucket_user_days(user_days, 'day')
+            for user_id, user_days in per_user.items()
+        }
+
+    def _bucket_user_days(self, days, granularity: str) -> List[dict]:
+        buckets: Dict[date, dict] = {}
+        for day, total, media, text, length in days:
+            bucket = buckets.setdefault(
+                bucket_start(day, granularity),
+                {'message_count': 0, 'media_count': 0, 'text_count': 0, 'text_length': 0}
+            )
+            bucket['message_count'] += total
+            bucket['media_count'] += media
+            bucket['text_count'] += text
+            bucket['text_length'] += length
+
+        return [
+            {
+                'period': bucket_period(start),
+                'date': start,
+                'message_count': bucket['message_count'],
+                'media_count': bucket['media_count'],
+                'avg_length': bucket['text_length'] / bucket['text_count']
+                if bucket['text_count'] else None,
+            }
+            for start, bucket in buckets.items()
+        ]
+
+    def _hourly(self, messages, first_day: date, last_day: date, **aggregates) -> List[dict]:
+        # An hour never spans two partitions, so their rows only need concatenating
+        rows = partitions.collect(
+            messages.values('local_date', 'local_hour').annotate(**aggregates).order_by(
+                'local_date', 'local_hour'
+            ),
+            first_day, last_day
+        )
+        return sorted(rows, key=itemgetter('local_date', 'local_hour'))
+
+    def _hour_period(self, row: dict) -> datetime:
+        return bucket_period(row['local_date']) + timedelta(hours=row['local_hour'])
+
+    def _group_hourly_series(self, first_day: date, last_day: date) -> List[dict]:
+        rows = self._hourly(
+            Message.objects.filter(local_date__range=(first_day, last_day)),
+            first_day, last_day,
+            total_messages=Count('id'),
+            active_users=Count('sender', distinct=True),
+            media_count=Count('id', filter=Q(is_media=True))
+        )
+        return [
+            {
+                'period': self._hour_period(row),
+                'date': row['local_date'],
+                'total_messages': row['total_messages'],
+                'active_users': row['active_users'],
+                'media_count': row['media_count'],
+                'peak_hour': row['local_hour'],
+            }
+            for row in rows
+        ]
+
+    def _user_hourly_series(self, user, first_day: date, last_day: date) -> List[dict]:
+        rows = self._hourly(
+            Message.objects.filter(sender=user, local_date__range=(first_day, last_day)),
+            first_day, last_day,
+            message_count=Count('id'),
+            media_count=Count('id', filter=Q(is_media=True)),
+            avg_length=models.Avg('content_length', filter=Q(is_media=False))
+        )
+        return [
+            {
+                'period': self._hour_period(row),
+                'date': row['local_date'],
+                'message_count': row['message_count'],
+                'media_count': row['media_count'],
+                'avg_length': row['avg_length'],
+            }
+            for row in rows
+        ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from users.models import User
 from .models import UserStatistics, GroupStatistics
@@ -28,12 +29,23 @@ class GroupStatisticsSerializer(serializers.ModelSerializer):
             'peak_hour'
         ]
 
+class GroupSeriesSerializer(GroupStatisticsSerializer):
+    period = serializers.DateTimeField()
+
+    class Meta(GroupStatisticsSerializer.Meta):
+        fields = ['period'] + GroupStatisticsSerializer.Meta.fields
+
 class UserTrendsSerializer(serializers.Serializer):
+    period = serializers.DateTimeField()
     date = serializers.DateField()
     message_count = serializers.IntegerField()
     media_count = serializers.IntegerField()
     avg_length = serializers.FloatField()
 
+class UserTrendsResponseSerializer(serializers.Serializer):
+    daily_stats = UserTrendsSerializer(many=True)
+    trend = serializers.ChoiceField(choices=['increasing', 'decreasing', 'stable', 'insufficient_data'])
+
 class ActivityPatternSerializer(serializers.Serializer):
     hourly_distribution = serializers.ListField(
         child=serializers.DictField(
@@ -56,14 +68,87 @@ class UserMetricsSerializer(serializers.Serializer):
     messages_per_day = serializers.FloatField()
     engagement_trend = serializers.CharField()
 
+class BatchUserMetricsRequestSerializer(serializers.Serializer):
+    phone_numbers = serializers.ListField(
+        child=serializers.CharField(max_length=17),
+        min_length=1,
+        max_length=settings.ANALYTICS_MAX_BATCH_USERS
+    )
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if ('start_date' in data) != ('end_date' in data):
+            raise serializers.ValidationError('Provide both start_date and end_date, or neither')
+        if 'start_date' in data and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError('start_date must not be after end_date')
+        return data
+
+class BatchUserMetricsSerializer(serializers.Serializer):
+    results = serializers.DictField(child=UserMetricsSerializer())
+    not_found = serializers.ListField(child=serializers.CharField())
+
+class TopUserSerializer(serializers.Serializer):
+    sender__phone_number = serializers.CharField()
+    message_count = serializers.IntegerField()
+
 class GroupMetricsSerializer(serializers.Serializer):
     total_messages = serializers.IntegerField()
     active_users = serializers.IntegerField()
     media_count = serializers.IntegerField()
     messages_per_user = serializers.FloatField()
-    daily_stats = GroupStatisticsSerializer(many=True)
-    top_users = serializers.ListField(
-        child=serializers.DictField(
-            child=serializers.IntegerField()
-        )
-    )
\ No newline at end of file
+    daily_stats = GroupSeriesSerializer(many=True)
+    top_users = TopUserSerializer(many=True)
+
+class TermCountSerializer(serializers.Serializer):
+    term = serializers.CharField()
+    count = serializers.IntegerField()
+
+class TopTermsSerializer(serializers.Serializer):
+    words = TermCountSerializer(many=True)
+    emojis = TermCountSerializer(many=True)
+    links = TermCountSerializer(many=True)
+
+class SessionStarterSerializer(serializers.Serializer):
+    starter__phone_number = serializers.CharField()
+    sessions_started = serializers.IntegerField()
+
+class GroupSessionStatsSerializer(serializers.Serializer):
+    total_sessions = serializers.IntegerField()
+    avg_messages_per_session = serializers.FloatField()
+    avg_duration_seconds = serializers.FloatField()
+    longest_duration_seconds = serializers.FloatField()
+    avg_burst_length = serializers.FloatField()
+    top_starters = SessionStarterSerializer(many=True)
+
+class UserSessionStatsSerializer(serializers.Serializer):
+    sessions_started = serializers.IntegerField()
+    sessions_joined = serializers.IntegerField()
+    avg_messages_per_session = serializers.FloatField()
+    avg_duration_seconds = serializers.FloatField()
+
+class InteractionPartnerSerializer(serializers.Serializer):
+    phone_number = serializers.CharField()
+    replies_sent = serializers.IntegerField()
+    replies_received = serializers.IntegerField()
+    weight = serializers.FloatField()
+
+class InteractionPairSerializer(serializers.Serializer):
+    member = serializers.CharField()
+    partner = serializers.CharField()
+    reply_count = serializers.IntegerField()
+    weight = serializers.FloatField()
+
+class QuantileSummarySerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    mean = serializers.FloatField(allow_null=True)
+    p50 = serializers.FloatField(allow_null=True)
+    p90 = serializers.FloatField(allow_null=True)
+    p99 = serializers.FloatField(allow_null=True)
+
+class UserQuantilesSerializer(serializers.Serializer):
+    message_gap = QuantileSummarySerializer()
+    message_length = QuantileSummarySerializer()
+
+class GroupQuantilesSerializer(UserQuantilesSerializer):
+    session_length = QuantileSummarySerializer()
@@ -1,65 +1,47 @@
+import itertools
 from datetime import datetime, timedelta
-from django.db.models import Count, Avg, F, Q
+from operator import itemgetter
+from typing import Dict, Iterable, List
+from django.conf import settings
+from django.db.models import Count, F, Q
 from django.db import models
 from django.utils import timezone
+from whatsapp_messages import partitions
 from whatsapp_messages.models import Message
 from users.models import User
-from .models import UserStatistics, GroupStatistics
+from .models import UserStatistics, GroupStatistics, UserDailyStatistics
+from .rollups import DailyRollupService
+from .quantiles import QuantileService
+from .concurrency import run_concurrently
+
 
 class AnalyticsService:
     def __init__(self):
         self.year_2024_start = datetime(2024, 1, 1)
         self.year_2024_end = datetime(2024, 12, 31, 23, 59, 59)
+        self.rollups = DailyRollupService()
+        self.quantiles = QuantileService()
 
     def update_group_statistics(self) -> None:
         """Update daily group statistics."""
-        today = timezone.now().date()
+        today = timezone.localdate()
         yesterday = today - timedelta(days=1)
 
-        # Get messages from yesterday
-        messages = Message.objects.filter(
-            timestamp__date=yesterday
-        )
-
-        # Calculate daily statistics
-        stats = {
-            'total_messages': messages.count(),
-            'active_users': messages.values('sender').distinct().count(),
-            'media_count': messages.exclude(message_type='TEXT').count(),
-            'peak_hour': messages.annotate(
-                hour=models.functions.ExtractHour('timestamp')
-            ).values('hour').annotate(
-                count=Count('id')
-            ).order_by('-count').first()['hour'] if messages.exists() else None
-        }
-
-        # Update or create group statistics
-        GroupStatistics.objects.update_or_create(
-            date=yesterday,
-            defaults=stats
-        )
+        self.rollups.refresh_days([yesterday])
 
-    def get_user_trends(self, user: User, days: int = 30) -> dict:
+    def get_user_trends(self, user: User, days: int = 30, granularity: str = 'day') -> dict:
         """Analyze user engagement trends over time."""
-        end_date = timezone.now()
+        end_date = timezone.localdate()
         start_date = end_date - timedelta(days=days)
 
-        daily_messages = Message.objects.filter(
-            sender=user,
-            timestamp__range=(start_date, end_date)
-        ).annotate(
-            date=models.functions.TruncDate('timestamp')
-        ).values('date').annotate(
-            message_count=Count('id'),
-            media_count=Count('id', filter=Q(message_type__in=['IMAGE', 'VIDEO', 'AUDIO', 'DOCUMENT'])),
-            avg_length=Avg(
-                models.functions.Length('content'),
-                filter=Q(message_type='TEXT')
-            )
-        ).order_by('date')
+        daily_messages = self.rollups.user_series(user, start_date, end_date)
+        if granularity == 'day':
+            series = daily_messages
+        else:
+            series = self.rollups.user_series(user, start_date, end_date, granularity)
 
         return {
-            'daily_stats': list(daily_messages),
+            'daily_stats': series,
             'trend': self._calculate_trend(daily_messages)
         }
 
@@ -84,121 +66,193 @@ class AnalyticsService:
 
     def calculate_user_metrics(self, user: User, date_range: tuple = None) -> dict:
         """Calculate metrics for a specific user."""
+        return self.calculate_users_metrics([user], date_range)[user.phone_number]
+
+    def calculate_users_metrics(self, users: List[User], date_range: tuple = None) -> Dict[str, dict]:
+        """Calculate metrics for several users at once, keyed by phone number.
+
+        Every query groups by user, so the number of queries stays the same
+        however many users are asked for.
+        """
         if not date_range:
             date_range = (self.year_2024_start, self.year_2024_end)
-        
+
         start_date, end_date = date_range
-        
-        messages = Message.objects.filter(
-            sender=user,
-            timestamp__range=(start_date, end_date)
-        )
+        phone_numbers = [user.phone_number for user in users]
+        day_range = (start_date.date(), end_date.date())
+        trend_end = timezone.localdate()
 
-        base_metrics = messages.aggregate(
-            total_messages=Count('id'),
-            media_count=Count('id', filter=~Q(message_type='TEXT')),
-            avg_length=Avg(
-                models.functions.Length('content'),
-                filter=Q(message_type='TEXT')
-            ),
-            total_chars=models.Sum(
-                models.functions.Length('content'),
-                filter=Q(message_type='TEXT')
+        base_rows, gap_rows, trend_series = run_concurrently(
+            # Sums and counts rather than averages, so per-year partitions add up
+            lambda: partitions.merge_counts(partitions.collect(
+                Message.objects.filter(
+                    sender__in=phone_numbers,
+                    local_date__range=day_range
+                ).values('sender').annotate(
+                    total_messages=Count('id'),
+                    media_count=Count('id', filter=Q(is_media=True)),
+                    text_count=Count('id', filter=Q(is_media=False)),
+                    total_chars=models.Sum('content_length', filter=Q(is_media=False)),
+                    active_days=Count('local_date', distinct=True)
+                ).order_by(),
+                *day_range
+            ), keys=('sender',)),
+            # Per-day message gap digests built at import time
+            lambda: list(UserDailyStatistics.objects.filter(
+                user__in=phone_numbers,
+                date__range=day_range,
+                gap_digest__isnull=False
+            ).values_list('user', 'gap_digest')),
+            lambda: self.rollups.users_series(
+                phone_numbers, trend_end - timedelta(days=30), trend_end
             )
         )
 
-        # Calculate response times
-        response_times = []
-        previous_message = None
-        for message in messages.order_by('timestamp'):
-            if previous_message:
-                time_diff = (message.timestamp - previous_message.timestamp).total_seconds()
-                if time_diff < 3600:
-                    response_times.append(time_diff)
-            previous_message = message
-
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-
-        metrics = {
-            'total_messages': base_metrics['total_messages'],
-            'media_messages': base_metrics['media_count'],
-            'active_days': messages.dates('timestamp', 'day').count(),
-            'avg_message_length': round(base_metrics['avg_length'] or 0, 2),
-            'total_characters': base_metrics['total_chars'] or 0,
-            'avg_response_time_seconds': round(avg_response_time, 2),
-            'messages_per_day': round(
-                base_metrics['total_messages'] / messages.dates('timestamp', 'day').count()
-                if messages.exists() else 0, 2
-            ),
-            'engagement_trend': self.get_user_trends(user)['trend']
-        }
+        base_metrics = {row['sender']: row for row in base_rows}
+        gap_digests: Dict[str, list] = {}
+        for phone_number, digest in gap_rows:
+            gap_digests.setdefault(phone_number, []).append(digest)
 
-        UserStatistics.objects.update_or_create(
-            user=user,
-            defaults={
-                'total_messages': metrics['total_messages'],
-                'media_messages': metrics['media_messages'],
-                'active_days': metrics['active_days'],
-                'avg_message_length': metrics['avg_message_length'],
-                'last_calculated': timezone.now()
+        empty = {
+            'total_messages': 0, 'media_count': 0, 'text_count': 0,
+            'total_chars': None, 'active_days': 0
+        }
+        results = {}
+        for phone_number in phone_numbers:
+            base = base_metrics.get(phone_number, empty)
+            avg_response_time = self.quantiles.merged(gap_digests.get(phone_number, [])).mean() or 0
+            results[phone_number] = {
+                'total_messages': base['total_messages'],
+                'media_messages': base['media_count'],
+                'active_days': base['active_days'],
+                'avg_message_length': round(
+                    base['total_chars'] / base['text_count'] if base['text_count'] else 0, 2
+                ),
+                'total_characters': base['total_chars'] or 0,
+                'avg_response_time_seconds': round(avg_response_time, 2),
+                'messages_per_day': round(
+                    base['total_messages'] / base['active_days']
+                    if base['active_days'] else 0, 2
+                ),
+                'engagement_trend': self._calculate_trend(trend_series.get(phone_number, []))
             }
+
+        # Single upsert instead of update_or_create's SELECT + savepoints + write per user
+        now = timezone.now()
+        UserStatistics.objects.bulk_create(
+            [
+                UserStatistics(
+                    user_id=phone_number,
+                    total_messages=metrics['total_messages'],
+                    media_messages=metrics['media_messages'],
+                    active_days=metrics['active_days'],
+                    avg_message_length=metrics['avg_message_length'],
+                    last_calculated=now
+                )
+                for phone_number, metrics in results.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[
+                'total_messages', 'media_messages', 'active_days',
+                'avg_message_length', 'last_calculated'
+            ]
         )
 
-        return metrics
+        return results
+
+    def refresh_user_statistics(self, phone_numbers: Iterable[str]) -> int:
+        """Recompute the stored ``UserStatistics`` of any number of users, ``ANALYTICS_MAX_BATCH_USERS`` at a time."""
+        phone_numbers = iter(phone_numbers)
+        refreshed = 0
+        while True:
+            batch = list(itertools.islice(phone_numbers, settings.ANALYTICS_MAX_BATCH_USERS))
+            if not batch:
+                return refreshed
+            self.calculate_users_metrics([User(phone_number=number) for number in batch])
+            refreshed += len(batch)
     
-    def calculate_group_metrics(self, date_range: tuple = None) -> dict:
+    def calculate_group_metrics(self, date_range: tuple = None, granularity: str = 'day') -> dict:
         """Calculate metrics for the entire group."""
         if not date_range:
             date_range = (self.year_2024_start, self.year_2024_end)
         
         start_date, end_date = date_range
         
-        messages = Message.objects.filter(timestamp__range=(date_range))
-        
-        total_messages = messages.count()
-        active_users = messages.values('sender').distinct().count()
-        media_count = messages.exclude(message_type='TEXT').count()
-
-        daily_stats = messages.annotate(
-            date=models.functions.TruncDate('timestamp')
-        ).values('date').annotate(
-            count=Count('id'),
-            active_users=Count('sender', distinct=True)
-        ).order_by('date')
-        
-        top_users = messages.values('sender__phone_number').annotate(
-            message_count=Count('id')
-        ).order_by('-message_count')[:10]
-        
+        first_day, last_day = start_date.date(), end_date.date()
+        messages = Message.objects.filter(local_date__range=(first_day, last_day))
+
+        # Independent reads; day, week and month buckets come from the daily rollups
+        totals, active_users, daily_stats, top_users = run_concurrently(
+            lambda: partitions.aggregate(
+                messages, first_day, last_day,
+                total_messages=Count('id'),
+                media_count=Count('id', filter=Q(is_media=True))
+            ),
+            lambda: self.rollups.count_active_users(first_day, last_day),
+            lambda: self.rollups.group_series(first_day, last_day, granularity),
+            lambda: self._top_senders(messages, first_day, last_day)
+        )
+        total_messages = totals['total_messages']
+        media_count = totals['media_count']
+
         return {
             'total_messages': total_messages,
             'active_users': active_users,
             'media_count': media_count,
             'messages_per_user': round(total_messages / active_users if active_users > 0 else 0, 2),
-            'daily_stats': list(daily_stats),
-            'top_users': list(top_users)
+            'daily_stats': daily_stats,
+            'top_users': top_users
         }
 
     def get_activity_patterns(self, date_range: tuple = None) -> dict:
         """Analyze activity patterns."""
         if not date_range:
             date_range = (self.year_2024_start, self.year_2024_end)
-            
-        messages = Message.objects.filter(timestamp__range=(date_range))
-
-        hourly_distribution = messages.annotate(
-            hour=models.functions.ExtractHour('timestamp')
-        ).values('hour').annotate(
-            count=Count('id')
-        ).order_by('hour')
-        
-        weekly_distribution = messages.annotate(
-            day=models.functions.ExtractWeekDay('timestamp')
-        ).values('day').annotate(
-            count=Count('id')
-        ).order_by('day')
-        
+
+        start_date, end_date = date_range
+        first_day, last_day = start_date.date(), end_date.date()
+        messages = Message.objects.filter(local_date__range=(first_day, last_day))
+
+        hourly_distribution, weekly_distribution = run_concurrently(
+            lambda: self._merged_distribution(messages.values(
+                hour=F('local_hour')
+            ).annotate(
+                count=Count('id')
+            ).order_by('hour'), 'hour', first_day, last_day),
+            lambda: self._merged_distribution(messages.values(
+                day=F('weekday')
+            ).annotate(
+                count=Count('id')
+            ).order_by('day'), 'day', first_day, last_day)
+        )
+
         return {
-            'hourly_distribution': list(hourly_distribution),
-            'weekly_distribution': list(weekly_distribution)
+            'hourly_distribution': hourly_distribution,
+            'weekly_distribution': weekly_distribution
         }
+
+    def _top_senders(self, messages, first_day, last_day, limit: int = 10) -> List[dict]:
+        per_sender = partitions.querysets(
+            messages.values('sender').annotate(message_count=Count('id')), first_day, last_day
+        )
+        if len(per_sender) == 1:
+            rows = list(per_sender[0].order_by('-message_count')[:limit])
+        else:
+            # A sender's total spans partitions, so rank only after adding them up
+            rows = sorted(
+                partitions.merge_counts(
+                    (row for partition in per_sender for row in partition.order_by()), keys=('sender',)
+                ),
+                key=itemgetter('message_count'), reverse=True
+            )[:limit]
+        return [
+            {'sender__phone_number': row['sender'], 'message_count': row['message_count']}
+            for row in rows
+        ]
+
+    def _merged_distribution(self, rows, key: str, first_day, last_day) -> List[dict]:
+        return sorted(
+            partitions.merge_counts(partitions.collect(rows, first_day, last_day), keys=(key,)),
+            key=itemgetter(key)
+        )
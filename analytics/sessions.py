@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.utils import timezone
+from whatsapp_messages import partitions
+from whatsapp_messages.models import Message
+from users.models import User
+from .models import ConversationSession, GroupStatistics
+from .rollups import local_day_bounds
+from .sketches import TDigest
+
+
+class OpenSession:
+    """A session being accumulated by the segmenter."""
+
+    __slots__ = ('started_at', 'ended_at', 'starter', 'participants',
+                 'message_count', 'burst_count', 'last_sender')
+
+    def __init__(self, timestamp: datetime, sender: str):
+        self.started_at = timestamp
+        self.ended_at = timestamp
+        self.starter = sender
+        self.participants = {sender}
+        self.message_count = 1
+        self.burst_count = 1
+        self.last_sender = sender
+
+    def add(self, timestamp: datetime, sender: str) -> None:
+        self.ended_at = timestamp
+        self.participants.add(sender)
+        self.message_count += 1
+        if sender != self.last_sender:
+            self.burst_count += 1
+            self.last_sender = sender
+
+
+class SessionSegmenter:
+    """Single-pass, gap-based split of a timestamp-ordered message stream into sessions.
+
+    A message starts a new session when more than ``gap`` has passed since
+    the previous message of the group.
+    """
+
+    def __init__(self, gap: timedelta):
+        self.gap = gap
+        self.current: Optional[OpenSession] = None
+
+    def feed(self, timestamp: datetime, sender: str) -> Optional[OpenSession]:
+        """Add the next message; return the session it closed, if any."""
+        if self.current is not None and timestamp - self.current.ended_at <= self.gap:
+            self.current.add(timestamp, sender)
+            return None
+        closed, self.current = self.current, OpenSession(timestamp, sender)
+        return closed
+
+    def finish(self) -> Optional[OpenSession]:
+        closed, self.current = self.current, None
+        return closed
+
+    def segment(self, messages: Iterable[tuple]) -> Iterator[OpenSession]:
+        """Segment ``(timestamp, sender)`` pairs, yielding every session including the last one."""
+        for timestamp, sender in messages:
+            closed = self.feed(timestamp, sender)
+            if closed is not None:
+                yield closed
+        closed = self.finish()
+        if closed is not None:
+            yield closed
+
+
+class SessionService:
+    """Persist conversation sessions and answer session statistics."""
+
+    def __init__(self, gap: Optional[timedelta] = None):
+        self.gap = gap or timedelta(minutes=settings.ANALYTICS_SESSION_GAP_MINUTES)
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        """Re-segment the whole message history."""
+        with transaction.atomic():
+            ConversationSession.objects.all().delete()
+            created = self._segment_from(None, batch_size)
+            self._refresh_digests(None)
+            return created
+
+    @transaction.atomic
+    def update_from(self, since: datetime, batch_size: int = 1000) -> int:
+        """Re-segment everything from the session that ``since`` could extend or split onwards.
+
+        Imports are usually chronological, so this only re-walks the last
+        session and the freshly imported messages.
+        """
+        affected = ConversationSession.objects.filter(ended_at__gte=since - self.gap)
+        resume_at = affected.aggregate(first=Min('started_at'))['first']
+        resume_at = min(resume_at, since) if resume_at else since
+        affected.delete()
+        created = self._segment_from(resume_at, batch_size)
+        self._refresh_digests(timezone.localdate(resume_at))
+        return created
+
+    def _segment_from(self, resume_at: Optional[datetime], batch_size: int) -> int:
+        messages = Message.objects.order_by('timestamp', 'id')
+        first_day = None
+        if resume_at is not None:
+            messages = messages.filter(timestamp__gte=resume_at)
+            first_day = timezone.localdate(resume_at)
+        stream = partitions.stream(
+            messages.values_list('timestamp', 'sender_id'),
+            first_day, key=itemgetter(0), chunk_size=batch_size
+        )
+
+        created = 0
+        pending: List[OpenSession] = []
+        for session in SessionSegmenter(self.gap).segment(stream):
+            pending.append(session)
+            if len(pending) >= batch_size:
+                created += self._persist(pending)
+                pending = []
+        if pending:
+            created += self._persist(pending)
+        return created
+
+    def _persist(self, sessions: List[OpenSession]) -> int:
+        rows = ConversationSession.objects.bulk_create([
+            ConversationSession(
+                started_at=session.started_at,
+                ended_at=session.ended_at,
+                starter_id=session.starter,
+                message_count=session.message_count,
+                burst_count=session.burst_count,
+                duration_seconds=(session.ended_at - session.started_at).total_seconds()
+            )
+            for session in sessions
+        ])
+        Participant = ConversationSession.participants.through
+        Participant.objects.bulk_create([
+            Participant(conversationsession_id=row.pk, user_id=phone_number)
+            for row, session in zip(rows, sessions)
+            for phone_number in session.participants
+        ], batch_size=1000)
+        return len(rows)
+
+    def _refresh_digests(self, first_day) -> None:
+        """Rebuild the per-day session duration digests from ``first_day`` onwards."""
+        sessions = ConversationSession.objects.all()
+        days = GroupStatistics.objects.all()
+        if first_day is not None:
+            sessions = sessions.filter(started_at__gte=local_day_bounds(first_day, first_day)[0])
+            days = days.filter(date__gte=first_day)
+
+        digests = {}
+        for started_at, duration in sessions.values_list('started_at', 'duration_seconds'):
+            digests.setdefault(timezone.localdate(started_at), TDigest()).add(duration)
+
+        rows = list(days.only('id', 'date'))
+        for row in rows:
+            digest = digests.get(row.date)
+            row.session_digest = digest.to_bytes() if digest else None
+        GroupStatistics.objects.bulk_update(rows, ['session_digest'], batch_size=500)
+
+    def group_stats(self, date_range: tuple) -> dict:
+        """Session statistics for the whole group."""
+        sessions = self._started_on_days(date_range)
+        stats = sessions.aggregate(
+            total_sessions=Count('id'),
+            avg_messages=Avg('message_count'),
+            avg_duration_seconds=Avg('duration_seconds'),
+            longest_duration_seconds=Max('duration_seconds'),
+            messages=Sum('message_count'),
+            bursts=Sum('burst_count')
+        )
+        top_starters = sessions.values('starter__phone_number').annotate(
+            sessions_started=Count('id')
+        ).order_by('-sessions_started')[:10]
+
+        return {
+            'total_sessions': stats['total_sessions'],
+            'avg_messages_per_session': round(stats['avg_messages'] or 0, 2),
+            'avg_duration_seconds': round(stats['avg_duration_seconds'] or 0, 2),
+            'longest_duration_seconds': round(stats['longest_duration_seconds'] or 0, 2),
+            'avg_burst_length': round(
+                stats['messages'] / stats['bursts'] if stats['bursts'] else 0, 2
+            ),
+            'top_starters': list(top_starters),
+        }
+
+    def user_stats(self, user: User, date_range: tuple) -> dict:
+        """Session statistics for one member: threads started and sessions joined."""
+        sessions = self._started_on_days(date_range)
+        joined = sessions.filter(participants=user).aggregate(
+            sessions_joined=Count('id'),
+            sessions_started=Count('id', filter=Q(starter=user)),
+            avg_messages=Avg('message_count'),
+            avg_duration_seconds=Avg('duration_seconds')
+        )
+
+        return {
+            'sessions_started': joined['sessions_started'],
+            'sessions_joined': joined['sessions_joined'],
+            'avg_messages_per_session': round(joined['avg_messages'] or 0, 2),
+            'avg_duration_seconds': round(joined['avg_duration_seconds'] or 0, 2),
+        }
+
+    @staticmethod
+    def _started_on_days(date_range: tuple):
+        """Sessions started on the range's local days, between aware Africa/Lagos midnights."""
+        start_date, end_date = date_range
+        started_from, started_before = local_day_bounds(start_date.date(), end_date.date())
+        return ConversationSession.objects.filter(
+            started_at__gte=started_from, started_at__lt=started_before
+        )
@@ -0,0 +1,280 @@
+import hashlib
+import math
+from array import array
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class FrequentItems:
+    """Mergeable heavy-hitters summary (batched Space-Saving) with bounded memory.
+
+    Holds at most ``2 * capacity`` counters. Each count overestimates the
+    true frequency by at most ``floor``, which stays zero until the summary
+    first overflows, so small buckets are counted exactly.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts: Dict[Hashable, int] = {}
+        self.floor = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, item: Hashable, count: int = 1) -> None:
+        self.counts[item] = self.counts.get(item, self.floor) + count
+        if len(self.counts) > 2 * self.capacity:
+            self._prune()
+
+    def update(self, items: Iterable[Hashable]) -> None:
+        for item in items:
+            self.add(item)
+
+    def merge(self, other: 'FrequentItems') -> 'FrequentItems':
+        merged = {}
+        for item in self.counts.keys() | other.counts.keys():
+            merged[item] = (
+                self.counts.get(item, self.floor) + other.counts.get(item, other.floor)
+            )
+        self.counts = merged
+        self.floor += other.floor
+        self._prune()
+        return self
+
+    def top(self, k: int) -> List[Tuple[Hashable, int]]:
+        return sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+
+    def _prune(self) -> None:
+        """Keep the ``capacity`` largest counters and raise the floor to the largest evicted one."""
+        if len(self.counts) <= self.capacity:
+            return
+        ranked = sorted(self.counts.items(), key=lambda kv: -kv[1])
+        self.floor = max(self.floor, ranked[self.capacity][1])
+        self.counts = dict(ranked[:self.capacity])
+
+
+class HyperLogLog:
+    """Mergeable distinct-count estimator (HyperLogLog with linear counting for small sets)."""
+
+    def __init__(self, precision: int = 12, registers: Optional[bytearray] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+
+    @staticmethod
+    def hash(item: str) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big'
+        )
+
+    def add(self, item: str) -> None:
+        value = self.hash(item)
+        bits = 64 - self.precision
+        index = value >> bits
+        rank = bits - (value & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches of different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class DistinctCounter:
+    """Distinct counter that stays an exact set until ``threshold`` members, then becomes a HyperLogLog.
+
+    Serialized as ``b'S'`` followed by newline separated members, or ``b'H'``
+    followed by the precision byte and the HyperLogLog registers.
+    """
+
+    def __init__(self, threshold: int = 256, precision: int = 12):
+        self.threshold = threshold
+        self.precision = precision
+        self.members: Optional[Set[str]] = set()
+        self.hll: Optional[HyperLogLog] = None
+
+    def add(self, item: str) -> None:
+        if self.hll is not None:
+            self.hll.add(item)
+            return
+        self.members.add(item)
+        if len(self.members) > self.threshold:
+            self._promote()
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def merge(self, other: 'DistinctCounter') -> 'DistinctCounter':
+        if other.hll is None:
+            self.update(other.members)
+            return self
+        if self.hll is None:
+            self._promote(other.hll.precision)
+        self.hll.merge(other.hll)
+        return self
+
+    def count(self) -> int:
+        return self.hll.count() if self.hll is not None else len(self.members)
+
+    def to_bytes(self) -> bytes:
+        if self.hll is not None:
+            return b'H' + bytes([self.hll.precision]) + bytes(self.hll.registers)
+        return b'S' + '\n'.join(sorted(self.members)).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, data: bytes, threshold: int = 256) -> 'DistinctCounter':
+        data = bytes(data)
+        counter = cls(threshold)
+        if data[:1] == b'H':
+            counter.members = None
+            counter.hll = HyperLogLog(data[1], bytearray(data[2:]))
+            counter.precision = data[1]
+        elif len(data) > 1:
+            counter.members = set(data[1:].decode('utf-8').split('\n'))
+        return counter
+
+    def _promote(self, precision: Optional[int] = None) -> None:
+        self.hll = HyperLogLog(precision or self.precision)
+        for member in self.members:
+            self.hll.add(member)
+        self.members = None
+
+
+class TDigest:
+    """Mergeable quantile sketch (merging t-digest, k1 scale function).
+
+    Keeps O(compression) centroids whatever the number of values added.
+    Serialized as ``[compression, min, max, mean_0, weight_0, ...]`` doubles.
+    """
+
+    def __init__(self, compression: float = 100):
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self._buffer: List[Tuple[float, float]] = []
+
+    def __len__(self):
+        return int(self.total_weight())
+
+    def total_weight(self) -> float:
+        return sum(self.weights) + sum(weight for _, weight in self._buffer)
+
+    def add(self, value: float, weight: float = 1) -> None:
+        self._buffer.append((value, weight))
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        if len(self._buffer) > 5 * self.compression:
+            self._compress()
+
+    def update(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        other._compress()
+        self._buffer.extend(zip(other.means, other.weights))
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._compress()
+        return self
+
+    def mean(self) -> Optional[float]:
+        self._compress()
+        total = sum(self.weights)
+        if not total:
+            return None
+        return sum(m * w for m, w in zip(self.means, self.weights)) / total
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._compress()
+        if not self.means:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+
+        total = sum(self.weights)
+        target = q * total
+        first_center = self.weights[0] / 2
+        if target <= first_center:
+            return self._interpolate(self.minimum, self.means[0], target / first_center)
+
+        cumulative = 0.0
+        for i in range(len(self.means) - 1):
+            center = cumulative + self.weights[i] / 2
+            next_center = cumulative + self.weights[i] + self.weights[i + 1] / 2
+            if target < next_center:
+                return self._interpolate(
+                    self.means[i], self.means[i + 1],
+                    (target - center) / (next_center - center)
+                )
+            cumulative += self.weights[i]
+
+        last_center = total - self.weights[-1] / 2
+        return self._interpolate(
+            self.means[-1], self.maximum,
+            (target - last_center) / (total - last_center)
+        )
+
+    def to_bytes(self) -> bytes:
+        self._compress()
+        values = array('d', [self.compression, self.minimum, self.maximum])
+        for mean, weight in zip(self.means, self.weights):
+            values.extend((mean, weight))
+        return values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TDigest':
+        values = array('d')
+        values.frombytes(bytes(data))
+        digest = cls(values[0])
+        digest.minimum, digest.maximum = values[1], values[2]
+        digest.means = list(values[3::2])
+        digest.weights = list(values[4::2])
+        return digest
+
+    @staticmethod
+    def _interpolate(low: float, high: float, fraction: float) -> float:
+        return low + (high - low) * min(max(fraction, 0.0), 1.0)
+
+    def _scale(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _scale_inverse(self, k: float) -> float:
+        return (math.sin(min(k * 2 * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        centroids = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in centroids)
+
+        means, weights = [], []
+        current_mean, current_weight = centroids[0]
+        q0 = 0.0
+        q_limit = self._scale_inverse(self._scale(q0) + 1) * total
+        for mean, weight in centroids[1:]:
+            if q0 * total + current_weight + weight <= q_limit:
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                means.append(current_mean)
+                weights.append(current_weight)
+                q0 += current_weight / total
+                q_limit = self._scale_inverse(self._scale(q0) + 1) * total
+                current_mean, current_weight = mean, weight
+        means.append(current_mean)
+        weights.append(current_weight)
+        self.means, self.weights = means, weights
@@ -1,3 +1,1380 @@
-from django.test import TestCase
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import warnings
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.admin import site
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from core.benchmarks.serialization import SerializationBenchmark
+from users.models import User
+from whatsapp_messages.models import Message, derived_message_fields
+from whatsapp_analytics import metrics
+from whatsapp_analytics.db_router import ReplicaRouter, choose_read_alias, monitor, read_from
+from whatsapp_analytics.middleware import QueryTimingMiddleware
+from whatsapp_analytics.paginators import EstimatedCountPaginator
+from .content import ContentStatsService, MessageTokenizer, count_chunk
+from .encoders import encode
+from .graph import DecayedWeight, InteractionGraphBuilder, InteractionGraphService
+from .quantiles import QuantileService
+from .rollups import DailyRollupService
+from .serializers import (
+    ActivityPatternSerializer,
+    GroupMetricsSerializer,
+    GroupQuantilesSerializer,
+    GroupSessionStatsSerializer,
+    InteractionPairSerializer,
+    TopTermsSerializer,
+    UserMetricsSerializer,
+    UserStatisticsSerializer,
+    UserTrendsResponseSerializer,
+)
+from .models import (
+    ConversationSession, GroupStatistics, Interaction, TermFrequency, UserDailyStatistics, UserStatistics
+)
+from .services import AnalyticsService
+from .sessions import SessionSegmenter, SessionService
+from .sketches import DistinctCounter, FrequentItems, HyperLogLog, TDigest
 
-# Create your tests here.
+# Tables whose plans must use an index; a full SCAN of any of them is a regression
+INDEXED_TABLES = (
+    'whatsapp_messages_message',
+    'users_user',
+    'analytics_groupstatistics',
+    'analytics_userdailystatistics',
+    'analytics_userstatistics',
+    'analytics_termfrequency',
+    'analytics_conversationsession',
+    'analytics_conversationsession_participants',
+    'analytics_interaction',
+    'analytics_analyticscursor',
+)
+SCAN_PATTERN = re.compile(r'^SCAN (\w+)')
+
+
+def seed_messages(user_count: int = 12, message_count: int = 1500, seed: int = 2024) -> list:
+    """Create a deterministic synthetic chat history and build every derived table from it."""
+    rng = random.Random(seed)
+    users = User.objects.bulk_create([
+        User(phone_number=f'+234803000{index:04d}') for index in range(user_count)
+    ])
+    words = ['hello', 'meetup', 'python', 'django', 'lagos', 'anambra', 'code', '😂', '🔥',
+             'https://example.com/recap']
+    timestamp = timezone.make_aware(datetime(2024, 1, 1, 8, 0))
+
+    messages = []
+    for _ in range(message_count):
+        timestamp += timedelta(minutes=rng.choice([1, 2, 5, 20, 45, 180, 600]))
+        message_type = 'IMAGE' if rng.random() < 0.1 else 'TEXT'
+        content = 'image omitted' if message_type == 'IMAGE' else ' '.join(rng.choices(words, k=5))
+        messages.append(Message(
+            sender=rng.choice(users),
+            content=content,
+            timestamp=timestamp,
+            message_type=message_type,
+            **derived_message_fields(timestamp, content, message_type)
+        ))
+    Message.objects.bulk_create(messages)
+
+    DailyRollupService().rebuild()
+    SessionService().rebuild()
+    InteractionGraphService().rebuild()
+    ContentStatsService().rebuild()
+    return users
+
+
+def local_time(*args) -> datetime:
+    """An aware datetime in the configured (Africa/Lagos) timezone."""
+    return timezone.make_aware(datetime(*args))
+
+
+class QueryBudgetMixin:
+    """Assert how many queries a call runs and that none of them scans an indexed table."""
+
+    def assertQueryBudget(self, budget: int, func, *args, allow_scans=(), **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{getattr(func, "__name__", func)} ran {len(queries)} queries '
+            f'(budget {budget}):\n' + '\n'.join(queries)
+        )
+        for sql in queries:
+            self.assertIndexedPlan(sql, allow_scans)
+        return result
+
+    def assertIndexedPlan(self, sql: str, allow_scans=()):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        for detail in plan:
+            match = SCAN_PATTERN.match(detail)
+            if match and match.group(1) in INDEXED_TABLES and match.group(1) not in allow_scans:
+                self.fail(
+                    f'Query plan scans {match.group(1)} instead of searching an index:\n'
+                    f'{sql}\n' + '\n'.join(plan)
+                )
+
+
+class AnalyticsServiceQueryTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_messages()
+        cls.user = cls.users[0]
+        cls.date_range = (datetime(2024, 1, 1), datetime(2024, 12, 31, 23, 59, 59))
+
+    def setUp(self):
+        self.service = AnalyticsService()
+
+    def test_calculate_user_metrics(self):
+        metrics = self.assertQueryBudget(
+            4, self.service.calculate_user_metrics, self.user, self.date_range
+        )
+        self.assertGreater(metrics['total_messages'], 0)
+
+    def test_calculate_users_metrics(self):
+        # Same query count for one user as for all of them
+        for users in (self.users[:1], self.users):
+            with self.subTest(user_count=len(users)):
+                metrics = self.assertQueryBudget(
+                    4, self.service.calculate_users_metrics, users, self.date_range
+                )
+                self.assertEqual(list(metrics), [user.phone_number for user in users])
+
+        for user in self.users:
+            self.assertEqual(
+                metrics[user.phone_number]['total_messages'],
+                Message.objects.filter(sender=user).count()
+            )
+        self.assertEqual(
+            UserStatistics.objects.filter(user__in=self.users).count(), len(self.users)
+        )
+
+    def test_get_user_trends(self):
+        for granularity in ('day', 'week', 'month', 'hour'):
+            with self.subTest(granularity=granularity):
+                self.assertQueryBudget(2, self.service.get_user_trends, self.user, 365, granularity)
+
+    def test_calculate_group_metrics(self):
+        for granularity in ('day', 'week', 'month', 'hour'):
+            with self.subTest(granularity=granularity):
+                metrics = self.assertQueryBudget(
+                    4, self.service.calculate_group_metrics, self.date_range, granularity
+                )
+                self.assertEqual(metrics['active_users'], len(self.users))
+
+    def test_get_activity_patterns(self):
+        patterns = self.assertQueryBudget(2, self.service.get_activity_patterns, self.date_range)
+        self.assertEqual(
+            sum(row['count'] for row in patterns['hourly_distribution']),
+            Message.objects.count()
+        )
+
+    def test_update_group_statistics(self):
+        self.assertQueryBudget(7, self.service.update_group_statistics)
+
+
+class AnalyticsViewSetQueryTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_messages()
+        cls.staff = User.objects.create(phone_number='+2348030009999', is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.member = self.users[0].phone_number
+
+    def get(self, path: str, budget: int, allow_scans=()):
+        response = self.assertQueryBudget(budget, self.client.get, path, allow_scans=allow_scans)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_user_actions(self):
+        dates = 'start_date=2024-01-01&end_date=2024-12-31'
+        budgets = {
+            f'user_metrics/?{dates}': 5,
+            'user_trends/?days=365&granularity=month': 3,
+            f'user_top_terms/?{dates}': 4,
+            f'user_sessions/?{dates}': 2,
+            'user_partners/': 3,
+            f'user_quantiles/?{dates}': 3,
+        }
+        for path, budget in budgets.items():
+            with self.subTest(action=path):
+                self.get(f'/api/analytics/{self.member}/{path}', budget)
+
+    def test_group_actions(self):
+        dates = 'start_date=2024-01-01&end_date=2024-12-31'
+        budgets = {
+            f'group_metrics/?{dates}': 4,
+            f'group_metrics/?{dates}&granularity=hour': 4,
+            f'activity_patterns/?{dates}': 2,
+            f'top_terms/?{dates}': 3,
+            f'group_sessions/?{dates}': 2,
+            f'group_quantiles/?{dates}': 3,
+        }
+        for path, budget in budgets.items():
+            with self.subTest(action=path):
+                self.get(f'/api/analytics/{path}', budget)
+
+    def test_batch_user_metrics(self):
+        phone_numbers = [user.phone_number for user in self.users] + ['+2348039999999']
+        response = self.assertQueryBudget(
+            5, self.client.post, '/api/analytics/batch_user_metrics/',
+            {'phone_numbers': phone_numbers, 'start_date': '2024-01-01', 'end_date': '2024-12-31'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(list(response.data['results']), phone_numbers[:-1])
+        self.assertEqual(response.data['not_found'], ['+2348039999999'])
+
+        single = self.client.get(
+            f'/api/analytics/{self.member}/user_metrics/?start_date=2024-01-01&end_date=2024-12-31'
+        )
+        self.assertEqual(response.data['results'][self.member], single.data)
+
+    def test_batch_user_metrics_validation(self):
+        for payload in (
+            {'phone_numbers': []},
+            {'phone_numbers': [f'+234803{index:07d}' for index in range(settings.ANALYTICS_MAX_BATCH_USERS + 1)]},
+            {'phone_numbers': [self.member], 'start_date': '2024-01-01'},
+            {'phone_numbers': [self.member], 'start_date': '2024-02-01', 'end_date': '2024-01-01'},
+        ):
+            with self.subTest(payload=payload):
+                response = self.client.post(
+                    '/api/analytics/batch_user_metrics/', payload, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_interaction_pairs(self):
+        # Ranking every pair reads the whole (sparse) edge table by design
+        self.get('/api/analytics/interaction_pairs/', 2, allow_scans=('analytics_interaction',))
+
+    def test_update_group_stats(self):
+        response = self.assertQueryBudget(
+            7, self.client.post, '/api/analytics/update_group_stats/'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryTimingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_messages(message_count=200)
+        cls.staff = User.objects.create(phone_number='+2348030009999', is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.path = '/api/analytics/activity_patterns/?start_date=2024-01-01&end_date=2024-12-31'
+
+    def test_server_timing_header_and_log_line(self):
+        with self.assertLogs('whatsapp_analytics.requests', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(self.path)
+
+        timing = dict(
+            (part.split(';')[0], part) for part in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(set(timing), {'db', 'view', 'serialize', 'total'})
+        self.assertIn(f'desc="{len(context.captured_queries)} queries"', timing['db'])
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['path'], '/api/analytics/activity_patterns/')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], len(context.captured_queries))
+        self.assertGreater(record['serialize_ms'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['view_ms'] + record['serialize_ms'])
+
+    def test_slow_queries_are_logged_with_sql(self):
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0):
+            with self.assertLogs('whatsapp_analytics.slow_queries', 'WARNING') as logs:
+                self.client.get(self.path)
+
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertTrue(any('whatsapp_messages_message' in record['sql'] for record in records))
+        self.assertTrue(all(record['path'] == '/api/analytics/activity_patterns/' for record in records))
+
+    def test_async_requests_stay_async(self):
+        async def view(request):
+            await sync_to_async(list)(Message.objects.all()[:5])
+            return HttpResponse()
+
+        middleware = QueryTimingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs('whatsapp_analytics.requests', 'INFO') as logs:
+            response = async_to_sync(middleware)(RequestFactory().get('/async/'))
+
+        self.assertIn('db;desc="1 queries"', response['Server-Timing'])
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['queries'], 1)
+
+
+class FastEncoderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_messages(message_count=600)
+        cls.first_day, cls.last_day = date(2024, 1, 1), date(2024, 12, 31)
+        cls.date_range = (datetime(2024, 1, 1), datetime(2024, 12, 31, 23, 59, 59))
+
+    def assertSameJSON(self, serializer_class, instance, many=False):
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(encode(serializer_class, instance, many=many)),
+            renderer.render(serializer_class(instance, many=many).data)
+        )
+
+    def test_matches_serializers_on_analytics_results(self):
+        analytics = AnalyticsService()
+        user = self.users[0]
+        cases = {
+            'user_metrics': (UserMetricsSerializer, analytics.calculate_user_metrics(user, self.date_range)),
+            'user_trends': (UserTrendsResponseSerializer, analytics.get_user_trends(user, 365, 'week')),
+            'group_metrics': (GroupMetricsSerializer, analytics.calculate_group_metrics(self.date_range)),
+            'group_metrics_hourly': (
+                GroupMetricsSerializer, analytics.calculate_group_metrics(self.date_range, 'hour')
+            ),
+            'activity_patterns': (ActivityPatternSerializer, analytics.get_activity_patterns(self.date_range)),
+            'top_terms': (TopTermsSerializer, ContentStatsService().top_terms(None, self.date_range, 20)),
+            'group_sessions': (GroupSessionStatsSerializer, SessionService().group_stats(self.date_range)),
+            'group_quantiles': (
+                GroupQuantilesSerializer, QuantileService().group_quantiles(self.first_day, self.last_day)
+            ),
+        }
+        for name, (serializer_class, instance) in cases.items():
+            with self.subTest(name):
+                self.assertSameJSON(serializer_class, instance)
+
+        with self.subTest('interaction_pairs'):
+            self.assertSameJSON(
+                InteractionPairSerializer, InteractionGraphService().strongest_pairs(20), many=True
+            )
+
+    def test_model_instances_and_edge_values(self):
+        analytics = AnalyticsService()
+        analytics.calculate_users_metrics(self.users, self.date_range)
+        self.assertSameJSON(
+            UserStatisticsSerializer, UserStatistics.objects.select_related('user'), many=True
+        )
+
+        class EdgeSerializer(serializers.Serializer):
+            amount = serializers.DecimalField(max_digits=6, decimal_places=2)
+            naive = serializers.DateTimeField()
+            utc = serializers.DateTimeField()
+            missing = serializers.IntegerField(allow_null=True)
+            flag = serializers.BooleanField()
+
+        self.assertSameJSON(EdgeSerializer, {
+            'amount': Decimal('12.345'),
+            'naive': datetime(2024, 3, 1, 12, 30),
+            'utc': datetime(2024, 3, 1, 12, 30, tzinfo=dt_timezone.utc),
+            'missing': None,
+            'flag': 'true',
+        })
+
+    def test_benchmark_paths_agree(self):
+        results = SerializationBenchmark(repeat=1).run()
+        self.assertIn('group_metrics_hour', results)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_messages(message_count=200)
+        cls.staff = User.objects.create(phone_number='+2348030009999', is_staff=True)
+        cls.path = (
+            f'/api/analytics/{cls.users[0].phone_number}/user_metrics/'
+            '?start_date=2024-01-01&end_date=2024-12-31'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_staff_get_profile_instead_of_body(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(f'{self.path}&profile=tottime&profile_limit=5')
+
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['action'], 'user_metrics')
+        self.assertEqual(report['sort'], 'tottime')
+        self.assertEqual(len(report['functions']), 5)
+        self.assertGreater(report['sql']['count'], 0)
+        self.assertTrue(any(
+            'whatsapp_messages_message' in row['sql'] for row in report['sql']['statements']
+        ))
+        self.assertNotIn('total_messages', report)
+
+    def test_raw_stats_are_saved(self):
+        self.client.force_authenticate(self.staff)
+        with tempfile.TemporaryDirectory() as directory, self.settings(ANALYTICS_PROFILE_DIR=directory):
+            report = self.client.get(f'{self.path}&profile=1&profile_save=1').json()
+            self.assertEqual(report['sort'], 'cumulative')
+            self.assertGreater(pstats.Stats(report['saved_to']).total_calls, 0)
+
+    def test_stopped_when_the_action_raises(self):
+        self.client.force_authenticate(self.staff)
+        with mock.patch.object(AnalyticsService, 'calculate_user_metrics', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.get(f'{self.path}&profile=1')
+
+        self.assertIsNone(sys.getprofile())
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_ignored_for_non_staff(self):
+        self.client.force_authenticate(self.users[1])
+        response = self.client.get(f'{self.path}&profile=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total_messages', response.json())
+
+
+class MetricsEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_messages(message_count=200)
+        cls.staff = User.objects.create(phone_number='+2348030009999', is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = self.settings(METRICS_DIR=directory.name, METRICS_TOKEN='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.store.reset()
+        self.addCleanup(metrics.store.reset)
+        self.directory = directory.name
+
+    def scrape(self) -> str:
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_request_and_table_metrics(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        for _ in range(3):
+            client.get('/api/analytics/group_quantiles/?start_date=2024-01-01&end_date=2024-12-31')
+
+        body = self.scrape()
+        self.assertIn(
+            'whatsapp_http_request_duration_seconds_count'
+            '{method="GET",view="analytics-group-quantiles"} 3.0', body
+        )
+        self.assertIn(
+            'whatsapp_http_request_duration_seconds_bucket'
+            '{le="+Inf",method="GET",view="analytics-group-quantiles"} 3.0', body
+        )
+        self.assertIn('whatsapp_db_queries_total{view="analytics-group-quantiles"}', body)
+        self.assertIn(f'whatsapp_table_rows{{table="message"}} {float(Message.objects.count())}', body)
+        self.assertIn('whatsapp_newest_message_age_seconds ', body)
+
+    def test_samples_from_every_process_file_are_merged(self):
+        metrics.IMPORTED_MESSAGES.inc(5)
+        metrics.IMPORT_LAST_BATCH.set_max(100.0)
+        # Another worker's file in the same directory
+        other = metrics.ValueFile(f'{self.directory}/999999.db')
+        other.add(metrics.IMPORTED_MESSAGES._key(metrics.IMPORTED_MESSAGES.name, {}), 7)
+        other.set_max(metrics.IMPORT_LAST_BATCH._key(metrics.IMPORT_LAST_BATCH.name, {}), 250.0)
+        other.close()
+
+        body = self.scrape()
+        self.assertIn('whatsapp_import_messages_total 12.0', body)
+        self.assertIn('whatsapp_import_last_batch_timestamp_seconds 250.0', body)
+
+    def test_exiting_processes_fold_into_the_archive(self):
+        for amount, timestamp in ((5, 100.0), (7, 50.0)):
+            metrics.IMPORTED_MESSAGES.inc(amount)
+            metrics.IMPORT_LAST_BATCH.set_max(timestamp)
+            metrics.store.close()
+            self.assertEqual(sorted(os.listdir(self.directory)), ['archive.db', 'archive.lock'])
+
+        body = self.scrape()
+        self.assertIn('whatsapp_import_messages_total 12.0', body)
+        self.assertIn('whatsapp_import_last_batch_timestamp_seconds 100.0', body)
+
+    def test_token_is_required_when_configured(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+
+class SchemaEndpointTests(TestCase):
+    def test_committed_schema_is_current(self):
+        with tempfile.TemporaryDirectory() as directory:
+            generated = f'{directory}/schema.yaml'
+            call_command('spectacular', file=generated, stderr=io.StringIO())
+            with open(generated, encoding='utf-8') as fresh, \
+                    open(settings.OPENAPI_SCHEMA_PATH, encoding='utf-8') as committed:
+                self.assertEqual(
+                    committed.read(), fresh.read(),
+                    'schema.yaml is stale; run manage.py spectacular --file schema.yaml'
+                )
+
+    def test_schema_is_served_from_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/schema.yaml'
+            with open(path, 'w', encoding='utf-8') as schema_file:
+                schema_file.write('openapi: 3.0.3\ninfo:\n  title: On disk\n')
+
+            with self.settings(OPENAPI_SCHEMA_PATH=path):
+                response = self.client.get('/api/schema/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi')
+                self.assertEqual(response.content, b'openapi: 3.0.3\ninfo:\n  title: On disk\n')
+
+                as_json = {'openapi': '3.0.3', 'info': {'title': 'On disk'}}
+                self.assertEqual(self.client.get('/api/schema/?format=json').json(), as_json)
+                response = self.client.get('/api/schema/', HTTP_ACCEPT='application/vnd.oai.openapi+json')
+                self.assertEqual(response.json(), as_json)
+
+                # A redeployed file is picked up
+                with open(path, 'w', encoding='utf-8') as schema_file:
+                    schema_file.write('openapi: 3.0.3\ninfo:\n  title: Redeployed\n')
+                stat = os.stat(path)
+                os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+                self.assertIn(b'Redeployed', self.client.get('/api/schema/').content)
+
+    def test_schema_is_generated_without_the_file(self):
+        with self.settings(OPENAPI_SCHEMA_PATH='/nonexistent/schema.yaml'):
+            response = self.client.get('/api/schema/?format=json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/api/analytics/group_metrics/', response.json()['paths'])
+
+    def test_docs_pages(self):
+        for url in ('/', '/api/docs/', '/api/redoc/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'/api/schema/', response.content)
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_messages(message_count=300)
+        AnalyticsService().refresh_user_statistics(user.phone_number for user in cls.users)
+        cls.staff = User.objects.create_superuser('+2348030009999', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_changelists_do_not_count_or_query_per_row(self):
+        for model in (Message, UserDailyStatistics, UserStatistics, User):
+            model_admin = site._registry[model]
+            url = f'/admin/{model._meta.app_label}/{model._meta.model_name}/'
+            with self.subTest(url):
+                with CaptureQueriesContext(connection) as full_page:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                with mock.patch.object(model_admin, 'list_per_page', 1), \
+                        CaptureQueriesContext(connection) as one_row:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                counts = [query['sql'] for query in full_page if 'COUNT(' in query['sql']]
+                self.assertTrue(all('LIMIT' in sql for sql in counts), counts)
+                self.assertEqual(len(full_page), len(one_row))
+
+    def test_date_hierarchy_drills_down_on_indexed_dates(self):
+        for url in ('/admin/whatsapp_messages/message/?local_date__year=2024&local_date__month=1',
+                    '/admin/analytics/groupstatistics/?date__year=2024'):
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_estimated_count(self):
+        class SmallLimitPaginator(EstimatedCountPaginator):
+            exact_count_limit = 50
+
+        total = Message.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertGreaterEqual(SmallLimitPaginator(Message.objects.all(), 20).count, total)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+        images = Message.objects.filter(message_type='IMAGE')
+        self.assertEqual(SmallLimitPaginator(images, 20).count, min(images.count(), 50))
+        self.assertEqual(EstimatedCountPaginator(images, 20).count, images.count())
+
+    def test_recompute_actions(self):
+        UserStatistics.objects.all().delete()
+        response = self.client.post('/admin/users/user/', {
+            'action': 'recompute_user_statistics',
+            '_selected_action': [user.phone_number for user in self.users[:5]],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(UserStatistics.objects.values_list('user_id', flat=True)),
+            {user.phone_number for user in self.users[:5]}
+        )
+
+        day = GroupStatistics.objects.order_by('date').first()
+        expected = day.total_messages
+        GroupStatistics.objects.filter(pk=day.pk).update(total_messages=0)
+        response = self.client.post('/admin/analytics/groupstatistics/', {
+            'action': 'recompute_daily_rollups', '_selected_action': [day.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        day.refresh_from_db()
+        self.assertEqual(day.total_messages, expected)
+
+    def test_message_edits_refresh_both_days(self):
+        message = Message.objects.filter(message_type='TEXT').order_by('timestamp').first()
+        old_day = message.local_date
+        new_time = local_time(2024, 6, 1, 23, 30)
+        response = self.client.post(f'/admin/whatsapp_messages/message/{message.pk}/change/', {
+            'sender': message.sender_id,
+            'content': 'moved',
+            'timestamp_0': new_time.strftime('%Y-%m-%d'),
+            'timestamp_1': new_time.strftime('%H:%M:%S'),
+            'message_type': 'TEXT',
+        })
+        self.assertEqual(response.status_code, 302)
+
+        message.refresh_from_db()
+        self.assertEqual((message.local_date, message.local_hour, message.content_length),
+                         (date(2024, 6, 1), 23, 5))
+        stored = set(GroupStatistics.objects.filter(date__in=(old_day, message.local_date)).values_list(
+            'date', 'total_messages', 'active_users'
+        ))
+        DailyRollupService().rebuild()
+        self.assertEqual(stored, set(GroupStatistics.objects.filter(
+            date__in=(old_day, message.local_date)
+        ).values_list('date', 'total_messages', 'active_users')))
+
+
+class ConcurrentQueryTests(TransactionTestCase):
+    """Pool threads use their own connections, so the data must be committed."""
+
+    def setUp(self):
+        self.users = seed_messages(message_count=300)
+        self.date_range = (datetime(2024, 1, 1), datetime(2024, 12, 31, 23, 59, 59))
+        self.service = AnalyticsService()
+
+    def test_results_match_serial_execution(self):
+        calls = [
+            lambda: self.service.calculate_group_metrics(self.date_range, 'week'),
+            lambda: self.service.get_activity_patterns(self.date_range),
+            lambda: self.service.calculate_user_metrics(self.users[0], self.date_range),
+        ]
+        concurrent = [call() for call in calls]
+        with self.settings(ANALYTICS_QUERY_WORKERS=1):
+            serial = [call() for call in calls]
+        self.assertEqual(concurrent, serial)
+
+    def test_queries_run_on_pool_threads(self):
+        threads = set()
+
+        def record_thread(execute, sql, params, many, context):
+            threads.add(threading.current_thread().name)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record_thread):
+            self.service.get_activity_patterns(self.date_range)
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith('analytics-query') for name in threads))
+
+    def test_serial_inside_a_transaction(self):
+        with transaction.atomic():
+            Message.objects.all().delete()
+            patterns = self.service.get_activity_patterns(self.date_range)
+        self.assertEqual(patterns['hourly_distribution'], [])
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.router = ReplicaRouter()
+
+    def test_fresh_replica_serves_reads(self):
+        heartbeat = self.now - timedelta(seconds=30)
+        self.assertEqual(choose_read_alias(heartbeat, None, self.now, is_staff=False), 'replica')
+        self.assertEqual(choose_read_alias(heartbeat, heartbeat, self.now, is_staff=True), 'replica')
+
+    def test_lagging_or_unknown_replica_falls_back_to_primary(self):
+        with self.settings(ANALYTICS_REPLICA_MAX_LAG_SECONDS=60):
+            stale = self.now - timedelta(seconds=61)
+            self.assertEqual(choose_read_alias(stale, None, self.now, is_staff=False), 'default')
+        self.assertEqual(choose_read_alias(None, None, self.now, is_staff=False), 'default')
+
+    def test_staff_read_their_imports(self):
+        heartbeat = self.now - timedelta(seconds=30)
+        imported = self.now - timedelta(seconds=10)
+        self.assertEqual(choose_read_alias(heartbeat, imported, self.now, is_staff=True), 'default')
+        self.assertEqual(choose_read_alias(heartbeat, imported, self.now, is_staff=False), 'replica')
+
+    def test_router_follows_read_context_and_writes_to_primary(self):
+        self.assertIsNone(self.router.db_for_read(Message))
+        with read_from('replica'):
+            self.assertEqual(self.router.db_for_read(Message), 'replica')
+            self.assertEqual(self.router.db_for_write(Message), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'whatsapp_messages'))
+
+    def test_reads_use_primary_without_a_replica(self):
+        self.assertEqual(monitor.read_alias_for(None), 'default')
+
+    def test_read_context_is_reset_when_the_action_raises(self):
+        user = User.objects.create(phone_number='+2348030000001')
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch.object(AnalyticsService, 'calculate_user_metrics', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                client.get(f'/api/analytics/{user.phone_number}/user_metrics/')
+
+        self.assertIsNone(self.router.db_for_read(Message))
+
+
+class RefreshReplicaTests(TransactionTestCase):
+    def test_copies_primary_with_heartbeat(self):
+        seed_messages(message_count=50)
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/replica.sqlite3'
+            with self.settings(DATABASE_REPLICA_PATH=path):
+                call_command('refresh_replica', stdout=io.StringIO())
+
+            replica = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                count = replica.execute('SELECT COUNT(*) FROM whatsapp_messages_message').fetchone()[0]
+                heartbeat = replica.execute(
+                    'SELECT position FROM analytics_analyticscursor WHERE name = ?', ['replica_heartbeat']
+                ).fetchone()
+            finally:
+                replica.close()
+        self.assertEqual(count, 50)
+        self.assertIsNotNone(heartbeat)
+
+
+class FrequentItemsTests(TestCase):
+    def stream(self, seed: int, length: int = 5000) -> list:
+        rng = random.Random(seed)
+        return [f'term{int(rng.paretovariate(1.2))}' for _ in range(length)]
+
+    def assertWithinFloor(self, sketch: FrequentItems, items: list):
+        truth = Counter(items)
+        self.assertLessEqual(len(sketch), 2 * sketch.capacity)
+        for item, true_count in truth.items():
+            if item in sketch.counts:
+                self.assertGreaterEqual(sketch.counts[item], true_count)
+                self.assertLessEqual(sketch.counts[item], true_count + sketch.floor)
+            else:
+                self.assertLessEqual(true_count, sketch.floor)
+
+    def test_exact_until_it_overflows(self):
+        sketch = FrequentItems(capacity=10)
+        sketch.update(['python', 'django', 'python', 'lagos', 'python', 'django'])
+        self.assertEqual(sketch.floor, 0)
+        self.assertEqual(sketch.top(2), [('python', 3), ('django', 2)])
+
+    def test_counts_stay_within_the_error_floor(self):
+        items = self.stream(seed=1)
+        sketch = FrequentItems(capacity=20)
+        sketch.update(items)
+        self.assertGreater(sketch.floor, 0)
+        self.assertWithinFloor(sketch, items)
+        self.assertEqual(sketch.top(1)[0][0], Counter(items).most_common(1)[0][0])
+
+    def test_merge(self):
+        first, second = self.stream(seed=1), self.stream(seed=2)
+        merged = FrequentItems(capacity=20)
+        merged.update(first)
+        other = FrequentItems(capacity=20)
+        other.update(second)
+        merged.merge(other)
+        self.assertWithinFloor(merged, first + second)
+
+        exact = FrequentItems(capacity=20)
+        exact.update(['a', 'b', 'a'])
+        other = FrequentItems(capacity=20)
+        other.update(['b', 'c'])
+        self.assertEqual(exact.merge(other).top(3), [('a', 2), ('b', 2), ('c', 1)])
+
+
+class ContentStatsTests(TestCase):
+    def setUp(self):
+        self.ada = User.objects.create(phone_number='+2348030000001')
+        self.bayo = User.objects.create(phone_number='+2348030000002')
+        self.client = APIClient()
+        self.client.force_authenticate(self.ada)
+
+    def create_messages(self):
+        for sender, timestamp, content in (
+            (self.ada, local_time(2024, 1, 5, 9), 'Python meetup 🔥 https://example.com/recap.'),
+            (self.bayo, local_time(2024, 1, 5, 9, 5), 'python python 🔥🔥'),
+            (self.ada, local_time(2024, 2, 1, 18), 'Django meetup 👍🏿'),
+            (self.bayo, local_time(2024, 2, 2, 8), 'see you at the meetup'),
+        ):
+            Message.objects.create(sender=sender, content=content, timestamp=timestamp)
+        Message.objects.create(sender=self.ada, content='image omitted', message_type='IMAGE',
+                               timestamp=local_time(2024, 2, 3, 8))
+
+    def stored_terms(self) -> set:
+        return set(TermFrequency.objects.values_list('user_id', 'month', 'kind', 'term', 'count'))
+
+    def test_tokenizer(self):
+        tokens = MessageTokenizer().tokenize(
+            "The Meetup is at https://example.com/recap). Don't miss it 👩🏽\u200d💻👍🏿🇳🇬 see www.lagos.dev!"
+        )
+        self.assertEqual(tokens[TermFrequency.WORD], ['meetup', "don't", 'miss', 'see'])
+        self.assertEqual(tokens[TermFrequency.EMOJI], ['👩🏽\u200d💻', '👍🏿', '🇳🇬'])
+        self.assertEqual(tokens[TermFrequency.LINK], ['https://example.com/recap', 'www.lagos.dev'])
+
+    def test_count_chunk_buckets_by_user_and_month(self):
+        counts = count_chunk([
+            (self.ada.phone_number, date(2024, 1, 5), 'python python'),
+            (self.bayo.phone_number, date(2024, 1, 31), 'python'),
+        ])
+        january = date(2024, 1, 1)
+        self.assertEqual(counts[self.ada.phone_number, january, TermFrequency.WORD], {'python': 2})
+        self.assertEqual(counts[None, january, TermFrequency.WORD], {'python': 3})
+        self.assertNotIn((None, january, TermFrequency.EMOJI), counts)
+
+    def test_batch_ingest_matches_rebuild(self):
+        self.create_messages()
+        rows = list(Message.objects.filter(is_media=False).order_by('timestamp').values_list(
+            'sender_id', 'local_date', 'content'
+        ))
+        service = ContentStatsService()
+        service.ingest(rows[:2])
+        service.ingest(rows[2:])
+        ingested = self.stored_terms()
+
+        service.rebuild()
+        self.assertEqual(ingested, self.stored_terms())
+        self.assertIn((None, date(2024, 1, 1), TermFrequency.WORD, 'python', 3), ingested)
+
+    def test_batch_ingest_keeps_the_long_tail(self):
+        # More distinct words than the API serves, fewer than the sketch holds
+        words = [f'word{chr(97 + index // 26)}{chr(97 + index % 26)}' for index in range(300)]
+        rows = [(self.ada.phone_number, date(2024, 1, 5), ' '.join(words[index:index + 20]))
+                for index in range(0, len(words), 20)] * 2
+        for timestamp, (_, _, content) in zip(range(len(rows)), rows):
+            Message.objects.create(sender=self.ada, content=content,
+                                   timestamp=local_time(2024, 1, 5, 9) + timedelta(minutes=timestamp))
+        service = ContentStatsService()
+        for index in range(0, len(rows), 4):
+            service.ingest(rows[index:index + 4])
+        ingested = self.stored_terms()
+
+        service.rebuild()
+        self.assertEqual(ingested, self.stored_terms())
+        self.assertEqual(
+            TermFrequency.objects.filter(user__isnull=True, kind=TermFrequency.WORD).count(), len(words)
+        )
+
+    def test_overflowing_ingest_stays_within_the_floor(self):
+        rng = random.Random(5)
+        words = [f'word{chr(97 + index // 26)}{chr(97 + index % 26)}' for index in range(300)]
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+        rows = [(self.ada.phone_number, date(2024, 1, 5), ' '.join(rng.choices(words, weights, k=10)))
+                for _ in range(400)]
+        service = ContentStatsService(capacity=20)
+        for index in range(0, len(rows), 50):
+            service.ingest(rows[index:index + 50])
+
+        truth = Counter(word for _, _, content in rows for word in content.split())
+        stored = TermFrequency.objects.filter(user__isnull=True, kind=TermFrequency.WORD)
+        self.assertGreater(stored[0].floor, 0)
+        for term, count, floor in stored.values_list('term', 'count', 'floor'):
+            self.assertLessEqual(truth[term], count)
+            self.assertLessEqual(count, truth[term] + floor)
+
+    def test_top_terms_responses(self):
+        self.create_messages()
+        ContentStatsService().rebuild()
+
+        response = self.client.get('/api/analytics/top_terms/?start_date=2024-01-01&end_date=2024-02-29&limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'words': [{'term': 'meetup', 'count': 3}, {'term': 'python', 'count': 3}],
+            'emojis': [{'term': '🔥', 'count': 3}, {'term': '👍🏿', 'count': 1}],
+            'links': [{'term': 'https://example.com/recap', 'count': 1}],
+        })
+
+        response = self.client.get(
+            f'/api/analytics/{self.ada.phone_number}/user_top_terms/?start_date=2024-02-01&end_date=2024-02-29'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'words': [{'term': 'django', 'count': 1}, {'term': 'meetup', 'count': 1}],
+            'emojis': [{'term': '👍🏿', 'count': 1}],
+            'links': [],
+        })
+
+
+class DistinctCountingTests(TestCase):
+    def test_exact_up_to_the_threshold(self):
+        counter = DistinctCounter()
+        counter.update(f'+234803{index:07d}' for index in range(256))
+        counter.update(['+2348030000000', '+2348030000001'])
+        self.assertIsNone(counter.hll)
+        self.assertEqual(counter.count(), 256)
+
+        counter.add('+2348039999999')
+        self.assertIsNotNone(counter.hll)
+
+    def test_estimates_within_tolerance_after_promotion(self):
+        for distinct in (300, 5000, 50000):
+            with self.subTest(distinct=distinct):
+                counter = DistinctCounter()
+                counter.update(f'member-{index}' for index in range(distinct))
+                self.assertIsNotNone(counter.hll)
+                # Standard error at precision 12 is about 1.6%
+                self.assertAlmostEqual(counter.count() / distinct, 1, delta=0.05)
+
+    def test_serialization_round_trip(self):
+        for distinct in (0, 10, 1000):
+            with self.subTest(distinct=distinct):
+                counter = DistinctCounter()
+                counter.update(f'member-{index}' for index in range(distinct))
+                restored = DistinctCounter.from_bytes(counter.to_bytes())
+                self.assertEqual(restored.count(), counter.count())
+                self.assertEqual(restored.to_bytes(), counter.to_bytes())
+
+    def test_merge_a_set_with_a_hyperloglog(self):
+        small = DistinctCounter()
+        small.update(f'member-{index}' for index in range(900, 1100))
+        large = DistinctCounter()
+        large.update(f'member-{index}' for index in range(1000))
+
+        for merged in (DistinctCounter.from_bytes(small.to_bytes()).merge(large),
+                       DistinctCounter.from_bytes(large.to_bytes()).merge(small)):
+            self.assertIsNotNone(merged.hll)
+            self.assertAlmostEqual(merged.count() / 1100, 1, delta=0.05)
+
+        with self.assertRaises(ValueError):
+            HyperLogLog(12).merge(HyperLogLog(10))
+
+    def test_group_active_users_over_several_days(self):
+        users = User.objects.bulk_create([User(phone_number=f'+234803{index:07d}') for index in range(400)])
+        messages = []
+        for index, user in enumerate(users):
+            # Each member is active on two of three days, so every day has more than 256 senders
+            for day in {1, 2, 3} - {index % 3 + 1}:
+                timestamp = local_time(2024, 3, day, 8) + timedelta(seconds=index)
+                messages.append(Message(sender=user, content='hello', timestamp=timestamp,
+                                        **derived_message_fields(timestamp, 'hello', 'TEXT')))
+        Message.objects.bulk_create(messages)
+        DailyRollupService().rebuild()
+        service = AnalyticsService()
+
+        for first, last in ((1, 3), (1, 2), (2, 2)):
+            with self.subTest(first=first, last=last):
+                distinct = Message.objects.filter(
+                    local_date__range=(date(2024, 3, first), date(2024, 3, last))
+                ).values('sender').distinct().count()
+                metrics = service.calculate_group_metrics((local_time(2024, 3, first), local_time(2024, 3, last, 23)))
+                self.assertAlmostEqual(metrics['active_users'] / distinct, 1, delta=0.05)
+
+        # Below the threshold every day sketch, and their merge, is exact
+        Message.objects.filter(sender__in=users[12:]).delete()
+        DailyRollupService().rebuild()
+        metrics = service.calculate_group_metrics((local_time(2024, 3, 1), local_time(2024, 3, 3, 23)))
+        self.assertEqual(metrics['active_users'], 12)
+
+
+class RollupSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ada = User.objects.create(phone_number='+2348030000001')
+        cls.bayo = User.objects.create(phone_number='+2348030000002')
+        for sender, timestamp, content, message_type in (
+            (cls.ada, local_time(2024, 1, 1, 8), 'hello', 'TEXT'),
+            (cls.bayo, local_time(2024, 1, 1, 8, 30), 'hi there', 'TEXT'),
+            (cls.ada, local_time(2024, 1, 1, 9, 15), 'image omitted', 'IMAGE'),
+            # Sunday night in UTC, Monday 00:30 in Lagos
+            (cls.ada, datetime(2024, 1, 7, 23, 30, tzinfo=dt_timezone.utc), 'late', 'TEXT'),
+            (cls.bayo, local_time(2024, 1, 31, 12), 'lunch', 'TEXT'),
+            # January in UTC, February in Lagos
+            (cls.ada, datetime(2024, 1, 31, 23, 30, tzinfo=dt_timezone.utc), 'feb', 'TEXT'),
+        ):
+            Message.objects.create(sender=sender, content=content, timestamp=timestamp, message_type=message_type)
+        DailyRollupService().rebuild()
+
+    def setUp(self):
+        self.rollups = DailyRollupService()
+
+    def group_rows(self, granularity: str) -> list:
+        return [
+            (row['period'], row['date'], row['total_messages'], row['active_users'], row['media_count'], row['peak_hour'])
+            for row in self.rollups.group_series(date(2024, 1, 1), date(2024, 2, 29), granularity)
+        ]
+
+    def user_rows(self, series: list) -> list:
+        return [(row['date'], row['message_count'], row['media_count'], row['avg_length']) for row in series]
+
+    def test_group_buckets(self):
+        self.assertEqual(self.group_rows('hour'), [
+            (local_time(2024, 1, 1, 8), date(2024, 1, 1), 2, 2, 0, 8),
+            (local_time(2024, 1, 1, 9), date(2024, 1, 1), 1, 1, 1, 9),
+            (local_time(2024, 1, 8, 0), date(2024, 1, 8), 1, 1, 0, 0),
+            (local_time(2024, 1, 31, 12), date(2024, 1, 31), 1, 1, 0, 12),
+            (local_time(2024, 2, 1, 0), date(2024, 2, 1), 1, 1, 0, 0),
+        ])
+        self.assertEqual(self.group_rows('day'), [
+            (local_time(2024, 1, 1), date(2024, 1, 1), 3, 2, 1, 8),
+            (local_time(2024, 1, 8), date(2024, 1, 8), 1, 1, 0, 0),
+            (local_time(2024, 1, 31), date(2024, 1, 31), 1, 1, 0, 12),
+            (local_time(2024, 2, 1), date(2024, 2, 1), 1, 1, 0, 0),
+        ])
+        # Weeks start on Monday: 2024-01-01, 2024-01-08 and 2024-01-29
+        self.assertEqual(self.group_rows('week'), [
+            (local_time(2024, 1, 1), date(2024, 1, 1), 3, 2, 1, 8),
+            (local_time(2024, 1, 8), date(2024, 1, 8), 1, 1, 0, 0),
+            (local_time(2024, 1, 29), date(2024, 1, 29), 2, 2, 0, 0),
+        ])
+        self.assertEqual(self.group_rows('month'), [
+            (local_time(2024, 1, 1), date(2024, 1, 1), 5, 2, 1, 8),
+            (local_time(2024, 2, 1), date(2024, 2, 1), 1, 1, 0, 0),
+        ])
+
+    def test_user_buckets(self):
+        self.assertEqual(self.user_rows(self.rollups.user_series(self.ada, date(2024, 1, 1), date(2024, 2, 29), 'week')), [
+            (date(2024, 1, 1), 2, 1, 5.0),
+            (date(2024, 1, 8), 1, 0, 4.0),
+            (date(2024, 1, 29), 1, 0, 3.0),
+        ])
+        self.assertEqual(self.user_rows(self.rollups.user_series(self.ada, date(2024, 1, 1), date(2024, 1, 31), 'month')), [
+            (date(2024, 1, 1), 3, 1, 4.5),
+        ])
+        self.assertEqual(self.user_rows(self.rollups.user_series(self.ada, date(2024, 1, 1), date(2024, 1, 1), 'hour')), [
+            (date(2024, 1, 1), 1, 0, 5.0),
+            (date(2024, 1, 1), 1, 1, None),
+        ])
+
+        series = self.rollups.users_series([self.ada, self.bayo], date(2024, 1, 2), date(2024, 2, 29))
+        self.assertEqual({user: self.user_rows(rows) for user, rows in series.items()}, {
+            self.ada.phone_number: [(date(2024, 1, 8), 1, 0, 4.0), (date(2024, 2, 1), 1, 0, 3.0)],
+            self.bayo.phone_number: [(date(2024, 1, 31), 1, 0, 5.0)],
+        })
+
+    def test_end_date_is_inclusive(self):
+        client = APIClient()
+        client.force_authenticate(self.ada)
+        for end_date, total in (('2024-01-07', 3), ('2024-01-08', 4)):
+            with self.subTest(end_date=end_date):
+                response = client.get(f'/api/analytics/group_metrics/?start_date=2024-01-01&end_date={end_date}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['total_messages'], total)
+
+        # Trends run up to and including today
+        today = timezone.localdate()
+        Message.objects.create(sender=self.ada, content='today',
+                               timestamp=timezone.make_aware(datetime.combine(today, time.min)))
+        self.rollups.refresh_days([today])
+        response = client.get(f'/api/analytics/{self.ada.phone_number}/user_trends/?days=7')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['daily_stats'][-1]['date'], today.isoformat())
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        self.gap = timedelta(minutes=settings.ANALYTICS_SESSION_GAP_MINUTES)
+
+    def stored_sessions(self) -> list:
+        sessions = ConversationSession.objects.order_by('started_at').prefetch_related('participants')
+        return [
+            (session.started_at, session.ended_at, session.starter_id, session.message_count,
+             session.burst_count, session.duration_seconds,
+             sorted(user.phone_number for user in session.participants.all()))
+            for session in sessions
+        ]
+
+    def session_digests(self) -> dict:
+        return dict(GroupStatistics.objects.values_list('date', 'session_digest'))
+
+    def test_segmenter_splits_after_the_gap(self):
+        start = local_time(2024, 3, 1, 10)
+        messages = [
+            (start, 'ada'),
+            (start + timedelta(minutes=1), 'ada'),
+            (start + timedelta(minutes=2), 'bayo'),
+            # Exactly one gap after the previous message still continues the session
+            (start + timedelta(minutes=2) + self.gap, 'ada'),
+            (start + timedelta(minutes=2) + 2 * self.gap + timedelta(seconds=1), 'cyan'),
+        ]
+        sessions = list(SessionSegmenter(self.gap).segment(messages))
+
+        self.assertEqual(
+            [(session.started_at, session.ended_at, session.starter, session.message_count,
+              session.burst_count, session.participants) for session in sessions],
+            [
+                (messages[0][0], messages[3][0], 'ada', 4, 3, {'ada', 'bayo'}),
+                (messages[4][0], messages[4][0], 'cyan', 1, 1, {'cyan'}),
+            ]
+        )
+
+    def test_update_from_matches_rebuild(self):
+        users = seed_messages(message_count=200)
+        last = Message.objects.order_by('timestamp').last().timestamp
+        service = SessionService()
+
+        # The first message extends the last session, the others open new ones
+        batch = [last + timedelta(minutes=5), last + self.gap + timedelta(minutes=6),
+                 last + timedelta(hours=3), last + timedelta(hours=3, minutes=1)]
+        for index, timestamp in enumerate(batch):
+            Message.objects.create(sender=users[index], content='hello', timestamp=timestamp)
+        DailyRollupService().refresh_days({timezone.localdate(timestamp) for timestamp in batch})
+        service.update_from(batch[0])
+        updated, updated_digests = self.stored_sessions(), self.session_digests()
+
+        service.rebuild()
+        self.assertEqual(updated, self.stored_sessions())
+        self.assertEqual(updated_digests, self.session_digests())
+        extended = updated[-3]
+        self.assertLessEqual(extended[0], last)
+        self.assertEqual(extended[1], batch[0])
+
+    def test_session_payloads(self):
+        ada, bayo, cyan = User.objects.bulk_create([
+            User(phone_number=f'+234803000000{index}') for index in range(1, 4)
+        ])
+        for sender, timestamp in (
+            (ada, local_time(2024, 3, 1, 10)), (bayo, local_time(2024, 3, 1, 10, 10)),
+            (bayo, local_time(2024, 3, 1, 10, 20)), (ada, local_time(2024, 3, 1, 10, 40)),
+            (bayo, local_time(2024, 3, 1, 12)), (ada, local_time(2024, 3, 1, 12) + self.gap),
+            (cyan, local_time(2024, 3, 1, 15)),
+        ):
+            Message.objects.create(sender=sender, content='hello', timestamp=timestamp)
+        SessionService().rebuild()
+        client = APIClient()
+        client.force_authenticate(ada)
+        dates = 'start_date=2024-03-01&end_date=2024-03-01'
+        # Naive range bounds would make Django warn on every session filter
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = client.get(f'/api/analytics/group_sessions/?{dates}')
+            self.assertEqual(response.status_code, 200)
+            starters = response.data.pop('top_starters')
+            self.assertEqual(response.data, {
+                'total_sessions': 3,
+                'avg_messages_per_session': 2.33,
+                'avg_duration_seconds': 1400.0,
+                'longest_duration_seconds': 2400.0,
+                'avg_burst_length': 1.17,
+            })
+            self.assertCountEqual(
+                [(row['starter__phone_number'], row['sessions_started']) for row in starters],
+                [(ada.phone_number, 1), (bayo.phone_number, 1), (cyan.phone_number, 1)]
+            )
+
+            response = client.get(f'/api/analytics/{ada.phone_number}/user_sessions/?{dates}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, {
+                'sessions_started': 1,
+                'sessions_joined': 2,
+                'avg_messages_per_session': 3.0,
+                'avg_duration_seconds': 2100.0,
+            })
+
+
+class InteractionGraphTests(TestCase):
+    def setUp(self):
+        self.window = timedelta(minutes=settings.ANALYTICS_REPLY_WINDOW_MINUTES)
+        self.half_life = timedelta(days=settings.ANALYTICS_INTERACTION_HALF_LIFE_DAYS)
+
+    def stored_edges(self) -> set:
+        return {
+            (source, target, count, round(weight, 9), weight_at)
+            for source, target, count, weight, weight_at in Interaction.objects.values_list(
+                'source_id', 'target_id', 'reply_count', 'weight', 'weight_at'
+            )
+        }
+
+    def test_pairs_only_inside_the_reply_window(self):
+        start = local_time(2024, 3, 1, 10)
+        builder = InteractionGraphBuilder(self.window, self.half_life)
+        builder.consume([
+            (start, 'ada'),
+            (start + self.window, 'bayo'),
+            (start + self.window + timedelta(minutes=1), 'bayo'),
+            (start + 2 * self.window + timedelta(minutes=1, seconds=1), 'ada'),
+        ])
+        self.assertEqual({edge: weight.count for edge, weight in builder.edges.items()}, {('bayo', 'ada'): 1})
+
+        # A builder seeded with the last message pairs across batches
+        seeded = InteractionGraphBuilder(self.window, self.half_life, builder.last)
+        seeded.feed(builder.last[0] + timedelta(minutes=1), 'cyan')
+        self.assertEqual(list(seeded.edges), [('cyan', 'ada')])
+
+    def test_weights_halve_every_half_life(self):
+        start = local_time(2024, 3, 1, 10)
+        weight = DecayedWeight()
+        weight.add(start, self.half_life)
+        self.assertAlmostEqual(weight.value_at(start + self.half_life, self.half_life), 0.5)
+
+        weight.add(start + self.half_life, self.half_life)
+        self.assertAlmostEqual(weight.weight, 1.5)
+        self.assertEqual(weight.at, start + self.half_life)
+
+        # An older reply is folded in at the current reference time
+        weight.add(start, self.half_life)
+        self.assertAlmostEqual(weight.weight, 2.0)
+        self.assertEqual((weight.count, weight.at), (3, start + self.half_life))
+
+    def test_update_matches_rebuild(self):
+        users = seed_messages(message_count=200)
+        last = Message.objects.order_by('timestamp').last()
+        service = InteractionGraphService()
+
+        # The first new message shares the cursor's timestamp
+        batch = [last.timestamp, last.timestamp + timedelta(minutes=2), last.timestamp + timedelta(minutes=3)]
+        senders = [user for user in users if user != last.sender][:3]
+        for sender, timestamp in zip(senders, batch):
+            Message.objects.create(sender=sender, content='hello', timestamp=timestamp)
+        self.assertEqual(service.update(since=batch[0]), 3)
+        updated = self.stored_edges()
+
+        service.rebuild()
+        self.assertEqual(updated, self.stored_edges())
+
+    def test_out_of_order_import_rebuilds(self):
+        users = seed_messages(message_count=200)
+        service = InteractionGraphService()
+        first = Message.objects.order_by('timestamp').first()
+        older = first.timestamp - timedelta(minutes=1)
+        Message.objects.create(sender=next(user for user in users if user != first.sender),
+                               content='hello', timestamp=older)
+
+        with mock.patch.object(service, 'rebuild', wraps=service.rebuild) as rebuild:
+            service.update(since=older)
+        rebuild.assert_called_once_with()
+        updated = self.stored_edges()
+
+        service.rebuild()
+        self.assertEqual(updated, self.stored_edges())
+
+    def test_partners_and_pairs_are_ranked_by_decayed_weight(self):
+        ada, bayo, cyan = User.objects.bulk_create([
+            User(phone_number=f'+234803000000{index}') for index in range(1, 4)
+        ])
+        # Four early replies between ada and bayo, two recent ones between ada and cyan
+        early, recent = local_time(2024, 1, 1, 10), local_time(2024, 3, 1, 10)
+        messages = [(ada, early), (bayo, early + timedelta(minutes=1)), (ada, early + timedelta(minutes=2)),
+                    (bayo, early + timedelta(minutes=3)), (ada, early + timedelta(minutes=4)),
+                    (ada, recent), (cyan, recent + timedelta(minutes=1)), (ada, recent + timedelta(minutes=2))]
+        for sender, timestamp in messages:
+            Message.objects.create(sender=sender, content='hello', timestamp=timestamp)
+        InteractionGraphService().rebuild()
+        reference = recent + timedelta(minutes=2)
+
+        def decayed(*replies):
+            return round(sum(0.5 ** ((reference - timestamp) / self.half_life) for timestamp in replies), 4)
+
+        bayo_weight = decayed(*(early + timedelta(minutes=minute) for minute in range(1, 5)))
+        cyan_weight = decayed(recent + timedelta(minutes=1), recent + timedelta(minutes=2))
+        client = APIClient()
+        client.force_authenticate(ada)
+
+        response = client.get(f'/api/analytics/{ada.phone_number}/user_partners/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'phone_number': cyan.phone_number, 'replies_sent': 1, 'replies_received': 1, 'weight': cyan_weight},
+            {'phone_number': bayo.phone_number, 'replies_sent': 2, 'replies_received': 2, 'weight': bayo_weight},
+        ])
+
+        response = client.get('/api/analytics/interaction_pairs/?limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'member': ada.phone_number, 'partner': cyan.phone_number, 'reply_count': 2, 'weight': cyan_weight},
+        ])
+        # More replies, but older ones
+        self.assertLess(bayo_weight, cyan_weight)
+
+
+class QuantileTests(TestCase):
+    def exponential(self, count: int = 20000) -> list:
+        rng = random.Random(7)
+        return [rng.expovariate(1 / 60) for _ in range(count)]
+
+    def assertCloseToExact(self, digest: TDigest, values: list):
+        ordered = sorted(values)
+        for q in (0.5, 0.9, 0.99):
+            with self.subTest(q=q):
+                self.assertAlmostEqual(digest.quantile(q) / ordered[int(q * len(ordered))], 1, delta=0.02)
+
+    def test_percentiles_match_exact_quantiles(self):
+        values = self.exponential()
+        digest = TDigest()
+        digest.update(values)
+        self.assertEqual(len(digest), len(values))
+        self.assertLess(len(digest.means), 200)
+        self.assertAlmostEqual(digest.mean(), sum(values) / len(values))
+        self.assertCloseToExact(digest, values)
+
+    def test_merge_and_serialization_round_trips(self):
+        values = self.exponential()
+        parts = [TDigest() for _ in range(10)]
+        for index, value in enumerate(values):
+            parts[index % 10].add(value)
+
+        merged = TDigest()
+        for part in parts:
+            restored = TDigest.from_bytes(part.to_bytes())
+            self.assertEqual(restored.to_bytes(), part.to_bytes())
+            merged.merge(restored)
+        self.assertEqual(len(merged), len(values))
+        self.assertCloseToExact(merged, values)
+        self.assertEqual(TDigest.from_bytes(merged.to_bytes()).quantile(0.9), merged.quantile(0.9))
+
+    def test_empty_digest(self):
+        for digest in (TDigest(), TDigest.from_bytes(TDigest().to_bytes()), TDigest().merge(TDigest())):
+            self.assertEqual(len(digest), 0)
+            self.assertIsNone(digest.mean())
+            self.assertIsNone(digest.quantile(0.5))
+
+    def test_quantile_responses(self):
+        ada, bayo = User.objects.bulk_create([User(phone_number='+2348030000001'), User(phone_number='+2348030000002')])
+        # Gaps of 1 to 4 minutes between ada's messages; bayo's image starts a second session
+        for sender, timestamp, length, message_type in (
+            (ada, local_time(2024, 3, 1, 10), 10, 'TEXT'), (ada, local_time(2024, 3, 1, 10, 1), 20, 'TEXT'),
+            (bayo, local_time(2024, 3, 1, 10, 2), 5, 'TEXT'), (ada, local_time(2024, 3, 1, 10, 3), 30, 'TEXT'),
+            (ada, local_time(2024, 3, 1, 10, 6), 40, 'TEXT'), (ada, local_time(2024, 3, 1, 10, 10), 50, 'TEXT'),
+            (bayo, local_time(2024, 3, 1, 12), 13, 'IMAGE'),
+        ):
+            Message.objects.create(sender=sender, content='x' * length, timestamp=timestamp, message_type=message_type)
+        DailyRollupService().rebuild()
+        SessionService().rebuild()
+        client = APIClient()
+        client.force_authenticate(ada)
+        gaps = {'count': 4, 'mean': 150.0, 'p50': 150.0, 'p90': 240.0, 'p99': 240.0}
+
+        response = client.get(f'/api/analytics/{ada.phone_number}/user_quantiles/?start_date=2024-03-01&end_date=2024-03-01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'message_gap': gaps,
+            'message_length': {'count': 5, 'mean': 30.0, 'p50': 30.0, 'p90': 50.0, 'p99': 50.0},
+        })
+
+        response = client.get('/api/analytics/group_quantiles/?start_date=2024-03-01&end_date=2024-03-01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'message_gap': gaps,
+            'message_length': {'count': 6, 'mean': 25.83, 'p50': 25.0, 'p90': 49.0, 'p99': 50.0},
+            'session_length': {'count': 2, 'mean': 300.0, 'p50': 300.0, 'p90': 600.0, 'p99': 600.0},
+        })
+
+        response = client.get('/api/analytics/group_quantiles/?start_date=2024-04-01&end_date=2024-04-30')
+        empty = {'count': 0, 'mean': None, 'p50': None, 'p90': None, 'p99': None}
+        self.assertEqual(response.json(), {'message_gap': empty, 'message_length': empty, 'session_length': empty})
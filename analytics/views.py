@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, time
+from django.conf import settings
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -7,25 +8,46 @@ from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
 from .services import AnalyticsService
+from .content import ContentStatsService, TERMS_PER_BUCKET
+from .rollups import GRANULARITIES
+from .sessions import SessionService
+from .graph import InteractionGraphService
+from .quantiles import QuantileService
+from .profiling import ProfilingMixin
+from .encoders import encode
+from whatsapp_analytics.db_router import ReplicaReadMixin
 from users.models import User
 from .models import UserStatistics, GroupStatistics
 from .serializers import (
     UserStatisticsSerializer,
     GroupStatisticsSerializer,
-    UserTrendsSerializer,
+    UserTrendsResponseSerializer,
     ActivityPatternSerializer,
     UserMetricsSerializer,
-    GroupMetricsSerializer
+    BatchUserMetricsRequestSerializer,
+    BatchUserMetricsSerializer,
+    GroupMetricsSerializer,
+    TopTermsSerializer,
+    GroupSessionStatsSerializer,
+    UserSessionStatsSerializer,
+    InteractionPartnerSerializer,
+    InteractionPairSerializer,
+    UserQuantilesSerializer,
+    GroupQuantilesSerializer
 )
 
 
-class AnalyticsViewSet(viewsets.ViewSet):
+class AnalyticsViewSet(ProfilingMixin, ReplicaReadMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = UserMetricsSerializer
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.analytics_service = AnalyticsService()
+        self.content_service = ContentStatsService()
+        self.session_service = SessionService()
+        self.interaction_service = InteractionGraphService()
+        self.quantile_service = QuantileService()
 
     @extend_schema(
         tags=['analytics'],
@@ -71,8 +93,7 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 return date_range
 
             metrics = self.analytics_service.calculate_user_metrics(user, date_range)
-            serializer = UserMetricsSerializer(metrics)
-            return Response(serializer.data)
+            return Response(encode(UserMetricsSerializer, metrics))
             
         except User.DoesNotExist:
             return Response(
@@ -86,6 +107,44 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
+    @extend_schema(
+        tags=['analytics'],
+        request=BatchUserMetricsRequestSerializer,
+        responses={
+            200: BatchUserMetricsSerializer,
+            400: OpenApiResponse(description="Invalid phone number list or date range")
+        },
+        description=(
+            f"Get analytics metrics for up to {settings.ANALYTICS_MAX_BATCH_USERS} users at once, keyed by phone number. "
+            "start_date and end_date (YYYY-MM-DD) are optional; unknown numbers are listed in not_found."
+        ),
+    )
+    @action(detail=False, methods=['post'])
+    def batch_user_metrics(self, request):
+        """Get analytics for many users with a fixed number of queries."""
+        serializer = BatchUserMetricsRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        phone_numbers = list(dict.fromkeys(serializer.validated_data['phone_numbers']))
+        users = User.objects.filter(phone_number__in=phone_numbers).only('phone_number')
+        found = {user.phone_number: user for user in users}
+
+        date_range = None
+        if 'start_date' in serializer.validated_data:
+            date_range = (
+                datetime.combine(serializer.validated_data['start_date'], time.min),
+                datetime.combine(serializer.validated_data['end_date'], time.max)
+            )
+
+        metrics = self.analytics_service.calculate_users_metrics(
+            [found[number] for number in phone_numbers if number in found], date_range
+        )
+        return Response(encode(BatchUserMetricsSerializer, {
+            'results': metrics,
+            'not_found': [number for number in phone_numbers if number not in found]
+        }))
+
     @extend_schema(
         tags=['analytics'],
         parameters=[
@@ -105,10 +164,19 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 default=30,
                 required=False
             ),
+            OpenApiParameter(
+                name='granularity',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Bucket size of the returned series',
+                enum=GRANULARITIES,
+                default='day',
+                required=False
+            ),
         ],
         responses={
-            200: UserTrendsSerializer(many=True),
-            400: OpenApiResponse(description="Invalid days parameter"),
+            200: UserTrendsResponseSerializer,
+            400: OpenApiResponse(description="Invalid days or granularity parameter"),
             404: OpenApiResponse(description="User not found")
         },
         description="Get trend analysis for a specific user",
@@ -125,13 +193,13 @@ class AnalyticsViewSet(viewsets.ViewSet):
                     {'error': 'Days parameter must be between 1 and 365'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+
+            granularity = self._get_granularity_from_params(request.query_params)
+            if isinstance(granularity, Response):
+                return granularity
                 
-            trends = self.analytics_service.get_user_trends(user, days)
-            serializer = UserTrendsSerializer(trends['daily_stats'], many=True)
-            return Response({
-                'daily_stats': serializer.data,
-                'trend': trends['trend']
-            })
+            trends = self.analytics_service.get_user_trends(user, days, granularity)
+            return Response(encode(UserTrendsResponseSerializer, trends))
             
         except ValueError:
             return Response(
@@ -163,10 +231,19 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 required=False,
                 pattern=r'^\d{4}-\d{2}-\d{2}$'
             ),
+            OpenApiParameter(
+                name='granularity',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Bucket size of the returned series',
+                enum=GRANULARITIES,
+                default='day',
+                required=False
+            ),
         ],
         responses={
             200: GroupMetricsSerializer,
-            400: OpenApiResponse(description="Invalid date format")
+            400: OpenApiResponse(description="Invalid date format or granularity")
         },
         description="Get group-wide analytics metrics",
     )
@@ -177,9 +254,12 @@ class AnalyticsViewSet(viewsets.ViewSet):
         if isinstance(date_range, Response):
             return date_range
 
-        metrics = self.analytics_service.calculate_group_metrics(date_range)
-        serializer = GroupMetricsSerializer(metrics)
-        return Response(serializer.data)
+        granularity = self._get_granularity_from_params(request.query_params)
+        if isinstance(granularity, Response):
+            return granularity
+
+        metrics = self.analytics_service.calculate_group_metrics(date_range, granularity)
+        return Response(encode(GroupMetricsSerializer, metrics))
 
     @extend_schema(
         tags=['analytics'],
@@ -213,8 +293,318 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 return date_range
 
             patterns = self.analytics_service.get_activity_patterns(date_range)
-            serializer = ActivityPatternSerializer(patterns)
-            return Response(serializer.data)
+            return Response(encode(ActivityPatternSerializer, patterns))
+
+    @extend_schema(
+        tags=['analytics'],
+        parameters=[
+            OpenApiParameter(
+                name='pk',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.PATH,
+                description='User phone number',
+                required=True,
+                pattern=r'^\+\d{1,15}$'
+            ),
+            OpenApiParameter(
+                name='start_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Start date (YYYY-MM-DD)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='end_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='End date (YYYY-MM-DD)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='limit',
+                type=int,
+                location=OpenApiParameter.QUERY,
+                description=f'Number of terms per kind (1-{TERMS_PER_BUCKET})',
+                default=20,
+                required=False
+            ),
+        ],
+        responses={
+            200: TopTermsSerializer,
+            400: OpenApiResponse(description="Invalid date format or limit"),
+            404: OpenApiResponse(description="User not found")
+        },
+        description="Get the most used words, emojis and links of a specific user",
+    )
+    @action(detail=True, methods=['get'])
+    def user_top_terms(self, request, pk=None):
+        """Get the most used words, emojis and links of a specific user."""
+        user = get_object_or_404(User, phone_number=pk)
+        return self._top_terms_response(request, user)
+
+    @extend_schema(
+        tags=['analytics'],
+        parameters=[
+            OpenApiParameter(
+                name='start_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Start date (YYYY-MM-DD)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='end_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='End date (YYYY-MM-DD)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='limit',
+                type=int,
+                location=OpenApiParameter.QUERY,
+                description=f'Number of terms per kind (1-{TERMS_PER_BUCKET})',
+                default=20,
+                required=False
+            ),
+        ],
+        responses={
+            200: TopTermsSerializer,
+            400: OpenApiResponse(description="Invalid date format or limit")
+        },
+        description="Get the most used words, emojis and links of the group",
+    )
+    @action(detail=False, methods=['get'])
+    def top_terms(self, request):
+        """Get the most used words, emojis and links of the group."""
+        return self._top_terms_response(request)
+
+    @extend_schema(
+        tags=['analytics'],
+        parameters=[
+            OpenApiParameter(
+                name='pk',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.PATH,
+                description='User phone number',
+                required=True,
+                pattern=r'^\+\d{1,15}$'
+            ),
+            OpenApiParameter(
+                name='start_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Start date (YYYY-MM-DD)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='end_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='End date (YYYY-MM-DD)',
+                required=False
+            ),
+        ],
+        responses={
+            200: UserSessionStatsSerializer,
+            400: OpenApiResponse(description="Invalid date format"),
+            404: OpenApiResponse(description="User not found")
+        },
+        description="Get conversation session statistics for a specific user",
+    )
+    @action(detail=True, methods=['get'])
+    def user_sessions(self, request, pk=None):
+        """Get conversation session statistics for a specific user."""
+        user = get_object_or_404(User, phone_number=pk)
+
+        date_range = self._get_date_range_from_params(request.query_params)
+        if isinstance(date_range, Response):
+            return date_range
+
+        stats = self.session_service.user_stats(user, date_range or self._default_date_range())
+        return Response(encode(UserSessionStatsSerializer, stats))
+
+    @extend_schema(
+        tags=['analytics'],
+        parameters=[
+            OpenApiParameter(
+                name='start_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Start date (YYYY-MM-DD)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='end_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='End date (YYYY-MM-DD)',
+                required=False
+            ),
+        ],
+        responses={
+            200: GroupSessionStatsSerializer,
+            400: OpenApiResponse(description="Invalid date format")
+        },
+        description="Get conversation session statistics for the group",
+    )
+    @action(detail=False, methods=['get'])
+    def group_sessions(self, request):
+        """Get conversation session statistics for the group."""
+        date_range = self._get_date_range_from_params(request.query_params)
+        if isinstance(date_range, Response):
+            return date_range
+
+        stats = self.session_service.group_stats(date_range or self._default_date_range())
+        return Response(encode(GroupSessionStatsSerializer, stats))
+
+    @extend_schema(
+        tags=['analytics'],
+        parameters=[
+            OpenApiParameter(
+                name='pk',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.PATH,
+                description='User phone number',
+                required=True,
+                pattern=r'^\+\d{1,15}$'
+            ),
+            OpenApiParameter(
+                name='limit',
+                type=int,
+                location=OpenApiParameter.QUERY,
+                description='Number of results (1-100)',
+                default=10,
+                required=False
+            ),
+        ],
+        responses={
+            200: InteractionPartnerSerializer(many=True),
+            400: OpenApiResponse(description="Invalid limit parameter"),
+            404: OpenApiResponse(description="User not found")
+        },
+        description="Get the members a specific user talks to most",
+    )
+    @action(detail=True, methods=['get'])
+    def user_partners(self, request, pk=None):
+        """Get the members a specific user talks to most."""
+        user = get_object_or_404(User, phone_number=pk)
+
+        limit = self._get_limit_from_params(request.query_params, default=10, maximum=100)
+        if isinstance(limit, Response):
+            return limit
+
+        partners = self.interaction_service.top_partners(user, limit)
+        return Response(encode(InteractionPartnerSerializer, partners, many=True))
+
+    @extend_schema(
+        tags=['analytics'],
+        parameters=[
+            OpenApiParameter(
+                name='limit',
+                type=int,
+                location=OpenApiParameter.QUERY,
+                description='Number of results (1-100)',
+                default=10,
+                required=False
+            ),
+        ],
+        responses={
+            200: InteractionPairSerializer(many=True),
+            400: OpenApiResponse(description="Invalid limit parameter")
+        },
+        description="Get the pairs of members with the strongest reply interaction",
+    )
+    @action(detail=False, methods=['get'])
+    def interaction_pairs(self, request):
+        """Get the pairs of members with the strongest reply interaction."""
+        limit = self._get_limit_from_params(request.query_params, default=10, maximum=100)
+        if isinstance(limit, Response):
+            return limit
+
+        pairs = self.interaction_service.strongest_pairs(limit)
+        return Response(encode(InteractionPairSerializer, pairs, many=True))
+
+    @extend_schema(
+        tags=['analytics'],
+        parameters=[
+            OpenApiParameter(
+                name='pk',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.PATH,
+                description='User phone number',
+                required=True,
+                pattern=r'^\+\d{1,15}$'
+            ),
+            OpenApiParameter(
+                name='start_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Start date (YYYY-MM-DD)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='end_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='End date (YYYY-MM-DD)',
+                required=False
+            ),
+        ],
+        responses={
+            200: UserQuantilesSerializer,
+            400: OpenApiResponse(description="Invalid date format"),
+            404: OpenApiResponse(description="User not found")
+        },
+        description="Get p50/p90/p99 of message gaps (seconds) and message length for a specific user",
+    )
+    @action(detail=True, methods=['get'])
+    def user_quantiles(self, request, pk=None):
+        """Get message gap and length percentiles for a specific user."""
+        user = get_object_or_404(User, phone_number=pk)
+
+        date_range = self._get_date_range_from_params(request.query_params)
+        if isinstance(date_range, Response):
+            return date_range
+
+        start_date, end_date = date_range or self._default_date_range()
+        quantiles = self.quantile_service.user_quantiles(user, start_date.date(), end_date.date())
+        return Response(encode(UserQuantilesSerializer, quantiles))
+
+    @extend_schema(
+        tags=['analytics'],
+        parameters=[
+            OpenApiParameter(
+                name='start_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Start date (YYYY-MM-DD)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='end_date',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='End date (YYYY-MM-DD)',
+                required=False
+            ),
+        ],
+        responses={
+            200: GroupQuantilesSerializer,
+            400: OpenApiResponse(description="Invalid date format")
+        },
+        description="Get p50/p90/p99 of message gaps, message length and session length for the group",
+    )
+    @action(detail=False, methods=['get'])
+    def group_quantiles(self, request):
+        """Get message gap, message length and session length percentiles for the group."""
+        date_range = self._get_date_range_from_params(request.query_params)
+        if isinstance(date_range, Response):
+            return date_range
+
+        start_date, end_date = date_range or self._default_date_range()
+        quantiles = self.quantile_service.group_quantiles(start_date.date(), end_date.date())
+        return Response(encode(GroupQuantilesSerializer, quantiles))
 
     @extend_schema(
         tags=['analytics'],
@@ -252,12 +642,52 @@ class AnalyticsViewSet(viewsets.ViewSet):
             return None
             
         try:
+            # The end date is inclusive, matching the per-day rollups
             return (
                 datetime.strptime(start_date, '%Y-%m-%d'),
-                datetime.strptime(end_date, '%Y-%m-%d')
+                datetime.combine(datetime.strptime(end_date, '%Y-%m-%d'), time.max)
             )
         except ValueError:
             return Response(
                 {'error': 'Invalid date format. Use YYYY-MM-DD'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+    def _default_date_range(self):
+        return (self.analytics_service.year_2024_start, self.analytics_service.year_2024_end)
+
+    def _get_granularity_from_params(self, query_params):
+        """Helper method to get the series granularity from query parameters."""
+        granularity = query_params.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            return Response(
+                {'error': f"Granularity must be one of: {', '.join(GRANULARITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return granularity
+
+    def _get_limit_from_params(self, query_params, default, maximum):
+        """Helper method to get a bounded result limit from query parameters."""
+        try:
+            limit = int(query_params.get('limit', default))
+        except ValueError:
+            limit = 0
+        if limit < 1 or limit > maximum:
+            return Response(
+                {'error': f'Limit parameter must be between 1 and {maximum}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return limit
+
+    def _top_terms_response(self, request, user=None):
+        """Shared body of the per-user and group top terms actions."""
+        date_range = self._get_date_range_from_params(request.query_params)
+        if isinstance(date_range, Response):
+            return date_range
+
+        limit = self._get_limit_from_params(request.query_params, default=20, maximum=TERMS_PER_BUCKET)
+        if isinstance(limit, Response):
+            return limit
+
+        terms = self.content_service.top_terms(user, date_range, limit)
+        return Response(encode(TopTermsSerializer, terms))
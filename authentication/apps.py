@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from .cache import connect_cache_signals
+
+        connect_cache_signals(get_user_model())
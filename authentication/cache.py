@@ -0,0 +1,64 @@
+"""Per-process cache of ``User`` rows for token-authenticated requests.
+
+Kept apart from ``tokens`` so the app registry can wire its signals
+without importing simplejwt (and, through it, ``django.test``).
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from whatsapp_analytics import metrics
+
+
+class UserCache:
+    """Short-lived, size-bounded, per-process cache of ``User`` rows by phone number.
+
+    Saves and deletes in this process evict their entry; other workers
+    pick changes up once ``AUTH_USER_CACHE_TTL_SECONDS`` has passed.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, phone_number: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(phone_number)
+                metrics.record_cache_lookup('user', hit=True)
+                return entry[1]
+        metrics.record_cache_lookup('user', hit=False)
+
+        user = get_user_model().objects.filter(phone_number=phone_number).first()
+        if user is not None:
+            with self._lock:
+                self._entries[phone_number] = (now + settings.AUTH_USER_CACHE_TTL_SECONDS, user)
+                self._entries.move_to_end(phone_number)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return user
+
+    def evict(self, phone_number: str) -> None:
+        with self._lock:
+            self._entries.pop(phone_number, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def _evict_user(sender, instance, **kwargs) -> None:
+    user_cache.evict(instance.pk)
+
+
+def connect_cache_signals(user_model) -> None:
+    post_save.connect(_evict_user, sender=user_model, dispatch_uid='user_cache_post_save')
+    post_delete.connect(_evict_user, sender=user_model, dispatch_uid='user_cache_post_delete')
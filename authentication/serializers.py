@@ -1,26 +1,17 @@
 from rest_framework import serializers
 from users.models import User
+from users.phone_numbers import InvalidPhoneNumber, normalize_phone_number
 
 class PhoneNumberAuthSerializer(serializers.Serializer):
     phone_number = serializers.CharField(max_length=17)
     
     def validate_phone_number(self, value):
-        cleaned_number = ''.join(filter(str.isdigit, value))
-        
-        if len(cleaned_number) == 10 and cleaned_number.startswith('0'):
-            cleaned_number = '+234' + cleaned_number[1:]
-        elif len(cleaned_number) == 11 and cleaned_number.startswith('0'):
-            cleaned_number = '+234' + cleaned_number[1:]
-        elif len(cleaned_number) == 13 and cleaned_number.startswith('234'):
-            cleaned_number = '+' + cleaned_number
-        
-        if not 13 <= len(cleaned_number) <= 14:
+        try:
+            return normalize_phone_number(value)
+        except InvalidPhoneNumber:
             raise serializers.ValidationError("Invalid phone number format")
-        
-        return cleaned_number
     
-class OTPVerificationSerializer(serializers.Serializer):
-    phone_number = serializers.CharField(max_length=17)
+class OTPVerificationSerializer(PhoneNumberAuthSerializer):
     otp = serializers.CharField(max_length=6)
     phone_id = serializers.CharField()
 
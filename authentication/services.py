@@ -1,46 +1,158 @@
-import stytch
+import asyncio
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
 from django.conf import settings
 
-class StytchService:
+if TYPE_CHECKING:
+    import aiohttp
+
+STYTCH_API_URLS = {
+    'live': 'https://api.stytch.com/v1/',
+    'test': 'https://test.stytch.com/v1/',
+}
+
+
+class StytchError(Exception):
+    """Stytch rejected the request (bad number, wrong or expired code)."""
+
+
+class StytchUnavailable(StytchError):
+    """Stytch could not be reached in time or is overloaded; the caller may retry."""
+
+
+class StytchClient:
+    """Process-wide Stytch API client sharing one pooled aiohttp session.
+
+    The session lives on a private event-loop thread, so its connection
+    pool outlives any single request whichever loop awaits the client
+    (the ASGI server's, or the per-call loop Django uses under WSGI).
+    The session is opened by the first call on that thread, so no caller
+    ever blocks its own loop waiting for it. In-flight calls are capped at ``STYTCH_MAX_CONCURRENCY``; a call that
+    cannot start within ``STYTCH_QUEUE_TIMEOUT_SECONDS`` or finish within
+    ``STYTCH_TIMEOUT_SECONDS`` raises ``StytchUnavailable``.
+    """
+
     def __init__(self):
-        self.client = stytch.Client(
-            project_id=settings.STYTCH_PROJECT_ID,
-            secret=settings.STYTCH_SECRET,
-            environment=settings.STYTCH_ENV
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional['aiohttp.ClientSession'] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def post(self, path: str, payload: dict) -> dict:
+        future = asyncio.run_coroutine_threadsafe(self._post(path, payload), self._running_loop())
+        return await asyncio.wrap_future(future)
+
+    def close(self) -> None:
+        """Close the session and stop the loop thread; the next call starts afresh."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None or self._pid != os.getpid():
+                return
+            if self._session is not None:
+                asyncio.run_coroutine_threadsafe(self._session.close(), loop).result()
+            self._session = None
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _running_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # A forked worker must not share the parent's loop thread or sockets
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name='stytch-client', daemon=True
+                ).start()
+                self._loop, self._pid, self._session = loop, os.getpid(), None
+            return self._loop
+
+    def _open(self) -> None:
+        """Create the session and slots; runs on the client's loop thread, never in a caller's loop."""
+        # aiohttp costs ~150 ms to import; only processes that send OTPs pay it
+        import aiohttp
+
+        self._session = aiohttp.ClientSession(
+            base_url=settings.STYTCH_API_URL or STYTCH_API_URLS.get(settings.STYTCH_ENV, STYTCH_API_URLS['test']),
+            auth=aiohttp.BasicAuth(settings.STYTCH_PROJECT_ID, settings.STYTCH_SECRET),
+            connector=aiohttp.TCPConnector(limit=settings.STYTCH_MAX_CONNECTIONS, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(
+                total=settings.STYTCH_TIMEOUT_SECONDS,
+                connect=settings.STYTCH_CONNECT_TIMEOUT_SECONDS
+            ),
         )
+        self._slots = asyncio.Semaphore(settings.STYTCH_MAX_CONCURRENCY)
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        import aiohttp
 
-    def send_whatsapp_otp(self, phone_number: str) -> dict:
+        if self._session is None:
+            self._open()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), settings.STYTCH_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise StytchUnavailable('Too many OTP requests in flight')
+
+        try:
+            async with self._session.post(path, json=payload) as response:
+                body = await response.json(content_type=None)
+                status = response.status
+        except asyncio.TimeoutError:
+            raise StytchUnavailable('Timed out waiting for Stytch')
+        except (aiohttp.ClientError, ValueError) as e:
+            raise StytchUnavailable(f'Could not reach Stytch: {e}')
+        finally:
+            self._slots.release()
+
+        # A proxy in front of Stytch can answer with any JSON, e.g. ``null`` or an error list
+        if not isinstance(body, dict):
+            raise StytchUnavailable(f'Stytch returned {status} with an unexpected body')
+        if status >= 500 or status == 429:
+            raise StytchUnavailable(body.get('error_message') or f'Stytch returned {status}')
+        if status >= 400:
+            raise StytchError(body.get('error_message') or f'Stytch returned {status}')
+        return body
+
+
+client = StytchClient()
+
+
+class StytchService:
+    def __init__(self):
+        self.client = client
+
+    async def send_whatsapp_otp(self, phone_number: str) -> dict:
         """Send OTP via WhatsApp without user creation."""
         try:
-            response = self.client.otps.whatsapp.login_or_create(
-                phone_number=phone_number
+            response = await self.client.post(
+                'otps/whatsapp/login_or_create', {'phone_number': phone_number}
             )
+            phone_id = response.get('phone_id')
+            if not phone_id:
+                raise StytchUnavailable('Stytch did not return a phone_id')
             return {
                 'success': True,
-                'phone_id': response.phone_id
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
+                'phone_id': phone_id
             }
-        
-    def verify_whatsapp_otp(self, phone_id: str, code: str) -> dict:
+        except StytchError as e:
+            return self._failure(e)
+
+    async def verify_whatsapp_otp(self, phone_id: str, code: str) -> dict:
         """Verify WhatsApp OTP."""
         try:
-            response = self.client.otps.authenticate(
-                method_id=phone_id,
-                code=code
+            response = await self.client.post(
+                'otps/authenticate', {'method_id': phone_id, 'code': code}
             )
             return {
                 'success': True,
                 'valid': True,
                 'response': response
             }
-        except Exception as e:
-            return {
-                'success': False,
-                'valid': False,
-                'error': str(e)
-            }
+        except StytchError as e:
+            return {**self._failure(e), 'valid': False}
 
+    def _failure(self, error: StytchError) -> dict:
+        return {
+            'success': False,
+            'error': str(error),
+            'retryable': isinstance(error, StytchUnavailable)
+        }
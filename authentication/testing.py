@@ -0,0 +1,88 @@
+import asyncio
+import socket
+import threading
+from typing import Optional
+from aiohttp import web
+
+VALID_CODE = '123456'
+# Numbers with this prefix answer after ``slow_seconds``, to exercise timeouts
+SLOW_PREFIX = '+234999'
+# and numbers with this one get a JSON body that is not an object, as a misbehaving proxy sends
+MALFORMED_PREFIX = '+234888'
+
+
+class StubStytchServer:
+    """Local stand-in for the two Stytch OTP endpoints the API uses.
+
+    Every number gets the phone id ``phone-<digits>`` and ``VALID_CODE``
+    is the only accepted code. Run it for tests, or point
+    ``STYTCH_API_URL`` at it during local development::
+
+        with StubStytchServer() as stub:
+            settings.STYTCH_API_URL = stub.url
+    """
+
+    def __init__(self, slow_seconds: float = 2.0):
+        self.slow_seconds = slow_seconds
+        self.requests = []
+        self.url: Optional[str] = None
+        self._loop = asyncio.new_event_loop()
+        self._runner: Optional[web.AppRunner] = None
+
+    def start(self) -> str:
+        threading.Thread(target=self._loop.run_forever, name='stub-stytch', daemon=True).start()
+        port = asyncio.run_coroutine_threadsafe(self._serve(), self._loop).result()
+        self.url = f'http://127.0.0.1:{port}/v1/'
+        return self.url
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def __enter__(self) -> 'StubStytchServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    async def _serve(self) -> int:
+        app = web.Application()
+        app.router.add_post('/v1/otps/whatsapp/login_or_create', self._login_or_create)
+        app.router.add_post('/v1/otps/authenticate', self._authenticate)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        await web.SockSite(self._runner, listener).start()
+        return listener.getsockname()[1]
+
+    async def _login_or_create(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.requests.append(('login_or_create', payload))
+        phone_number = payload.get('phone_number', '')
+        if phone_number.startswith(SLOW_PREFIX):
+            await asyncio.sleep(self.slow_seconds)
+        if phone_number.startswith(MALFORMED_PREFIX):
+            return web.json_response(None, status=502)
+        if not phone_number.startswith('+'):
+            return self._error(400, 'invalid_phone_number', 'Phone number format is invalid.')
+        return web.json_response({
+            'status_code': 200,
+            'phone_id': f'phone-{phone_number.lstrip("+")}',
+            'user_id': f'user-{phone_number.lstrip("+")}',
+        })
+
+    async def _authenticate(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.requests.append(('authenticate', payload))
+        if payload.get('code') != VALID_CODE:
+            return self._error(401, 'otp_code_not_found', 'The OTP code is incorrect or expired.')
+        return web.json_response({'status_code': 200, 'method_id': payload.get('method_id')})
+
+    @staticmethod
+    def _error(status: int, error_type: str, message: str) -> web.Response:
+        return web.json_response(
+            {'status_code': status, 'error_type': error_type, 'error_message': message},
+            status=status
+        )
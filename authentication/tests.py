@@ -1,3 +1,174 @@
+import asyncio
+import threading
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from users.models import User
+from .cache import user_cache
+from .services import StytchService, client as stytch_client
+from .testing import VALID_CODE, StubStytchServer
+from .tokens import PhoneTokenUser, issue_tokens
 
-# Create your tests here.
+
+class StatelessAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create(phone_number='+2348030000001')
+        cls.staff = User.objects.create(phone_number='+2348030000002', is_staff=True)
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+
+    def client_for(self, user) -> APIClient:
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_tokens(user)['access']}")
+        return client
+
+    def test_request_authenticates_without_loading_the_user(self):
+        client = self.client_for(self.member)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/api/analytics/activity_patterns/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in context.captured_queries if 'users_user' in q['sql']])
+
+    def test_token_user_carries_claims(self):
+        for user in (self.member, self.staff):
+            with self.subTest(user=user.phone_number):
+                response = self.client_for(user).get('/api/analytics/activity_patterns/')
+                token_user = response.wsgi_request.user
+                self.assertIsInstance(token_user, PhoneTokenUser)
+                self.assertEqual(token_user.phone_number, user.phone_number)
+                self.assertEqual(token_user.is_staff, user.is_staff)
+
+    def test_staff_only_action_uses_claim(self):
+        path = '/api/analytics/update_group_stats/'
+        self.assertEqual(self.client_for(self.member).post(path).status_code, 403)
+        self.assertEqual(self.client_for(self.staff).post(path).status_code, 200)
+
+    def test_full_user_is_cached_and_evicted_on_save(self):
+        token_user = self.client_for(self.member).get(
+            '/api/analytics/activity_patterns/'
+        ).wsgi_request.user
+
+        with self.assertNumQueries(1):
+            self.assertEqual(token_user.user, self.member)
+            self.assertEqual(user_cache.get(self.member.phone_number), self.member)
+
+        self.member.display_name = 'Ada'
+        self.member.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(user_cache.get(self.member.phone_number).display_name, 'Ada')
+
+    def test_cache_entries_expire(self):
+        with self.settings(AUTH_USER_CACHE_TTL_SECONDS=0):
+            user_cache.get(self.member.phone_number)
+            with self.assertNumQueries(1):
+                user_cache.get(self.member.phone_number)
+
+
+class OTPViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubStytchServer(slow_seconds=1)
+        cls.stub.start()
+        cls.addClassCleanup(cls.stub.stop)
+
+    def setUp(self):
+        overrides = self.settings(
+            STYTCH_API_URL=self.stub.url,
+            STYTCH_TIMEOUT_SECONDS=0.3,
+            STYTCH_MAX_CONCURRENCY=50,
+            STYTCH_QUEUE_TIMEOUT_SECONDS=0.1
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # The client reads its settings when it opens its session
+        stytch_client.close()
+        self.addCleanup(stytch_client.close)
+
+    def test_request_and_verify_otp(self):
+        response = self.client.post('/api/auth/request-otp/', {'phone_number': '08031234567'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['phone_id'], 'phone-2348031234567')
+        self.assertTrue(User.objects.filter(phone_number='+2348031234567').exists())
+
+        response = self.client.post('/api/auth/verify-otp/', {
+            'phone_number': '+2348031234567', 'phone_id': 'phone-2348031234567', 'otp': VALID_CODE
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(response.json()), {'access', 'refresh'})
+
+    def test_wrong_code_is_rejected(self):
+        User.objects.create(phone_number='+2348031234567')
+        response = self.client.post('/api/auth/verify-otp/', {
+            'phone_number': '+2348031234567', 'phone_id': 'phone-2348031234567', 'otp': '000000'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('incorrect', response.json()['error'])
+
+    def test_timeout_degrades_to_retryable_503(self):
+        response = self.client.post('/api/auth/request-otp/', {'phone_number': '+2349991234567'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(User.objects.filter(phone_number='+2349991234567').exists())
+
+    def test_calls_beyond_the_concurrency_limit_fail_fast(self):
+        async def send_both():
+            service = StytchService()
+            return await asyncio.gather(
+                service.send_whatsapp_otp('+2349991234567'),
+                service.send_whatsapp_otp('+2348031234567'),
+            )
+
+        with self.settings(STYTCH_MAX_CONCURRENCY=1, STYTCH_TIMEOUT_SECONDS=2):
+            stytch_client.close()
+            slow, queued = async_to_sync(send_both)()
+
+        self.assertTrue(slow['success'])
+        self.assertFalse(queued['success'])
+        self.assertTrue(queued['retryable'])
+
+    def test_first_call_does_not_block_the_callers_loop(self):
+        events = []
+        released = threading.Event()
+        open_session = stytch_client._open
+
+        def slow_open():
+            released.wait(5)
+            events.append('session opened')
+            open_session()
+
+        async def send():
+            sending = asyncio.ensure_future(StytchService().send_whatsapp_otp('+2348031234567'))
+            await asyncio.sleep(0.05)
+            events.append('caller ran')
+            released.set()
+            return await sending
+
+        with mock.patch.object(stytch_client, '_open', slow_open):
+            result = async_to_sync(send)()
+        self.assertTrue(result['success'])
+        self.assertEqual(events, ['caller ran', 'session opened'])
+
+    def test_response_without_phone_id_is_a_service_error(self):
+        with mock.patch.object(stytch_client, 'post', mock.AsyncMock(return_value={'status_code': 200})):
+            response = self.client.post('/api/auth/request-otp/', {'phone_number': '+2348031234567'})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.filter(phone_number='+2348031234567').exists())
+
+    def test_malformed_response_degrades_to_503(self):
+        response = self.client.post('/api/auth/request-otp/', {'phone_number': '+2348881234567'})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.filter(phone_number='+2348881234567').exists())
+
+    def test_unreachable_stytch_degrades_to_503(self):
+        with self.settings(STYTCH_API_URL='http://127.0.0.1:9/v1/'):
+            stytch_client.close()
+            response = self.client.post('/api/auth/request-otp/', {'phone_number': '+2348031234567'})
+        self.assertEqual(response.status_code, 503)
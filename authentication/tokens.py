@@ -0,0 +1,42 @@
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import RefreshToken
+from .cache import user_cache
+
+
+class PhoneTokenUser(TokenUser):
+    """Request user built from the access token's signed claims, without a database query.
+
+    ``is_staff`` comes from the token, so a change in staff status applies
+    once the holder gets a new token. Code that needs the full row uses
+    ``user``, which goes through ``user_cache``.
+    """
+
+    @cached_property
+    def phone_number(self) -> str:
+        return self.id
+
+    @cached_property
+    def user(self):
+        return user_cache.get(self.phone_number)
+
+    def __str__(self) -> str:
+        return self.phone_number
+
+
+class PhoneRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the claims ``PhoneTokenUser`` reads."""
+
+    @classmethod
+    def for_user(cls, user) -> 'PhoneRefreshToken':
+        token = super().for_user(user)
+        token['is_staff'] = user.is_staff
+        return token
+
+
+def issue_tokens(user) -> dict:
+    refresh = PhoneRefreshToken.for_user(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
@@ -1,16 +1,65 @@
+import asyncio
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from .serializers import PhoneNumberAuthSerializer, OTPVerificationSerializer
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 from .services import StytchService
+from .tokens import issue_tokens
 
 User = get_user_model()
 
-class RequestOTPView(APIView):
+# Returned with 503 when Stytch is slow, unreachable or at its concurrency limit
+RETRY_AFTER_SECONDS = 5
+
+
+class AsyncAPIView(APIView):
+    """APIView whose handlers are coroutines.
+
+    DRF's dispatch is synchronous, so this one awaits the handler and runs
+    authentication, permissions and throttling (which may query the
+    database) in a thread. Under ASGI the OTP round trip to Stytch then
+    waits on the event loop instead of holding a worker thread.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def stytch_failure(self, result: dict) -> Response:
+        if result.get('retryable'):
+            return Response(
+                {'error': 'OTP service is temporarily unavailable, please retry'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(RETRY_AFTER_SECONDS)}
+            )
+        return Response(
+            {'error': result.get('error', 'Invalid OTP')},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class RequestOTPView(AsyncAPIView):
     permission_classes = [AllowAny]
     @extend_schema(
         tags=['auth'],
@@ -20,26 +69,24 @@ class RequestOTPView(APIView):
                 description="OTP sent successfully",
                 response={"type": "object", "properties": {"message": {"type": "string"}}}
             ),
-            400: OpenApiResponse(description="Invalid phone number format")
+            400: OpenApiResponse(description="Invalid phone number format"),
+            503: OpenApiResponse(description="OTP service unavailable, retry after the Retry-After delay")
         },
         description="Request an OTP for phone number authentication",
     )
 
-    def post(self, request):
+    async def post(self, request):
         serializer = PhoneNumberAuthSerializer(data=request.data)
         if serializer.is_valid():
             phone_number = serializer.validated_data['phone_number']
             
             stytch_service = StytchService()
-            result = stytch_service.send_whatsapp_otp(phone_number)
+            result = await stytch_service.send_whatsapp_otp(phone_number)
             
             if not result['success']:
-                return Response(
-                    {'error': result['error']},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+                return self.stytch_failure(result)
 
-            user, created = User.objects.get_or_create(phone_number=phone_number)
+            user, created = await User.objects.aget_or_create(phone_number=phone_number)
             
             return Response({
                 'message': 'OTP sent successfully via WhatsApp',
@@ -48,7 +95,7 @@ class RequestOTPView(APIView):
             
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class VerifyOTPView(APIView):
+class VerifyOTPView(AsyncAPIView):
     permission_classes = [AllowAny]
     @extend_schema(
         tags=['auth'],
@@ -64,12 +111,13 @@ class VerifyOTPView(APIView):
                     }
                 }
             ),
-            400: OpenApiResponse(description="Invalid OTP")
+            400: OpenApiResponse(description="Invalid OTP"),
+            503: OpenApiResponse(description="OTP service unavailable, retry after the Retry-After delay")
         },
         description="Verify OTP and get access tokens",
     )
 
-    def post(self, request):
+    async def post(self, request):
         serializer = OTPVerificationSerializer(data=request.data)
         if serializer.is_valid():
             phone_number = serializer.validated_data['phone_number']
@@ -77,20 +125,12 @@ class VerifyOTPView(APIView):
             phone_id = serializer.validated_data['phone_id']
             
             stytch_service = StytchService()
-            result = stytch_service.verify_whatsapp_otp(phone_id, otp)
+            result = await stytch_service.verify_whatsapp_otp(phone_id, otp)
             
             if not result['success'] or not result.get('valid'):
-                return Response(
-                    {'error': result.get('error', 'Invalid OTP')},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+                return self.stytch_failure(result)
 
-            user = User.objects.get(phone_number=phone_number)
-            refresh = RefreshToken.for_user(user)
-            
-            return Response({
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            })
+            user = await User.objects.aget(phone_number=phone_number)
+            return Response(issue_tokens(user))
             
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,134 @@
+import itertools
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable, Dict, Iterator, List, Optional
+from whatsapp_messages.ids import message_id
+from whatsapp_messages.models import Message
+
+# Id scheme name -> id for a message sent at the given time
+SCHEMES: Dict[str, Callable[[datetime], uuid.UUID]] = {
+    'uuid4': lambda timestamp: uuid.uuid4(),
+    'uuid7': message_id,
+}
+
+COLUMNS = (
+    'id', 'content', 'timestamp', 'message_type', 'sender_id', 'content_length',
+    'is_media', 'local_date', 'local_hour', 'weekday'
+)
+
+
+def table_sql() -> List[str]:
+    """The message table and its indexes, as Django creates them on SQLite."""
+    table = Message._meta.db_table
+    statements = [
+        f'CREATE TABLE "{table}" ("id" char(32) NOT NULL PRIMARY KEY, "content" text NOT NULL, '
+        '"timestamp" datetime NOT NULL, "message_type" varchar(10) NOT NULL, '
+        '"sender_id" varchar(17) NOT NULL, "content_length" integer NOT NULL, "is_media" bool NOT NULL, '
+        '"local_date" date NULL, "local_hour" smallint unsigned NULL, "weekday" smallint unsigned NULL)',
+        f'CREATE INDEX "message_sender_id" ON "{table}" ("sender_id")',
+    ]
+    for index in Message._meta.indexes:
+        columns = ', '.join(f'"{Message._meta.get_field(name).column}"' for name in index.fields)
+        statements.append(f'CREATE INDEX "{index.name}" ON "{table}" ({columns})')
+    return statements
+
+
+def chat_rows(size: int, user_count: int = 200, start: datetime = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+              ) -> Iterator[tuple]:
+    """``size`` messages in time order, a few per minute like an exported chat."""
+    for index in range(size):
+        timestamp = start + timedelta(minutes=index // 3)
+        yield (
+            timestamp, f'message {index}', timestamp.strftime('%Y-%m-%d %H:%M:%S'), 'TEXT',
+            f'+234803{index % user_count:07d}', 12, False, timestamp.date().isoformat(),
+            timestamp.hour, timestamp.isoweekday() % 7 + 1
+        )
+
+
+class MessageIdBenchmark:
+    """Bulk insert throughput and primary key index size of random versus time-ordered ids.
+
+    Each scheme imports the same chronological chat into a fresh SQLite
+    file with the message table's real indexes, in batches like
+    ``ChatImportService``. Reported per scheme: total and final-tenth
+    insert rate (how much slower inserts get as the table grows), and the
+    size, fill and fragmentation of the primary key index from SQLite's
+    ``dbstat``. Fragmentation is the share of index leaves stored before
+    the leaf preceding them in key order.
+    """
+
+    def __init__(self, size: int = 1_000_000, batch_size: int = 1000, work_dir: Optional[str] = None,
+                 log: Callable[[str], None] = lambda message: None):
+        self.size = size
+        self.batch_size = batch_size
+        self.work_dir = work_dir
+        self.log = log
+
+    def run(self) -> Dict[str, dict]:
+        with tempfile.TemporaryDirectory(dir=self.work_dir) as directory:
+            results = {
+                name: self.run_scheme(os.path.join(directory, f'{name}.sqlite3'), make_id)
+                for name, make_id in SCHEMES.items()
+            }
+        return results
+
+    def run_scheme(self, path: str, make_id: Callable[[datetime], uuid.UUID]) -> dict:
+        table = Message._meta.db_table
+        insert = f'INSERT INTO "{table}" ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})'
+        database = sqlite3.connect(path, isolation_level=None)
+        try:
+            for statement in table_sql():
+                database.execute(statement)
+
+            timings = []
+            rows = chat_rows(self.size)
+            while True:
+                batch = [(make_id(row[0]).hex, *row[1:]) for row in itertools.islice(rows, self.batch_size)]
+                if not batch:
+                    break
+                started = time.perf_counter()
+                database.execute('BEGIN')
+                database.executemany(insert, batch)
+                database.execute('COMMIT')
+                timings.append(time.perf_counter() - started)
+
+            tail = timings[-max(len(timings) // 10, 1):]
+            index = self._primary_key_index(database, table)
+            result = {
+                'rows': self.size,
+                'seconds': round(sum(timings), 3),
+                'rows_per_second': round(self.size / sum(timings)),
+                'final_tenth_rows_per_second': round(len(tail) * self.batch_size / sum(tail)),
+                'pk_index_bytes': index['bytes'],
+                'pk_index_fill': index['fill'],
+                'pk_index_fragmentation': index['fragmentation'],
+                'database_bytes': os.path.getsize(path),
+            }
+        finally:
+            database.close()
+        self.log(f"{os.path.basename(path)}: {result['rows_per_second']} rows/s "
+                 f"({result['final_tenth_rows_per_second']} in the last tenth), "
+                 f"pk index {result['pk_index_bytes'] // 1024} KiB at {result['pk_index_fill']:.0%} full, "
+                 f"{result['pk_index_fragmentation']:.0%} of its leaves out of file order")
+        return result
+
+    @staticmethod
+    def _primary_key_index(database: sqlite3.Connection, table: str) -> dict:
+        pages = database.execute(
+            "SELECT path, pageno, pgsize, unused, pagetype FROM dbstat WHERE name = ?",
+            [f'sqlite_autoindex_{table}_1']
+        ).fetchall()
+        size = sum(page[2] for page in pages)
+        # Leaves in key order; a scan in id order seeks backwards in the file at each step down
+        leaves = [page[1] for page in sorted(pages) if page[4] == 'leaf']
+        backwards = sum(later < earlier for earlier, later in zip(leaves, leaves[1:]))
+        return {
+            'bytes': size,
+            'fill': round(1 - sum(page[3] for page in pages) / size, 3),
+            'fragmentation': round(backwards / max(len(leaves) - 1, 1), 3),
+        }
+
@@ -0,0 +1,173 @@
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+from urllib.parse import quote
+from typing import Callable, Dict, Optional
+import django
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from core.generators.chat_generator import SyntheticChatGenerator
+from core.parsers.whatsapp_parser import ChatImportService, WhatsAppMessageParser
+from users.models import User
+from users.phone_numbers import normalize_phone_number
+from whatsapp_messages.models import Message
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+DEFAULT_MESSAGES_PER_DAY = 300
+# Larger chats get busier rather than longer, so every size fits in a few years
+MAX_SPAN_DAYS = 3 * 365
+
+# Endpoint name -> path; ``{member}`` and ``{dates}`` are filled in per run
+ENDPOINTS = {
+    'user_metrics': '/api/analytics/{member}/user_metrics/?{dates}',
+    'user_trends': '/api/analytics/{member}/user_trends/?days=365&granularity=week',
+    'user_top_terms': '/api/analytics/{member}/user_top_terms/?{dates}',
+    'user_sessions': '/api/analytics/{member}/user_sessions/?{dates}',
+    'user_partners': '/api/analytics/{member}/user_partners/',
+    'user_quantiles': '/api/analytics/{member}/user_quantiles/?{dates}',
+    'group_metrics': '/api/analytics/group_metrics/?{dates}',
+    'group_metrics_hourly': '/api/analytics/group_metrics/?{dates}&granularity=hour',
+    'activity_patterns': '/api/analytics/activity_patterns/?{dates}',
+    'top_terms': '/api/analytics/top_terms/?{dates}',
+    'group_sessions': '/api/analytics/group_sessions/?{dates}',
+    'interaction_pairs': '/api/analytics/interaction_pairs/',
+    'group_quantiles': '/api/analytics/group_quantiles/?{dates}',
+}
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class PipelineBenchmark:
+    """Time generation, parsing, import and every analytics endpoint for growing chat sizes.
+
+    Each size starts from an empty database, so this must only ever run
+    against a throwaway database (the ``run_benchmarks`` command uses the
+    test database).
+    """
+
+    def __init__(self, work_dir: str, sizes=DEFAULT_SIZES, user_count: int = 200,
+                 media_ratio: float = 0.1, skew: float = 1.1, seed: int = 0,
+                 repeat: int = 3, log: Callable[[str], None] = lambda message: None):
+        self.work_dir = work_dir
+        self.sizes = sizes
+        self.user_count = user_count
+        self.media_ratio = media_ratio
+        self.skew = skew
+        self.seed = seed
+        self.repeat = repeat
+        self.log = log
+
+    def run(self) -> dict:
+        return {
+            'commit': current_commit(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'parameters': {
+                'user_count': self.user_count,
+                'media_ratio': self.media_ratio,
+                'skew': self.skew,
+                'seed': self.seed,
+                'repeat': self.repeat,
+            },
+            'results': [self.run_size(size) for size in self.sizes],
+        }
+
+    def generator(self, size: int) -> SyntheticChatGenerator:
+        return SyntheticChatGenerator(
+            size, user_count=self.user_count, media_ratio=self.media_ratio, skew=self.skew,
+            messages_per_day=max(DEFAULT_MESSAGES_PER_DAY, math.ceil(size / MAX_SPAN_DAYS)),
+            seed=self.seed
+        )
+
+    def run_size(self, size: int) -> dict:
+        self.log(f'{size} messages: generating')
+        generator = self.generator(size)
+        file_path = os.path.join(self.work_dir, f'chat-{size}.txt')
+        result = {'messages': size}
+
+        started = time.perf_counter()
+        generator.write_file(file_path)
+        result['generate_seconds'] = self._elapsed(started)
+        result['file_bytes'] = os.path.getsize(file_path)
+
+        try:
+            self.log(f'{size} messages: parsing')
+            started = time.perf_counter()
+            parsed = sum(len(batch) for batch in WhatsAppMessageParser().process_chat_file(file_path))
+            result['parse_seconds'] = self._elapsed(started)
+            result['parsed_messages'] = parsed
+
+            self.log(f'{size} messages: importing')
+            call_command('flush', interactive=False, verbosity=0)
+            started = time.perf_counter()
+            ChatImportService().import_chat(file_path)
+            result['import_seconds'] = self._elapsed(started)
+            result['import_messages_per_second'] = round(
+                parsed / result['import_seconds'], 1
+            ) if result['import_seconds'] else None
+        finally:
+            os.remove(file_path)
+
+        self.log(f'{size} messages: querying endpoints')
+        result['endpoints'] = self.run_endpoints(generator)
+        return result
+
+    def run_endpoints(self, generator: SyntheticChatGenerator) -> Dict[str, dict]:
+        staff = User.objects.create(phone_number='+2340000000000', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        # The busiest sender, over the whole generated period
+        member = quote(normalize_phone_number(generator.phone_numbers()[0]))
+        last_day = self._last_message_date()
+        dates = f'start_date={generator.start:%Y-%m-%d}&end_date={last_day:%Y-%m-%d}'
+
+        timings = {}
+        for name, template in ENDPOINTS.items():
+            path = template.format(member=member, dates=dates)
+            durations, queries = [], []
+            for _ in range(self.repeat):
+                queries.clear()
+                with connection.execute_wrapper(self._count_query(queries)):
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    durations.append((time.perf_counter() - started) * 1000)
+            timings[name] = {
+                'status': response.status_code,
+                'queries': len(queries),
+                'min_ms': round(min(durations), 2),
+                'median_ms': round(statistics.median(durations), 2),
+            }
+        staff.delete()
+        return timings
+
+    @staticmethod
+    def _count_query(queries: list):
+        def wrapper(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+        return wrapper
+
+    @staticmethod
+    def _last_message_date():
+        last = Message.objects.order_by('-timestamp').values_list('local_date', flat=True).first()
+        return last or timezone.localdate()
+
+    @staticmethod
+    def _elapsed(started: float) -> float:
+        return round(time.perf_counter() - started, 4)
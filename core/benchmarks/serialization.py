@@ -0,0 +1,138 @@
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from analytics.encoders import encode
+from analytics.serializers import (
+    ActivityPatternSerializer,
+    GroupMetricsSerializer,
+    InteractionPairSerializer,
+    UserTrendsResponseSerializer,
+)
+
+
+def year_of_days(first_day: date = date(2024, 1, 1), days: int = 366) -> List[date]:
+    return [first_day + timedelta(days=offset) for offset in range(days)]
+
+
+def group_metrics_payload(rng: random.Random, granularity: str = 'day') -> dict:
+    """A year-long ``calculate_group_metrics`` result with the shapes the service returns."""
+    tz = timezone.get_current_timezone()
+    rows = []
+    for day in year_of_days():
+        hours = range(24) if granularity == 'hour' else [None]
+        for hour in hours:
+            period = timezone.make_aware(datetime.combine(day, datetime.min.time()), tz)
+            if hour is not None:
+                period += timedelta(hours=hour)
+            rows.append({
+                'period': period,
+                'date': day,
+                'total_messages': rng.randint(0, 500),
+                'active_users': rng.randint(0, 80),
+                'media_count': rng.randint(0, 50),
+                'peak_hour': hour if hour is not None else rng.choice([None] + list(range(24))),
+            })
+    return {
+        'total_messages': sum(row['total_messages'] for row in rows),
+        'active_users': 200,
+        'media_count': sum(row['media_count'] for row in rows),
+        'messages_per_user': 123.45,
+        'daily_stats': rows,
+        'top_users': [
+            {'sender__phone_number': f'+234803000{index:04d}', 'message_count': rng.randint(1, 9000)}
+            for index in range(10)
+        ],
+    }
+
+
+def user_trends_payload(rng: random.Random) -> dict:
+    tz = timezone.get_current_timezone()
+    return {
+        'daily_stats': [
+            {
+                'period': timezone.make_aware(datetime.combine(day, datetime.min.time()), tz),
+                'date': day,
+                'message_count': rng.randint(0, 60),
+                'media_count': rng.randint(0, 6),
+                'avg_length': rng.choice([None, rng.uniform(5, 120)]),
+            }
+            for day in year_of_days()
+        ],
+        'trend': 'stable',
+    }
+
+
+def activity_patterns_payload(rng: random.Random) -> dict:
+    return {
+        'hourly_distribution': [{'hour': hour, 'count': rng.randint(0, 9000)} for hour in range(24)],
+        'weekly_distribution': [{'day': day, 'count': rng.randint(0, 9000)} for day in range(1, 8)],
+    }
+
+
+def interaction_pairs_payload(rng: random.Random) -> list:
+    return [
+        {
+            'member': f'+234803000{rng.randint(0, 199):04d}',
+            'partner': f'+234803000{rng.randint(0, 199):04d}',
+            'reply_count': rng.randint(1, 900),
+            'weight': rng.uniform(0, 300),
+        }
+        for _ in range(100)
+    ]
+
+
+class SerializationBenchmark:
+    """Time DRF serializers against the ``analytics.encoders`` fast path on year-long payloads.
+
+    Both paths end in the same ``JSONRenderer``, so the difference is the
+    serialization step alone. Needs no database.
+    """
+
+    def __init__(self, repeat: int = 20, seed: int = 0,
+                 log: Callable[[str], None] = lambda message: None):
+        self.repeat = repeat
+        self.seed = seed
+        self.log = log
+
+    def cases(self) -> Dict[str, tuple]:
+        rng = random.Random(self.seed)
+        return {
+            'group_metrics_day': (GroupMetricsSerializer, group_metrics_payload(rng), False),
+            'group_metrics_hour': (GroupMetricsSerializer, group_metrics_payload(rng, 'hour'), False),
+            'user_trends': (UserTrendsResponseSerializer, user_trends_payload(rng), False),
+            'activity_patterns': (ActivityPatternSerializer, activity_patterns_payload(rng), False),
+            'interaction_pairs': (InteractionPairSerializer, interaction_pairs_payload(rng), True),
+        }
+
+    def run(self) -> dict:
+        renderer = JSONRenderer()
+        results = {}
+        for name, (serializer_class, payload, many) in self.cases().items():
+            drf_body = renderer.render(serializer_class(payload, many=many).data)
+            fast_body = renderer.render(encode(serializer_class, payload, many=many))
+            if drf_body != fast_body:
+                raise AssertionError(f'{name}: fast path output differs from {serializer_class.__name__}')
+
+            drf_ms = self._time(lambda: renderer.render(serializer_class(payload, many=many).data))
+            fast_ms = self._time(lambda: renderer.render(encode(serializer_class, payload, many=many)))
+            results[name] = {
+                'bytes': len(fast_body),
+                'serializer_ms': drf_ms,
+                'fast_path_ms': fast_ms,
+                'speedup': round(drf_ms / fast_ms, 2) if fast_ms else None,
+            }
+            self.log(f'{name}: serializer {drf_ms} ms, fast path {fast_ms} ms '
+                     f'({results[name]["speedup"]}x, {len(fast_body)} bytes)')
+        return results
+
+    def _time(self, call: Callable) -> float:
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        return round(statistics.median(timings), 3)
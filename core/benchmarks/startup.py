@@ -0,0 +1,120 @@
+"""Import-time audit of process startup.
+
+Each scenario starts a fresh interpreter under ``python -X importtime``
+and does what a real process does before its first unit of work. The
+audit reports the total import time, the most expensive modules, and
+whether the scenario stayed within its budget and kept its forbidden
+(heavy, never needed) modules out.
+
+Budgets are about twice the totals measured when they were set
+(``import_chat`` ~325 ms, worker ~570 ms on a warm bytecode cache), so
+they catch regressions like a heavy integration imported at module
+level rather than machine-to-machine noise.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Never needed before the first request or import; each is loaded on first use
+HEAVY_MODULES = (
+    'aiohttp',
+    'stytch',
+    'drf_spectacular.generators',
+    'drf_spectacular.openapi',
+    'drf_spectacular.views',
+)
+
+WORKER_BOOT = (
+    "import os\n"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'whatsapp_analytics.settings')\n"
+    "from whatsapp_analytics.wsgi import application\n"
+    "from django.urls import get_resolver\n"
+    # The URLconf is loaded on the first request
+    "get_resolver().url_patterns\n"
+)
+
+# Scenario name -> (interpreter arguments, budget in ms, forbidden modules)
+SCENARIOS: Dict[str, tuple] = {
+    # --help stops after loading the command, just before it would start reading the file
+    'import_chat': (
+        ['manage.py', 'import_chat', '--help'],
+        700,
+        HEAVY_MODULES + ('rest_framework', 'django.test', 'yaml'),
+    ),
+    'worker': (['-c', WORKER_BOOT], 1100, HEAVY_MODULES),
+}
+
+
+def parse_importtime(output: str) -> Dict[str, dict]:
+    """``-X importtime`` output as ``{module: {'self_us', 'cumulative_us', 'depth'}}``."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        stripped = name.lstrip()
+        modules[stripped.rstrip()] = {
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': (len(name) - len(stripped) - 1) // 2,
+        }
+    return modules
+
+
+class StartupAudit:
+    """Measure the import time of each startup scenario against its budget."""
+
+    def __init__(self, scenarios: Optional[List[str]] = None, repeat: int = 3, top: int = 15,
+                 log: Callable[[str], None] = lambda message: None):
+        self.scenarios = scenarios or list(SCENARIOS)
+        self.repeat = repeat
+        self.top = top
+        self.log = log
+
+    def run(self) -> dict:
+        results = {}
+        for name in self.scenarios:
+            arguments, budget_ms, forbidden = SCENARIOS[name]
+            # The fastest run is the one least disturbed by the rest of the machine
+            modules = min(
+                (self.measure(arguments) for _ in range(self.repeat)),
+                key=lambda run: sum(module['self_us'] for module in run.values())
+            )
+            total_ms = round(sum(module['self_us'] for module in modules.values()) / 1000, 1)
+            imported = [module for module in forbidden if module in modules]
+            results[name] = {
+                'total_ms': total_ms,
+                'budget_ms': budget_ms,
+                'modules': len(modules),
+                'forbidden_imported': imported,
+                'within_budget': total_ms <= budget_ms and not imported,
+                'top': [
+                    {'module': module, 'cumulative_ms': round(stats['cumulative_us'] / 1000, 1)}
+                    for module, stats in sorted(
+                        ((module, stats) for module, stats in modules.items() if stats['depth'] == 0),
+                        key=lambda item: -item[1]['cumulative_us']
+                    )[:self.top]
+                ],
+            }
+            self.log(f"{name}: {total_ms} ms of imports (budget {budget_ms} ms), "
+                     f"{len(modules)} modules" + (f", forbidden: {', '.join(imported)}" if imported else ''))
+            for entry in results[name]['top']:
+                self.log(f"  {entry['cumulative_ms']:>8} ms  {entry['module']}")
+        return results
+
+    @staticmethod
+    def measure(arguments: List[str]) -> Dict[str, dict]:
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', *arguments],
+            cwd=BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'whatsapp_analytics.settings'},
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(arguments)} failed:\n{completed.stderr[-2000:]}")
+        return parse_importtime(completed.stderr)
@@ -0,0 +1,126 @@
+import bisect
+import itertools
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, TextIO
+
+WORDS = [
+    'hello', 'everyone', 'meetup', 'python', 'django', 'lagos', 'abuja', 'code', 'review',
+    'thanks', 'please', 'tomorrow', 'today', 'link', 'slides', 'event', 'talk', 'join',
+    'question', 'answer', 'deploy', 'server', 'database', 'query', 'test', 'bug', 'fix',
+    'release', 'weekend', 'morning', 'sharing', 'awesome', 'great', 'idea', 'project',
+]
+EMOJIS = ['\U0001F602', '\U0001F525', '\U0001F44D', '\U0001F64F', '❤️', '\U0001F389']
+LINKS = [
+    'https://www.djangoproject.com',
+    'https://docs.python.org/3/',
+    'https://github.com/django/django',
+    'https://pycon.ng',
+]
+# Indicators that ``WhatsAppMessageParser.detect_message_type`` maps to a media type
+MEDIA_CONTENT = ['image omitted', 'video omitted', 'audio omitted', 'document omitted']
+# Exports write two-digit years, which strptime reads as 1969-2068
+LAST_YEAR = 2068
+
+
+class SyntheticChatGenerator:
+    """Deterministic WhatsApp group export in the format ``WhatsAppMessageParser`` expects.
+
+    Senders follow a Zipf distribution (``skew`` 0 is uniform, higher values
+    let a few members dominate) and messages arrive in bursts: most gaps are
+    short replies, the rest are quiet periods sized so the chat averages
+    ``messages_per_day``. The chat must end by ``LAST_YEAR``; raise
+    ``messages_per_day`` for large ``message_count`` values.
+    """
+
+    def __init__(self, message_count: int, user_count: int = 50, media_ratio: float = 0.1,
+                 skew: float = 1.1, messages_per_day: int = 300, seed: int = 0,
+                 start: Optional[datetime] = None):
+        if message_count < 0:
+            raise ValueError('message_count must not be negative')
+        if user_count < 1:
+            raise ValueError('user_count must be at least 1')
+        if not 0 <= media_ratio <= 1:
+            raise ValueError('media_ratio must be between 0 and 1')
+
+        self.message_count = message_count
+        self.user_count = user_count
+        self.media_ratio = media_ratio
+        self.skew = skew
+        self.messages_per_day = messages_per_day
+        self.seed = seed
+        self.start = start or datetime(2020, 1, 1, 8, 0)
+        if (self.start + self.span).year > LAST_YEAR:
+            raise ValueError(
+                f'{message_count} messages at {messages_per_day} a day run past {LAST_YEAR}; '
+                'raise messages_per_day'
+            )
+
+    @property
+    def span(self) -> timedelta:
+        """Expected time between the first and the last message."""
+        return timedelta(days=self.message_count / self.messages_per_day)
+
+    def phone_numbers(self) -> List[str]:
+        """Sender numbers, most active first, formatted like ``+234 803 123 4567``."""
+        return [
+            f'+234 {803 + index // 10_000_000} {index // 10_000 % 1000:03d} {index % 10_000:04d}'
+            for index in range(self.user_count)
+        ]
+
+    def lines(self) -> Iterator[str]:
+        """Yield the chat one line at a time, without a trailing newline."""
+        rng = random.Random(self.seed)
+        senders = self.phone_numbers()
+        cumulative = list(itertools.accumulate(
+            1 / (rank + 1) ** self.skew for rank in range(self.user_count)
+        ))
+        total_weight = cumulative[-1]
+
+        # 80% of messages are replies within a few minutes; the quiet gaps
+        # make up the rest of the day so the average rate holds. Gaps keep
+        # their fractions, so the minute-resolution timestamps do not drift
+        mean_gap = 1440 / self.messages_per_day
+        reply_gap = min(2, mean_gap / 2)
+        quiet_gap = (mean_gap - 0.8 * reply_gap) / 0.2
+
+        timestamp = self.start
+        for _ in range(self.message_count):
+            if rng.random() < 0.8:
+                timestamp += timedelta(minutes=rng.expovariate(1 / reply_gap))
+            else:
+                timestamp += timedelta(minutes=rng.expovariate(1 / quiet_gap))
+            if timestamp.year > LAST_YEAR:
+                raise ValueError(f'Chat ran past {LAST_YEAR}; raise messages_per_day')
+            sender = senders[bisect.bisect(cumulative, rng.random() * total_weight)]
+            yield f'{self.format_timestamp(timestamp)} - {sender}: {self._content(rng)}'
+
+    def write(self, output: TextIO) -> int:
+        written = 0
+        for line in self.lines():
+            output.write(line)
+            output.write('\n')
+            written += 1
+        return written
+
+    def write_file(self, file_path: str) -> int:
+        with open(file_path, 'w', encoding='utf-8') as output:
+            return self.write(output)
+
+    @staticmethod
+    def format_timestamp(timestamp: datetime) -> str:
+        return (
+            f'{timestamp.month}/{timestamp.day}/{timestamp.year % 100:02d}, '
+            f'{timestamp.hour}:{timestamp.minute:02d}'
+        )
+
+    def _content(self, rng: random.Random) -> str:
+        if rng.random() < self.media_ratio:
+            return rng.choice(MEDIA_CONTENT)
+
+        tokens = rng.choices(WORDS, k=rng.randint(1, 12))
+        if rng.random() < 0.2:
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(EMOJIS))
+        if rng.random() < 0.05:
+            tokens.append(rng.choice(LINKS))
+        return ' '.join(tokens)
@@ -1,13 +1,71 @@
+import logging
 import re
-from datetime import datetime
-from typing import Dict, Optional, Generator
+import time
+from datetime import date, datetime
+from typing import Dict, Generator, List, NamedTuple, Optional
 from django.db import transaction
 from users.models import User
-from whatsapp_messages.models import Message
+from users.phone_numbers import InvalidPhoneNumber, normalize_phone_number
+from whatsapp_messages import partitions
+from whatsapp_messages.models import Message, derived_message_fields
+from analytics.content import ContentStatsService
+from analytics.rollups import DailyRollupService
+from analytics.sessions import SessionService
+from analytics.graph import InteractionGraphService
+from whatsapp_analytics import metrics
+from whatsapp_analytics.db_router import LAST_IMPORT, monitor, write_heartbeat
 import pytz
 
+logger = logging.getLogger(__name__)
+
+class SenderTable:
+    """Sender phone numbers interned as small integers, numbered in order of first appearance.
+
+    Numbers are stored normalized, so every way a chat writes one number
+    maps to the same id.
+    """
+
+    def __init__(self):
+        # Both the written and the normalized form of each number -> id
+        self.ids: Dict[str, int] = {}
+        self.phone_numbers: List[str] = []
+
+    def intern(self, written: str) -> int:
+        sender = self.ids.get(written)
+        if sender is None:
+            phone_number = normalize_phone_number(written)
+            sender = self.ids.get(phone_number)
+            if sender is None:
+                sender = self.ids[phone_number] = len(self.phone_numbers)
+                self.phone_numbers.append(phone_number)
+            self.ids[written] = sender
+        return sender
+
+    def __getitem__(self, sender: int) -> str:
+        return self.phone_numbers[sender]
+
+    def __len__(self) -> int:
+        return len(self.phone_numbers)
+
+
+class ParsedMessage(NamedTuple):
+    # Index into the parser's SenderTable
+    sender: int
+    timestamp: datetime
+    content: str
+    message_type: str
+    content_length: int
+    local_date: date
+    local_hour: int
+    weekday: int
+    is_media: bool
+
+
 class WhatsAppMessageParser:
     def __init__(self):
+        self.senders = SenderTable()
+        # Lines matching the message format whose sender is not a phone number
+        self.invalid_senders = 0
         self.message_pattern = re.compile(
             r'(\d{1,2}/\d{1,2}/\d{2}),\s(\d{1,2}:\d{2})\s-\s(\+\d+\s\d+\s\d+\s\d+):\s(.*)'
         )
@@ -40,8 +98,8 @@ class WhatsAppMessageParser:
                 return 'DOCUMENT'
         return 'TEXT'
 
-    def parse_line(self, line: str) -> Optional[Dict]:
-        """Parse a single line from the chat file."""
+    def parse_line(self, line: str) -> Optional[ParsedMessage]:
+        """Parse a single line from the chat file; its sender is interned in ``self.senders``."""
         match = self.message_pattern.match(line.strip())
         if not match:
             return None
@@ -52,16 +110,20 @@ class WhatsAppMessageParser:
             timestamp = self.parse_timestamp(date, time)
             message_type = self.detect_message_type(content)
             
-            return {
-                'timestamp': timestamp,
-                'phone_number': phone_number.strip(),
-                'content': content.strip(),
-                'message_type': message_type
-            }
+            content = content.strip()
+            return ParsedMessage(
+                self.senders.intern(phone_number.strip()), timestamp, content, message_type,
+                **derived_message_fields(timestamp, content, message_type)
+            )
+        except InvalidPhoneNumber:
+            self.invalid_senders += 1
+            logger.warning('Skipped a message from %r: not a phone number', phone_number)
+            return None
         except ValueError:
             return None
 
-    def process_chat_file(self, file_path: str, batch_size: int = 1000) -> Generator:
+    def process_chat_file(self, file_path: str, batch_size: int = 1000
+                          ) -> Generator[List[ParsedMessage], None, None]:
         """Process the chat file in batches."""
         messages_batch = []
         
@@ -81,33 +143,108 @@ class WhatsAppMessageParser:
 class ChatImportService:
     def __init__(self):
         self.parser = WhatsAppMessageParser()
+        self.content_stats = ContentStatsService()
+        self.daily_rollups = DailyRollupService()
+        self.sessions = SessionService()
+        self.interactions = InteractionGraphService()
+        # Parser sender id -> User primary key, for every sender stored so far
+        self.sender_users: Dict[int, str] = {}
+        # Earliest message stored since sessions and the interaction graph were last updated
+        self.pending_since: Optional[datetime] = None
 
-    @transaction.atomic
-    def process_messages_batch(self, messages_batch: list):
-        """Process and save a batch of messages."""
-        for message_data in messages_batch:
-            user, _ = User.objects.get_or_create(
-                phone_number=message_data['phone_number']
+    def process_messages_batch(self, messages_batch: List[ParsedMessage], defer_sessions: bool = False):
+        """Process and save a batch of ``self.parser``'s messages, recording import throughput and lag.
+
+        Sessions and the interaction graph are re-walked from the batch's
+        first message, which is the whole history when the batch is older
+        than what is stored. ``import_chat`` passes ``defer_sessions=True``
+        and calls ``update_sessions`` once, after its last batch.
+        """
+        started = time.perf_counter()
+        # Only kept once the batch has committed
+        self.sender_users = self._store_batch(messages_batch)
+        if messages_batch:
+            first_timestamp = min(m.timestamp for m in messages_batch)
+            self.pending_since = min(self.pending_since or first_timestamp, first_timestamp)
+        if not defer_sessions:
+            self.update_sessions()
+        if messages_batch:
+            metrics.IMPORT_BATCH_DURATION.observe(time.perf_counter() - started)
+            metrics.IMPORTED_MESSAGES.inc(len(messages_batch))
+            metrics.IMPORT_LAST_BATCH.set_max(time.time())
+            metrics.IMPORT_NEWEST_MESSAGE.set_max(
+                max(m.timestamp for m in messages_batch).timestamp()
             )
 
-            Message.objects.create(
-                sender=user,
-                content=message_data['content'],
-                timestamp=message_data['timestamp'],
-                message_type=message_data['message_type']
+    def _resolve_senders(self, messages_batch: List[ParsedMessage]) -> Dict[int, str]:
+        """``sender_users`` extended to the batch's new senders, creating the users not stored yet."""
+        new_senders = {m.sender for m in messages_batch}.difference(self.sender_users)
+        if not new_senders:
+            return self.sender_users
+        phone_numbers = {self.parser.senders[sender]: sender for sender in new_senders}
+        existing = set(User.objects.filter(pk__in=phone_numbers).values_list('pk', flat=True))
+        User.objects.bulk_create([
+            User(phone_number=phone_number) for phone_number in phone_numbers if phone_number not in existing
+        ])
+        return {**self.sender_users, **{sender: pk for pk, sender in phone_numbers.items()}}
+
+    @transaction.atomic
+    def _store_batch(self, messages_batch: List[ParsedMessage]) -> Dict[int, str]:
+        partitions.check_writable(m.local_date for m in messages_batch)
+        sender_users = self._resolve_senders(messages_batch)
+        Message.objects.bulk_create([
+            Message(
+                sender_id=sender_users[m.sender],
+                content=m.content,
+                timestamp=m.timestamp,
+                message_type=m.message_type,
+                content_length=m.content_length,
+                local_date=m.local_date,
+                local_hour=m.local_hour,
+                weekday=m.weekday,
+                is_media=m.is_media
             )
+            for m in messages_batch
+        ])
+
+        self.content_stats.ingest([
+            (sender_users[m.sender], m.local_date, m.content)
+            for m in messages_batch if not m.is_media
+        ])
+        self.daily_rollups.refresh_days(m.local_date for m in messages_batch)
+        if messages_batch:
+            # Staff read from the primary until the replica has this batch
+            write_heartbeat(LAST_IMPORT)
+        monitor.invalidate()
+        return sender_users
+
+    @transaction.atomic
+    def update_sessions(self):
+        """Fold every message stored since the last call into sessions and the interaction graph."""
+        if self.pending_since is None:
+            return
+        self.sessions.update_from(self.pending_since)
+        self.interactions.update(since=self.pending_since)
+        write_heartbeat(LAST_IMPORT)
+        monitor.invalidate()
+        self.pending_since = None
 
     def import_chat(self, file_path: str):
         """Import the entire chat file."""
         total_messages = 0
         total_users = set()
 
-        for batch in self.parser.process_chat_file(file_path):
-            self.process_messages_batch(batch)
-            total_messages += len(batch)
-            total_users.update(msg['phone_number'] for msg in batch)
+        try:
+            for batch in self.parser.process_chat_file(file_path):
+                self.process_messages_batch(batch, defer_sessions=True)
+                total_messages += len(batch)
+                total_users.update(m.sender for m in batch)
+        finally:
+            # One pass for the whole file: per batch, an older file would rebuild the graph every time
+            self.update_sessions()
 
         return {
             'total_messages': total_messages,
-            'total_users': len(total_users)
+            'total_users': len(total_users),
+            'invalid_senders': self.parser.invalid_senders
         }
@@ -1,6 +1,15 @@
 from django.contrib import admin
+from analytics.admin import recompute_user_statistics
+from whatsapp_analytics.paginators import EstimatedCountPaginator
 from .models import User
 
-# Register your models here.
 
-admin.site.register(User)
\ No newline at end of file
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('phone_number', 'display_name', 'is_staff', 'joined_at', 'last_active')
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('phone_number', 'display_name')
+    exclude = ('password',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [recompute_user_statistics]
@@ -0,0 +1,207 @@
+# Generated by Django 5.1.4 on 2026-10-19 15:02
+
+import hashlib
+import math
+import re
+import sqlite3
+from collections import defaultdict
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+import phonenumbers
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations
+
+CHUNK_SIZE = 500
+INTERACTION_CURSOR = 'interaction_graph'
+# whatsapp_messages.partitions names archive files messages_<year>.sqlite3
+ARCHIVE_PATTERN = re.compile(r'^messages_\d{4}\.sqlite3$')
+
+# The helpers below are frozen copies of users.phone_numbers and
+# analytics.sketches as they were when this migration was written, so
+# later changes to those modules cannot change what it does.
+
+
+def normalize_phone_number(value):
+    """``value`` in E.164 form, or None when it cannot be a phone number."""
+    try:
+        number = phonenumbers.parse(value.strip(), getattr(settings, 'PHONE_NUMBER_REGION', 'NG'))
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+class DistinctCounter:
+    """Writes the ``DistinctCounter`` serialization: an exact set up to 256 members, then a HyperLogLog."""
+
+    THRESHOLD = 256
+    PRECISION = 12
+
+    def __init__(self):
+        self.members = set()
+        self.registers = None
+
+    def add(self, item):
+        if self.registers is None:
+            self.members.add(item)
+            if len(self.members) > self.THRESHOLD:
+                self.registers = bytearray(1 << self.PRECISION)
+                for member in self.members:
+                    self._add_hashed(member)
+        else:
+            self._add_hashed(item)
+
+    def _add_hashed(self, item):
+        value = int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+        bits = 64 - self.PRECISION
+        index = value >> bits
+        rank = bits - (value & ((1 << bits) - 1)).bit_length() + 1
+        self.registers[index] = max(self.registers[index], rank)
+
+    def count(self):
+        if self.registers is None:
+            return len(self.members)
+        size = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / size) * size ** 2 / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        if self.registers is not None:
+            return b'H' + bytes([self.PRECISION]) + bytes(self.registers)
+        return b'S' + '\n'.join(sorted(self.members)).encode('utf-8')
+
+
+def archive_files():
+    """The SQLite file of each archived year."""
+    directory = Path(getattr(settings, 'MESSAGE_ARCHIVE_DIR', ''))
+    if not directory.is_dir():
+        return []
+    return sorted(path for path in directory.iterdir() if ARCHIVE_PATTERN.match(path.name))
+
+
+def rekey_sql(table, column, pairs, quote, placeholder='%s'):
+    """One UPDATE setting ``column`` from each ``(old, new)`` pair's old value to its new one."""
+    cases = ' '.join([f'WHEN {placeholder} THEN {placeholder}'] * len(pairs))
+    olds = ', '.join([placeholder] * len(pairs))
+    sql = (
+        f'UPDATE {quote(table)} SET {quote(column)} = CASE {quote(column)} {cases} END '
+        f'WHERE {quote(column)} IN ({olds})'
+    )
+    return sql, [value for pair in pairs for value in pair] + [old for old, _ in pairs]
+
+
+def normalize_phone_numbers(apps, schema_editor):
+    """Rewrite ``User`` keys, and every key referring to them, in E.164 form.
+
+    A number stored under several spellings (an imported ``+234 803 ...``
+    sender who also signed in as ``+234803...``) becomes one user, the
+    already normalized row when there is one. The other spellings'
+    messages and admin log entries move to it; their statistics, sessions
+    and interactions are deleted with them, so after a merge run
+    rebuild_daily_stats, rebuild_sessions, rebuild_interactions and
+    build_content_stats. Archived years are rewritten in place. Numbers
+    that cannot be parsed are left alone.
+
+    Numbers kept outside foreign keys follow too: the interaction cursor's
+    last sender is renamed and each day's active user sketch is recounted,
+    so a plain rename needs no rebuild.
+    """
+    User = apps.get_model('users', 'User')
+    Message = apps.get_model('whatsapp_messages', 'Message')
+    LogEntry = apps.get_model('admin', 'LogEntry')
+    AnalyticsCursor = apps.get_model('analytics', 'AnalyticsCursor')
+    GroupStatistics = apps.get_model('analytics', 'GroupStatistics')
+    connection = schema_editor.connection
+    db_alias = connection.alias
+
+    spellings = defaultdict(list)
+    for phone_number in User.objects.using(db_alias).values_list('phone_number', flat=True).iterator():
+        normalized = normalize_phone_number(phone_number)
+        if normalized is not None:
+            spellings[normalized].append(phone_number)
+    # Every spelling, merged or not, becomes the normalized number
+    normalized_numbers = {
+        phone_number: normalized
+        for normalized, stored in spellings.items() for phone_number in stored if phone_number != normalized
+    }
+    if not normalized_numbers:
+        return
+
+    renames = []
+    for normalized, stored in spellings.items():
+        keep = normalized if normalized in stored else min(stored)
+        duplicates = [phone_number for phone_number in stored if phone_number != keep]
+        if duplicates:
+            Message.objects.using(db_alias).filter(sender_id__in=duplicates).update(sender_id=keep)
+            LogEntry.objects.using(db_alias).filter(user_id__in=duplicates).update(user_id=keep)
+            User.objects.using(db_alias).filter(pk__in=duplicates).delete()
+        if keep != normalized:
+            renames.append((keep, normalized))
+
+    # The user table first, then each table pointing at it, including many-to-many links
+    columns = [(User._meta.db_table, User._meta.pk.column)] + [
+        (relation.related_model._meta.db_table, relation.field.column)
+        for relation in User._meta.get_fields(include_hidden=True)
+        if relation.auto_created and not relation.concrete and not relation.many_to_many
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(renames), CHUNK_SIZE):
+            for table, column in columns:
+                cursor.execute(*rekey_sql(table, column, renames[start:start + CHUNK_SIZE], connection.ops.quote_name))
+
+    # The graph builder is seeded with the last sender it read
+    for interaction_cursor in AnalyticsCursor.objects.using(db_alias).filter(name=INTERACTION_CURSOR):
+        last_sender = interaction_cursor.state.get('last_sender')
+        if last_sender in normalized_numbers:
+            interaction_cursor.state['last_sender'] = normalized_numbers[last_sender]
+            interaction_cursor.save(update_fields=['state'])
+
+    active_users = defaultdict(DistinctCounter)
+    senders = Message.objects.using(db_alias).values_list('local_date', 'sender_id').distinct().order_by()
+    for day, sender_id in senders.iterator():
+        active_users[day].add(sender_id)
+
+    if db_alias == DEFAULT_DB_ALIAS:
+        archive_renames = list(normalized_numbers.items())
+        table = Message._meta.db_table
+        sender_column = Message._meta.get_field('sender').column
+        for path in archive_files():
+            with closing(sqlite3.connect(path)) as archive, archive:
+                for start in range(0, len(archive_renames), CHUNK_SIZE):
+                    archive.execute(*rekey_sql(
+                        table, sender_column, archive_renames[start:start + CHUNK_SIZE],
+                        connection.ops.quote_name, placeholder='?'
+                    ))
+                for day, sender_id in archive.execute(
+                    f'SELECT DISTINCT local_date, "{sender_column}" FROM "{table}"'
+                ):
+                    active_users[date.fromisoformat(day)].add(sender_id)
+
+    # Sketches hash the sender spellings they saw, so recount them from the rewritten messages
+    days = list(GroupStatistics.objects.using(db_alias).only('date'))
+    for stats in days:
+        counter = active_users.get(stats.date, DistinctCounter())
+        stats.active_users = counter.count()
+        stats.active_users_sketch = counter.to_bytes()
+    GroupStatistics.objects.using(db_alias).bulk_update(
+        days, ['active_users', 'active_users_sketch'], batch_size=CHUNK_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_display_name'),
+        ('admin', '0003_logentry_add_action_flag_choices'),
+        ('analytics', '0007_groupstatistics_gap_digest_and_more'),
+        ('whatsapp_messages', '0004_time_ordered_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_phone_numbers, migrations.RunPython.noop),
+    ]
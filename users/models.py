@@ -1,12 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import RegexValidator
+from .phone_numbers import normalize_phone_number
 
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, phone_number, password=None, **extra_fields):
         if not phone_number:
             raise ValueError('The Phone Number field must be set')
+        phone_number = normalize_phone_number(phone_number)
         user = self.model(phone_number=phone_number, **extra_fields)
         if password:
             user.set_password(password)
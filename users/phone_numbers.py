@@ -0,0 +1,32 @@
+"""Phone numbers in the one form ``User`` primary keys are stored in: E.164, e.g. ``+2348031234567``.
+
+Chat exports write senders as ``+234 803 123 4567`` and people type
+``0803 123 4567`` at login; both must land on the same user. Numbers
+without a country code are read as ``PHONE_NUMBER_REGION`` numbers.
+"""
+from functools import lru_cache
+from typing import Optional
+import phonenumbers
+from django.conf import settings
+
+CACHE_SIZE = 10000
+
+
+class InvalidPhoneNumber(ValueError):
+    pass
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalize(value: str, region: str) -> str:
+    try:
+        number = phonenumbers.parse(value, region)
+    except phonenumbers.NumberParseException as error:
+        raise InvalidPhoneNumber(str(error)) from error
+    if not phonenumbers.is_possible_number(number):
+        raise InvalidPhoneNumber(f'{value!r} is not a possible phone number')
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def normalize_phone_number(value: str, region: Optional[str] = None) -> str:
+    """``value`` in E.164 form; raises ``InvalidPhoneNumber`` when it cannot be a phone number."""
+    return _normalize(value.strip(), region or settings.PHONE_NUMBER_REGION)
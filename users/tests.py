@@ -1,3 +1,104 @@
-from django.test import TestCase
+import importlib
+from datetime import date, datetime
+from types import SimpleNamespace
+from django.apps import apps
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from analytics.graph import CURSOR_NAME, InteractionGraphService
+from analytics.models import AnalyticsCursor, Interaction, UserStatistics
+from analytics.rollups import DailyRollupService
+from analytics.sketches import DistinctCounter
+from whatsapp_messages.models import Message
+from .models import User
+from .phone_numbers import InvalidPhoneNumber, _normalize, normalize_phone_number
 
-# Create your tests here.
+normalize_migration = importlib.import_module('users.migrations.0004_normalize_phone_numbers')
+
+
+class PhoneNumberTests(SimpleTestCase):
+    def test_spellings_normalize_to_e164(self):
+        for written in ('+234 803 123 4567', '08031234567', '0803 123 4567', '2348031234567', ' +2348031234567 '):
+            with self.subTest(written):
+                self.assertEqual(normalize_phone_number(written), '+2348031234567')
+        self.assertEqual(normalize_phone_number('+44 7911 123456'), '+447911123456')
+
+    def test_local_numbers_read_in_the_configured_region(self):
+        with override_settings(PHONE_NUMBER_REGION='GB'):
+            self.assertEqual(normalize_phone_number('07911 123456'), '+447911123456')
+
+    def test_rejects_what_cannot_be_a_phone_number(self):
+        for written in ('hello', '123', ''):
+            with self.subTest(written), self.assertRaises(InvalidPhoneNumber):
+                normalize_phone_number(written)
+
+    def test_results_are_cached(self):
+        _normalize.cache_clear()
+        normalize_phone_number('+234 803 123 4567')
+        normalize_phone_number('+234 803 123 4567')
+        self.assertEqual(_normalize.cache_info().hits, 1)
+
+
+class NormalizePhoneNumbersMigrationTests(TestCase):
+    def test_rewrites_and_merges_keys(self):
+        imported = User.objects.create(phone_number='+234 803 000 0001')
+        signed_in = User.objects.create(phone_number='+2348030000001', is_staff=True)
+        only_imported = User.objects.create(phone_number='+234 803 000 0002')
+        User.objects.create(phone_number='unknown')
+        UserStatistics.objects.create(user=only_imported, total_messages=2)
+        only_imported.groups.add(Group.objects.create(name='members'))
+        timestamp = timezone.make_aware(datetime(2024, 3, 1, 9, 30))
+        for sender in (imported, signed_in, only_imported, only_imported):
+            Message.objects.create(sender=sender, content='hello', timestamp=timestamp)
+
+        normalize_migration.normalize_phone_numbers(apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(
+            set(User.objects.values_list('phone_number', 'is_staff')),
+            {('+2348030000001', True), ('+2348030000002', False), ('unknown', False)}
+        )
+        self.assertEqual(
+            sorted(Message.objects.values_list('sender_id', flat=True)),
+            ['+2348030000001', '+2348030000001', '+2348030000002', '+2348030000002']
+        )
+        renamed = User.objects.get(phone_number='+2348030000002')
+        self.assertEqual(renamed.statistics.total_messages, 2)
+        self.assertEqual(list(renamed.groups.values_list('name', flat=True)), ['members'])
+
+    def test_renames_numbers_kept_outside_foreign_keys(self):
+        renamed = User.objects.create(phone_number='+234 803 000 0002')
+        replier = User.objects.create(phone_number='+2348030000003')
+        first_day, second_day = date(2024, 3, 1), date(2024, 3, 2)
+        Message.objects.create(sender=renamed, content='hello', timestamp=timezone.make_aware(datetime(2024, 3, 1, 9, 30)))
+        DailyRollupService().refresh_days([first_day])
+        InteractionGraphService().update()
+
+        normalize_migration.normalize_phone_numbers(apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(AnalyticsCursor.objects.get(name=CURSOR_NAME).state['last_sender'], '+2348030000002')
+        # The next import replies to the renamed sender and adds a later day of their messages
+        Message.objects.create(sender=replier, content='hi', timestamp=timezone.make_aware(datetime(2024, 3, 1, 9, 35)))
+        Message.objects.create(sender_id='+2348030000002', content='again',
+                               timestamp=timezone.make_aware(datetime(2024, 3, 2, 9, 30)))
+        DailyRollupService().refresh_days([second_day])
+        InteractionGraphService().update()
+
+        self.assertEqual(
+            list(Interaction.objects.values_list('source_id', 'target_id')), [('+2348030000003', '+2348030000002')]
+        )
+        connection.check_constraints()
+        self.assertEqual(DailyRollupService().count_active_users(first_day, second_day), 1)
+
+    def test_frozen_helpers_write_what_the_app_reads(self):
+        for size in (3, 300):
+            with self.subTest(size=size):
+                members = [f'+23480300{index:05d}' for index in range(size)]
+                frozen, live = normalize_migration.DistinctCounter(), DistinctCounter()
+                for member in members:
+                    frozen.add(member)
+                    live.add(member)
+                self.assertEqual(frozen.to_bytes(), live.to_bytes())
+                self.assertEqual(DistinctCounter.from_bytes(frozen.to_bytes()).count(), frozen.count())
+        self.assertEqual(normalize_migration.normalize_phone_number('0803 123 4567'), '+2348031234567')
+        self.assertIsNone(normalize_migration.normalize_phone_number('not a number'))
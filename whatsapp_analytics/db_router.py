@@ -0,0 +1,142 @@
+"""Send analytics reads to a read replica while writes stay on the primary.
+
+Lag is measured with a heartbeat: ``write_heartbeat`` stamps the current
+time on the primary and the replica reports the newest stamp it has
+received. Reads fall back to the primary when the replica is further
+behind than ``ANALYTICS_REPLICA_MAX_LAG_SECONDS``, and staff (who run
+imports) read from the primary until the replica has caught up with the
+last import.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+REPLICA_ALIAS = 'replica'
+HEARTBEAT = 'replica_heartbeat'
+LAST_IMPORT = 'last_import'
+# rest_framework.permissions.SAFE_METHODS; the router loads with the settings, before DRF is needed
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_alias: ContextVar[Optional[str]] = ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    """Reads go to whatever ``read_from`` selected for the current context, writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated on its own
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def read_from(alias: str):
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in connections.settings
+
+
+def write_heartbeat(name: str = HEARTBEAT, when: Optional[datetime] = None) -> datetime:
+    """Stamp ``name`` on the primary; the replica's copy of the stamp measures its lag."""
+    from analytics.models import AnalyticsCursor
+
+    when = when or timezone.now()
+    AnalyticsCursor.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        name=name, defaults={'position': when}
+    )
+    return when
+
+
+def choose_read_alias(heartbeat: Optional[datetime], last_import: Optional[datetime],
+                      now: datetime, is_staff: bool) -> str:
+    """The replica when it is fresh enough for this reader, the primary otherwise."""
+    if heartbeat is None:
+        return DEFAULT_DB_ALIAS
+    if (now - heartbeat).total_seconds() > settings.ANALYTICS_REPLICA_MAX_LAG_SECONDS:
+        return DEFAULT_DB_ALIAS
+    # Read-your-writes: whoever imported must see the import
+    if is_staff and last_import is not None and heartbeat < last_import:
+        return DEFAULT_DB_ALIAS
+    return REPLICA_ALIAS
+
+
+class ReplicaMonitor:
+    """Heartbeat and last import times, cached for ``ANALYTICS_REPLICA_STATUS_TTL_SECONDS``."""
+
+    def __init__(self):
+        self._checked_at = None
+        self._status = (None, None)
+
+    def status(self) -> tuple:
+        ttl = settings.ANALYTICS_REPLICA_STATUS_TTL_SECONDS
+        if self._checked_at is None or time.monotonic() - self._checked_at > ttl:
+            self._status = (
+                self._stamp(REPLICA_ALIAS, HEARTBEAT),
+                self._stamp(DEFAULT_DB_ALIAS, LAST_IMPORT),
+            )
+            self._checked_at = time.monotonic()
+        return self._status
+
+    def read_alias_for(self, user) -> str:
+        if not replica_configured():
+            return DEFAULT_DB_ALIAS
+        heartbeat, last_import = self.status()
+        return choose_read_alias(heartbeat, last_import, timezone.now(), bool(user and user.is_staff))
+
+    def invalidate(self) -> None:
+        self._checked_at = None
+
+    @staticmethod
+    def _stamp(alias: str, name: str) -> Optional[datetime]:
+        from analytics.models import AnalyticsCursor
+
+        try:
+            return AnalyticsCursor.objects.using(alias).filter(name=name).values_list(
+                'position', flat=True
+            ).first()
+        except DatabaseError:
+            # A replica that cannot be read is treated as infinitely behind
+            return None
+
+
+monitor = ReplicaMonitor()
+
+
+class ReplicaReadMixin:
+    """Serve a viewset's safe (read-only) requests from the replica when it is fresh enough."""
+
+    _replica_token = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # Reset here rather than in finalize_response, which an unhandled exception skips
+            token, self._replica_token = self._replica_token, None
+            if token is not None:
+                _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # The choice depends on the authenticated user, which initial has just resolved
+        if request.method in SAFE_METHODS:
+            self._replica_token = _read_alias.set(monitor.read_alias_for(request.user))
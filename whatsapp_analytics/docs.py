@@ -0,0 +1,87 @@
+"""API documentation views that cost nothing until they are requested.
+
+The OpenAPI schema is committed as ``schema.yaml`` (regenerate it with
+``manage.py spectacular --file schema.yaml``) and served from disk, so
+no request walks every view and serializer to build it and no process
+imports drf_spectacular's generator, renderers and views at boot just
+to register their URLs. Swagger UI and Redoc are drf_spectacular's own
+views, imported on their first request.
+"""
+import json
+import os
+import threading
+from typing import Callable, Dict, Tuple
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+
+YAML_MEDIA_TYPE = 'application/vnd.oai.openapi'
+JSON_MEDIA_TYPE = 'application/vnd.oai.openapi+json'
+
+_schemas: Dict[Tuple[str, int, str], bytes] = {}
+_schemas_lock = threading.Lock()
+
+
+def lazy_view(dotted_path: str, **initkwargs) -> Callable:
+    """``import_string(dotted_path).as_view(**initkwargs)``, imported on the first request."""
+    view = None
+
+    @csrf_exempt
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+    return dispatch
+
+
+def wants_json(request) -> bool:
+    requested = request.GET.get('format')
+    if requested:
+        return requested == 'json'
+    accept = request.headers.get('Accept', '')
+    return accept.split(',')[0].strip().split(';')[0].endswith('json')
+
+
+def schema_body(path: str, as_json: bool = False) -> bytes:
+    """The schema file at ``path``, as YAML or JSON; read (and converted) once per version of the file."""
+    key = (str(path), os.stat(path).st_mtime_ns, 'json' if as_json else 'yaml')
+    body = _schemas.get(key)
+    if body is None:
+        with _schemas_lock:
+            body = _schemas.get(key)
+            if body is None:
+                with open(path, 'rb') as schema_file:
+                    body = schema_file.read()
+                if as_json:
+                    import yaml
+
+                    body = json.dumps(yaml.safe_load(body), indent=4).encode()
+                # A redeployed file gets a new mtime; forget the old versions
+                for stale in [cached for cached in _schemas if cached[0] == key[0] and cached[1] != key[1]]:
+                    del _schemas[stale]
+                _schemas[key] = body
+    return body
+
+
+_generated_schema_view = lazy_view('drf_spectacular.views.SpectacularAPIView')
+
+
+@csrf_exempt
+@require_GET
+def schema_view(request):
+    """The precomputed schema from ``OPENAPI_SCHEMA_PATH``, or a generated one when the file is missing."""
+    path = settings.OPENAPI_SCHEMA_PATH
+    if not path or not os.path.exists(path):
+        return _generated_schema_view(request)
+
+    as_json = wants_json(request)
+    response = HttpResponse(
+        schema_body(path, as_json), content_type=JSON_MEDIA_TYPE if as_json else YAML_MEDIA_TYPE
+    )
+    response['Content-Disposition'] = (
+        f'inline; filename="{settings.SPECTACULAR_SETTINGS["TITLE"]}.{"json" if as_json else "yaml"}"'
+    )
+    return response
@@ -0,0 +1,381 @@
+"""Prometheus metrics shared by every worker process.
+
+Each process keeps its samples in its own memory-mapped file under
+``METRICS_DIR``; recording a sample is an in-place update of a double in
+that file. The ``/metrics`` view reads every file in the directory and
+merges them (sums for counters and histograms, the maximum for
+timestamp gauges), so any gunicorn worker can serve a complete scrape.
+
+A process folds its file into ``archive.db`` when it exits and deletes
+it, so recycled workers do not leave a file each behind. A process that
+is killed outright cannot; clear ``METRICS_DIR`` before starting the
+server (every deploy restarts the counters anyway).
+"""
+import atexit
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+INITIAL_FILE_SIZE = 64 * 1024
+ARCHIVE_FILE = 'archive.db'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+BATCH_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class ValueFile:
+    """Append-only ``key -> double`` map in a memory-mapped file.
+
+    Layout: an 8 byte header holding the bytes used, then entries of a
+    4 byte key length, the UTF-8 key padded to 8 bytes and the value.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_FILE_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = struct.unpack_from('q', self._map, 0)[0] or 8
+        self._positions = {key: position for key, _, position in read_entries(self._map, self._used)}
+
+    def add(self, key: str, amount: float) -> None:
+        position = self._positions.get(key) or self._create(key)
+        value = struct.unpack_from('d', self._map, position)[0]
+        struct.pack_into('d', self._map, position, value + amount)
+
+    def set_max(self, key: str, value: float) -> None:
+        position = self._positions.get(key) or self._create(key)
+        if value > struct.unpack_from('d', self._map, position)[0]:
+            struct.pack_into('d', self._map, position, value)
+
+    def _create(self, key: str) -> int:
+        encoded = key.encode('utf-8')
+        padded = encoded + b' ' * (8 - (len(encoded) + 4) % 8)
+        entry = struct.pack(f'i{len(padded)}sd', len(padded), padded, 0.0)
+        while self._used + len(entry) > self._capacity:
+            self._grow()
+
+        struct.pack_into(f'{len(entry)}s', self._map, self._used, entry)
+        self._used += len(entry)
+        struct.pack_into('q', self._map, 0, self._used)
+        position = self._used - 8
+        self._positions[key] = position
+        return position
+
+    def _grow(self) -> None:
+        self._capacity *= 2
+        self._map.close()
+        self._file.truncate(self._capacity)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+def read_entries(buffer, used: int) -> Iterable[Tuple[str, float, int]]:
+    """``(key, value, value offset)`` for every entry of a value file."""
+    offset = 8
+    while offset < used:
+        length = struct.unpack_from('i', buffer, offset)[0]
+        key = bytes(buffer[offset + 4:offset + 4 + length]).decode('utf-8').rstrip(' ')
+        offset += 4 + length
+        yield key, struct.unpack_from('d', buffer, offset)[0], offset
+        offset += 8
+
+
+def read_file(path: str) -> Iterable[Tuple[str, float]]:
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    if len(data) < 8:
+        return
+    used = struct.unpack_from('q', data, 0)[0]
+    for key, value, _ in read_entries(data, min(used, len(data))):
+        yield key, value
+
+
+class MetricsStore:
+    """This process's value file, reopened after a fork so workers never share one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file: Optional[ValueFile] = None
+        # Keys merged by maximum rather than sum, for folding into the archive
+        self._max_keys = set()
+
+    def directory(self) -> str:
+        return settings.METRICS_DIR
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            self._values().add(key, amount)
+
+    def set_max(self, key: str, value: float) -> None:
+        with self._lock:
+            self._values().set_max(key, value)
+            self._max_keys.add(key)
+
+    def _values(self) -> ValueFile:
+        pid = os.getpid()
+        if self._pid != pid or self._file is None:
+            directory = self.directory()
+            os.makedirs(directory, exist_ok=True)
+            self._file = ValueFile(os.path.join(directory, f'{pid}.db'))
+            self._pid = pid
+        return self._file
+
+    def close(self) -> None:
+        """Fold this process's samples into the archive file and delete its own file."""
+        with self._lock:
+            if self._file is None or self._pid != os.getpid():
+                return
+            directory = os.path.dirname(self._file.path)
+            # Exiting workers take turns, so each reads the archive the last one left
+            with open(os.path.join(directory, 'archive.lock'), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                archive = ValueFile(os.path.join(directory, ARCHIVE_FILE))
+                try:
+                    for key, value in read_file(self._file.path):
+                        if key in self._max_keys:
+                            archive.set_max(key, value)
+                        else:
+                            archive.add(key, value)
+                finally:
+                    archive.close()
+            self._file.close()
+            os.remove(self._file.path)
+            self._file, self._pid = None, None
+
+    def reset(self) -> None:
+        """Forget the open file, e.g. after ``METRICS_DIR`` changed."""
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._file.close()
+            self._file, self._pid = None, None
+
+    def collect(self) -> Dict[str, List[float]]:
+        """Every key with the values recorded by each process file."""
+        values: Dict[str, List[float]] = {}
+        for path in sorted(glob.glob(os.path.join(self.directory(), '*.db'))):
+            for key, value in read_file(path):
+                values.setdefault(key, []).append(value)
+        return values
+
+
+store = MetricsStore()
+atexit.register(store.close)
+
+
+def sample_key(name: str, labels: Dict[str, str]) -> str:
+    return json.dumps([name, labels], sort_keys=True, separators=(',', ':'))
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        # Encoded keys per (sample name, label values), so recording skips the JSON encoding
+        self._keys: Dict[tuple, str] = {}
+        REGISTRY[name] = self
+
+    def _key(self, sample_name: str, labels: dict, **extra) -> str:
+        values = tuple(str(labels[label]) for label in self.labelnames)
+        cache_key = (sample_name, values, tuple(extra.items()))
+        key = self._keys.get(cache_key)
+        if key is None:
+            key = self._keys[cache_key] = sample_key(
+                sample_name, {**dict(zip(self.labelnames, values)), **extra}
+            )
+        return key
+
+    def samples(self, values: Dict[str, List[float]]) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonic counter; ``name`` carries the conventional ``_total`` suffix."""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        store.add(self._key(self.name, labels), amount)
+
+    def samples(self, values):
+        return [(self.name, labels, sum(recorded)) for labels, recorded in _series(values, self.name)]
+
+
+class MaxGauge(Metric):
+    """Gauge merged across processes by taking the largest value, e.g. a timestamp."""
+
+    type = 'gauge'
+
+    def set_max(self, value: float, **labels) -> None:
+        store.set_max(self._key(self.name, labels), value)
+
+    def samples(self, values):
+        return [(self.name, labels, max(recorded)) for labels, recorded in _series(values, self.name)]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value: float, **labels) -> None:
+        # Buckets are stored non-cumulatively so an observation touches three values
+        bound = next(bucket for bucket in self.buckets if value <= bucket)
+        store.add(self._key(f'{self.name}_bucket', labels, le=_format(bound)), 1)
+        store.add(self._key(f'{self.name}_sum', labels), value)
+        store.add(self._key(f'{self.name}_count', labels), 1)
+
+    def samples(self, values):
+        sums = {
+            json.dumps(labels, sort_keys=True): sum(recorded)
+            for labels, recorded in _series(values, f'{self.name}_sum')
+        }
+        counts: Dict[str, Dict[str, float]] = {}
+        for labels, recorded in _series(values, f'{self.name}_bucket'):
+            bound = labels.pop('le')
+            counts.setdefault(json.dumps(labels, sort_keys=True), {})[bound] = sum(recorded)
+
+        rows = []
+        for encoded, by_bound in sorted(counts.items()):
+            labels = json.loads(encoded)
+            cumulative = 0.0
+            for bucket in self.buckets:
+                cumulative += by_bound.get(_format(bucket), 0.0)
+                rows.append((f'{self.name}_bucket', {**labels, 'le': _format(bucket)}, cumulative))
+            rows.append((f'{self.name}_sum', labels, sums.get(encoded, 0.0)))
+            rows.append((f'{self.name}_count', labels, cumulative))
+        return rows
+
+
+class CallbackGauge(Metric):
+    """Gauge computed when scraped, for values the database already knows."""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str,
+                 callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self, values):
+        return [(self.name, labels, value) for labels, value in self.callback()]
+
+
+REGISTRY: Dict[str, Metric] = {}
+
+
+def _series(values: Dict[str, List[float]], name: str):
+    for key, recorded in values.items():
+        sample_name, labels = json.loads(key)
+        if sample_name == name:
+            yield labels, recorded
+
+
+def _format(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render() -> str:
+    """Text exposition format 0.0.4 for every registered metric."""
+    values = store.collect()
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples(values):
+            rendered_labels = ','.join(
+                f'{label}="{_escape(str(label_value))}"' for label, label_value in sorted(labels.items())
+            )
+            lines.append(f'{name}{{{rendered_labels}}} {_format(value)}' if rendered_labels
+                         else f'{name} {_format(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires ``Bearer METRICS_TOKEN`` when that is set."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _table_sizes():
+    from analytics.models import GroupStatistics, UserStatistics
+    from django.db.models import Sum
+
+    # Daily rollups already hold the message count; counting the table itself is a full scan
+    messages = GroupStatistics.objects.aggregate(total=Sum('total_messages'))['total'] or 0
+    yield {'table': 'message'}, messages
+    yield {'table': 'user_statistics'}, UserStatistics.objects.count()
+
+
+def _newest_message_age():
+    from whatsapp_messages.models import Message
+
+    newest = Message.objects.order_by('-timestamp').values_list('timestamp', flat=True).first()
+    if newest is not None:
+        yield {}, max(time.time() - newest.timestamp(), 0.0)
+
+
+REQUEST_LATENCY = Histogram(
+    'whatsapp_http_request_duration_seconds',
+    'Request latency by view (analytics actions are named analytics-<action>)',
+    ('view', 'method'),
+)
+REQUEST_QUERIES = Histogram(
+    'whatsapp_http_request_queries',
+    'Database queries per request by view',
+    ('view',),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_QUERIES = Counter('whatsapp_db_queries_total', 'Database queries run while serving requests', ('view',))
+CACHE_LOOKUPS = Counter('whatsapp_cache_lookups_total', 'Cache lookups by cache and result', ('cache', 'result'))
+IMPORTED_MESSAGES = Counter('whatsapp_import_messages_total', 'Messages stored by import_chat')
+IMPORT_BATCH_DURATION = Histogram(
+    'whatsapp_import_batch_duration_seconds',
+    'Time to store one import batch and refresh its derived statistics',
+    buckets=BATCH_DURATION_BUCKETS,
+)
+IMPORT_LAST_BATCH = MaxGauge(
+    'whatsapp_import_last_batch_timestamp_seconds', 'When the last import batch was committed'
+)
+IMPORT_NEWEST_MESSAGE = MaxGauge(
+    'whatsapp_import_newest_message_timestamp_seconds', 'Timestamp of the newest imported message'
+)
+NEWEST_MESSAGE_AGE = CallbackGauge(
+    'whatsapp_newest_message_age_seconds', 'Seconds since the newest stored message was sent',
+    _newest_message_age,
+)
+TABLE_ROWS = CallbackGauge('whatsapp_table_rows', 'Rows in the main tables', _table_sizes)
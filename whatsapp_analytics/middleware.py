@@ -0,0 +1,140 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from . import metrics
+
+logger = logging.getLogger('whatsapp_analytics.requests')
+slow_query_logger = logging.getLogger('whatsapp_analytics.slow_queries')
+
+
+class QueryTimer:
+    """``execute_wrapper`` hook counting and timing every query of one request."""
+
+    def __init__(self, request, threshold_ms: float):
+        self.request = request
+        self.threshold_ms = threshold_ms
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if elapsed * 1000 >= self.threshold_ms:
+                slow_query_logger.warning(json.dumps({
+                    'event': 'slow_query',
+                    'method': self.request.method,
+                    'path': self.request.path,
+                    'duration_ms': round(elapsed * 1000, 2),
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                }))
+
+
+class QueryTimingMiddleware:
+    """Report query count, SQL time, view time and render time of every request.
+
+    The numbers go out as a ``Server-Timing`` header, one JSON log line
+    on the ``whatsapp_analytics.requests`` logger and the request metrics
+    in ``whatsapp_analytics.metrics``. Queries slower than
+    ``SLOW_QUERY_THRESHOLD_MS`` are logged with their SQL. Render time is
+    only split out for DRF and template responses, which render after the
+    view returns. The middleware is sync and async capable, so async views
+    such as the OTP endpoints are not pushed onto a thread by it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Stay on the event loop under ASGI instead of forcing async views through a thread
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = self._start(request)
+        started = time.perf_counter()
+        with self._wrap_connections(timer):
+            response = self.get_response(request)
+        return self._finish(request, response, timer, started)
+
+    async def __acall__(self, request):
+        timer = self._start(request)
+        started = time.perf_counter()
+        # Connections are per thread, and async views reach the database
+        # through sync_to_async's thread-sensitive thread: hook that one
+        hooks = await sync_to_async(self._wrap_connections)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(hooks.close)()
+        return self._finish(request, response, timer, started)
+
+    def _start(self, request) -> QueryTimer:
+        timer = QueryTimer(request, settings.SLOW_QUERY_THRESHOLD_MS)
+        request.query_timer = timer
+        request.view_finished_at = None
+        request.render_finished_at = None
+        return timer
+
+    @staticmethod
+    def _wrap_connections(timer: QueryTimer) -> ExitStack:
+        """Install ``timer`` on this thread's connections; closing the stack removes it."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            return stack.pop_all()
+
+    def _finish(self, request, response, timer: QueryTimer, started: float):
+        finished = time.perf_counter()
+        total_ms = (finished - started) * 1000
+        db_ms = timer.duration * 1000
+        if request.view_finished_at is not None and request.render_finished_at is not None:
+            view_ms = (request.view_finished_at - started) * 1000
+            render_ms = (request.render_finished_at - request.view_finished_at) * 1000
+        else:
+            view_ms, render_ms = total_ms, 0.0
+
+        response['Server-Timing'] = ', '.join([
+            f'db;desc="{timer.count} queries";dur={db_ms:.2f}',
+            f'view;dur={view_ms:.2f}',
+            f'serialize;dur={render_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+        view = request.resolver_match.url_name if request.resolver_match else 'unmatched'
+        metrics.REQUEST_LATENCY.observe(total_ms / 1000, view=view, method=request.method)
+        metrics.REQUEST_QUERIES.observe(timer.count, view=view)
+        metrics.DB_QUERIES.inc(timer.count, view=view)
+
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timer.count,
+            'db_ms': round(db_ms, 2),
+            'view_ms': round(view_ms, 2),
+            'serialize_ms': round(render_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        request.view_finished_at = time.perf_counter()
+
+        def rendered(response):
+            request.render_finished_at = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
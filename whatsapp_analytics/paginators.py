@@ -0,0 +1,62 @@
+"""Admin pagination for tables too large to count on every page view."""
+from typing import Optional
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using: str) -> Optional[int]:
+    """The database's own idea of how many rows ``model``'s table holds, without scanning it.
+
+    PostgreSQL's planner statistics; on SQLite the ``sqlite_stat1`` row
+    count from the last ANALYZE, else the largest rowid (an upper bound,
+    as deleted rows leave gaps). ``None`` when neither is available.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                # -1 until the table has been vacuumed or analyzed
+                return row[0] if row and row[0] >= 0 else None
+            if connection.vendor == 'sqlite':
+                try:
+                    cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                    row = cursor.fetchone()
+                except DatabaseError:
+                    # No ANALYZE has run yet, so there is no sqlite_stat1
+                    row = None
+                if row:
+                    return int(row[0].split()[0])
+                cursor.execute(f'SELECT MAX(_rowid_) FROM {connection.ops.quote_name(table)}')
+                return cursor.fetchone()[0] or 0
+    except DatabaseError:
+        return None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never counts more than ``exact_count_limit`` rows.
+
+    An unfiltered list of a large table shows the database's row estimate;
+    anything smaller, or filtered, is counted exactly up to the limit, so a
+    broad filter pages through its first ``exact_count_limit`` matches.
+    Pair with ``ModelAdmin.show_full_result_count = False``, which skips
+    the admin's separate count of the whole table.
+    """
+
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_count_limit:
+                return estimate
+        return queryset.order_by()[:self.exact_count_limit].count()
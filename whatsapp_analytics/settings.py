@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -41,7 +43,8 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     'rest_framework',
-    'rest_framework_simplejwt',
+    # Not 'rest_framework_simplejwt': it only adds translations of its error messages, and
+    # its models module imports django.test into every process at startup
     'drf_spectacular',
     'users',
     'whatsapp_messages',
@@ -70,8 +73,13 @@ SIMPLE_JWT = {
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # Requests authenticate from the token's claims instead of loading the User row
+    'TOKEN_USER_CLASS': 'authentication.tokens.PhoneTokenUser',
 }
 
+# Lifetime of PhoneTokenUser.user lookups in the per-process user cache
+AUTH_USER_CACHE_TTL_SECONDS = config('AUTH_USER_CACHE_TTL_SECONDS', default=30, cast=float)
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'WhatsApp Analytics API',
     'DESCRIPTION': 'API for analyzing WhatsApp group chat data',
@@ -86,13 +94,20 @@ SPECTACULAR_SETTINGS = {
     'TAGS': [
         {'name': 'auth', 'description': 'Authentication endpoints'},
         {'name': 'analytics', 'description': 'Analytics and statistics endpoints'},
+        {'name': 'messages', 'description': 'Message history'},
     ],
     'SECURITY': [{'Bearer': []}],
+    # Operation ids and tags are derived from the full path (api_analytics_...), not from its common prefix
+    'SCHEMA_PATH_PREFIX': '/',
 }
 
+# Precomputed schema served at /api/schema/; regenerate with ``manage.py spectacular --file schema.yaml``.
+# When the file is missing the schema is generated on each request instead.
+OPENAPI_SCHEMA_PATH = config('OPENAPI_SCHEMA_PATH', default=str(BASE_DIR / 'schema.yaml'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -104,6 +119,7 @@ REST_FRAMEWORK = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whatsapp_analytics.middleware.QueryTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -143,6 +159,27 @@ DATABASES = {
     }
 }
 
+# Optional read replica for analytics reads. Locally this is a SQLite backup copy of the
+# primary refreshed by ``manage.py refresh_replica``; it is opened read-only.
+DATABASE_REPLICA_PATH = config('DATABASE_REPLICA_PATH', default='')
+if DATABASE_REPLICA_PATH:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{DATABASE_REPLICA_PATH}?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['whatsapp_analytics.db_router.ReplicaRouter']
+
+# Closed years moved out of the primary by ``manage.py archive_year``, one read-only
+# SQLite file per year, each opened as the database alias ``messages_<year>``
+MESSAGE_ARCHIVE_DIR = config('MESSAGE_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
+# Reads fall back to the primary when the replica's heartbeat is older than this
+ANALYTICS_REPLICA_MAX_LAG_SECONDS = config('ANALYTICS_REPLICA_MAX_LAG_SECONDS', default=300, cast=float)
+# How long a worker reuses its last replica lag and last import check
+ANALYTICS_REPLICA_STATUS_TTL_SECONDS = config('ANALYTICS_REPLICA_STATUS_TTL_SECONDS', default=5, cast=float)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -176,9 +213,62 @@ USE_TZ = True
 
 TIME_ZONE = 'Africa/Lagos'
 
+# Country assumed for phone numbers written without one, e.g. 0803 123 4567 (ISO 3166 code)
+PHONE_NUMBER_REGION = config('PHONE_NUMBER_REGION', default='NG')
+
 STYTCH_PROJECT_ID = config('STYTCH_PROJECT_ID')
 STYTCH_SECRET = config('STYTCH_SECRET')
 STYTCH_ENV = config('STYTCH_ENV')
+# Overrides the API base derived from STYTCH_ENV, e.g. to point at a local stub server
+STYTCH_API_URL = config('STYTCH_API_URL', default='')
+STYTCH_TIMEOUT_SECONDS = config('STYTCH_TIMEOUT_SECONDS', default=5, cast=float)
+STYTCH_CONNECT_TIMEOUT_SECONDS = config('STYTCH_CONNECT_TIMEOUT_SECONDS', default=2, cast=float)
+# Pooled connections, calls in flight, and how long a call may wait for a free slot (per process)
+STYTCH_MAX_CONNECTIONS = config('STYTCH_MAX_CONNECTIONS', default=20, cast=int)
+STYTCH_MAX_CONCURRENCY = config('STYTCH_MAX_CONCURRENCY', default=50, cast=int)
+STYTCH_QUEUE_TIMEOUT_SECONDS = config('STYTCH_QUEUE_TIMEOUT_SECONDS', default=1, cast=float)
+
+# Silence (in minutes) after which the next message starts a new conversation session
+ANALYTICS_SESSION_GAP_MINUTES = config('ANALYTICS_SESSION_GAP_MINUTES', default=30, cast=int)
+
+# A message counts as a reply to the previous sender when it follows within this many minutes
+ANALYTICS_REPLY_WINDOW_MINUTES = config('ANALYTICS_REPLY_WINDOW_MINUTES', default=10, cast=int)
+# Half-life of reply weights in the interaction graph
+ANALYTICS_INTERACTION_HALF_LIFE_DAYS = config('ANALYTICS_INTERACTION_HALF_LIFE_DAYS', default=30, cast=float)
+
+# Most users one batch metrics request may ask for; admin recomputes run in batches of this size
+ANALYTICS_MAX_BATCH_USERS = config('ANALYTICS_MAX_BATCH_USERS', default=200, cast=int)
+
+# Threads per process running an analytics action's independent queries concurrently; below 2 runs them serially
+ANALYTICS_QUERY_WORKERS = config('ANALYTICS_QUERY_WORKERS', default=4, cast=int)
+
+# Queries slower than this many milliseconds are logged with their SQL
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+
+# Where staff ``?profile=...&profile_save=1`` requests write raw cProfile stats
+ANALYTICS_PROFILE_DIR = config('ANALYTICS_PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+
+# Per-process metric files merged by /metrics; must be shared by all workers of one deployment
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'whatsapp_analytics_metrics'))
+# When set, /metrics requires ``Authorization: Bearer <METRICS_TOKEN>``
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Slow queries log at WARNING; set INFO to also get one JSON line per request
+        'whatsapp_analytics': {
+            'handlers': ['console'],
+            'level': config('REQUEST_LOG_LEVEL', default='WARNING'),
+        },
+    },
+}
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
@@ -16,26 +16,28 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-    SpectacularRedocView,
-)
 from rest_framework.routers import DefaultRouter
 from analytics.views import AnalyticsViewSet
 from authentication.views import RequestOTPView, VerifyOTPView
+from whatsapp_messages.views import MessageViewSet
+from .docs import lazy_view, schema_view
+from .metrics import metrics_view
 
 router = DefaultRouter()
 router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+router.register(r'messages', MessageViewSet, basename='messages')
+
+swagger_view = lazy_view('drf_spectacular.views.SpectacularSwaggerView', url_name='schema')
 
 urlpatterns = [
-    path('', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'), 
+    path('', swagger_view, name='swagger-ui'),
     path('admin/', admin.site.urls),
     path('api/auth/request-otp/', RequestOTPView.as_view(), name='request-otp'),
     path('api/auth/verify-otp/', VerifyOTPView.as_view(), name='verify-otp'),
     path('api/', include(router.urls)),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui-alt'),
-    path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    path('api/schema/', schema_view, name='schema'),
+    path('api/docs/', swagger_view, name='swagger-ui-alt'),
+    path('api/redoc/', lazy_view('drf_spectacular.views.SpectacularRedocView', url_name='schema'), name='redoc'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
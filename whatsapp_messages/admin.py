@@ -1,3 +1,44 @@
 from django.contrib import admin
+from django.utils.text import Truncator
+from analytics.rollups import DailyRollupService
+from whatsapp_analytics.paginators import EstimatedCountPaginator
+from .models import Message
 
-# Register your models here.
+
+@admin.register(Message)
+class MessageAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'sender', 'message_type', 'preview')
+    # One join for the sender column instead of a query per row
+    list_select_related = ('sender',)
+    list_filter = ('message_type',)
+    raw_id_fields = ('sender',)
+    # local_date is indexed and needs no time zone conversion per row, unlike timestamp
+    date_hierarchy = 'local_date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ('content_length', 'local_date', 'local_hour', 'weekday', 'is_media')
+
+    def save_model(self, request, obj, form, change):
+        # local_date still holds the stored day here; save() derives the new one
+        days = {obj.local_date}
+        super().save_model(request, obj, form, change)
+        days.add(obj.local_date)
+        self._refresh_days(days)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self._refresh_days({obj.local_date})
+
+    def delete_queryset(self, request, queryset):
+        days = set(queryset.values_list('local_date', flat=True))
+        super().delete_queryset(request, queryset)
+        self._refresh_days(days)
+
+    @staticmethod
+    def _refresh_days(days):
+        """Recompute the daily rollups an edit moved messages into or out of."""
+        DailyRollupService().refresh_days(day for day in days if day is not None)
+
+    @admin.display(description='Content')
+    def preview(self, message):
+        return Truncator(message.content).chars(80)
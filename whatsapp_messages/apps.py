@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class WhatsappMessagesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'whatsapp_messages'
+
+    def ready(self):
+        from .partitions import register_archives
+
+        register_archives()
@@ -0,0 +1,70 @@
+"""Time-ordered message ids.
+
+``message_id(timestamp)`` is a UUIDv7 (RFC 9562): the Unix time of the
+message in milliseconds, then random bits. Ids of later messages sort
+after earlier ones, as UUIDs and as the hex strings SQLite stores, so a
+chronological import appends to the right edge of the primary key
+B-tree instead of splitting pages all over it as random ``uuid4`` ids do.
+
+Exported chats carry minute timestamps, so many messages share one
+millisecond. Those are told apart by a counter in the 12 ``rand_a`` bits
+(RFC 9562, method 1): it starts at a random value for each new
+millisecond and counts up, so ids made in order stay strictly in order
+and messages sharing a timestamp sort by id in the order they arrived.
+More than the counter can hold in one millisecond carries into the
+timestamp field, so such an id may read a few milliseconds late.
+"""
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Tuple
+from django.utils import timezone
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+_MAX_MILLIS = (1 << 48) - 1
+_COUNTER_BITS = 12
+_MAX_COUNTER = (1 << _COUNTER_BITS) - 1
+
+# The millisecond asked for last, the millisecond that id carries and its counter
+_last = [-1, -1, 0]
+_lock = threading.Lock()
+
+
+def _next(millis: int, random_bits: int) -> Tuple[int, int]:
+    """The millisecond and counter of the id after the last one, for a message sent at ``millis``."""
+    with _lock:
+        requested, stamped, counter = _last
+        if requested <= millis <= stamped:
+            if counter < _MAX_COUNTER:
+                counter += 1
+            else:
+                # Carry into the timestamp instead of wrapping, so ids keep increasing
+                stamped, counter = stamped + 1, 0
+        else:
+            # Start in the lower half, leaving room to count up
+            stamped, counter = millis, random_bits >> (80 - _COUNTER_BITS + 1)
+        _last[:] = millis, stamped, counter
+        return min(stamped, _MAX_MILLIS), counter
+
+
+def message_id(timestamp: datetime) -> uuid.UUID:
+    if timezone.is_naive(timestamp):
+        # Read the way Django stores a naive value: in the default time zone
+        timestamp = timezone.make_aware(timestamp, timezone.get_default_timezone())
+    millis = min(max((timestamp - _EPOCH) // _MILLISECOND, 0), _MAX_MILLIS)
+    random_bits = int.from_bytes(os.urandom(10), 'big')
+    millis, counter = _next(millis, random_bits)
+    return uuid.UUID(int=(
+        millis << 80
+        | 0x7 << 76                             # version
+        | counter << 64                         # rand_a, 12 bits
+        | 0b10 << 62                            # variant
+        | random_bits & ((1 << 62) - 1)         # rand_b, 62 bits
+    ))
+
+
+def id_timestamp(message_id: uuid.UUID) -> datetime:
+    """The millisecond a version 7 ``message_id`` carries: its message's, or just after it following a carry."""
+    return datetime.fromtimestamp((message_id.int >> 80) / 1000, tz=dt_timezone.utc)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from whatsapp_messages.partitions import ArchivedYearError, archive_path, archive_year
+
+class Command(BaseCommand):
+    help = (
+        'Move the messages of a closed year out of the primary database into a compact, '
+        'read-only SQLite file in MESSAGE_ARCHIVE_DIR. Rollups, sessions and interactions '
+        'derived from them stay in the primary.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help='Year to archive, e.g. 2023')
+
+    def handle(self, *args, **options):
+        year = options['year']
+        try:
+            archived = archive_year(year)
+        except ArchivedYearError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} messages from {year} to {archive_path(year)}. '
+            'Restart running workers so they open it.'
+        ))
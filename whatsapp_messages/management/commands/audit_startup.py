@@ -0,0 +1,36 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from core.benchmarks.startup import SCENARIOS, StartupAudit
+
+class Command(BaseCommand):
+    help = (
+        'Measure the imports of a fresh import_chat run and worker boot with python -X importtime, '
+        'list the most expensive modules and fail when a scenario is over its budget.'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                            help='Scenario to measure; repeat for several (default: all)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs per scenario; the fastest is reported')
+        parser.add_argument('--top', type=int, default=15, help='Top-level imports to list')
+        parser.add_argument('--output', type=str, default=None,
+                            help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        results = StartupAudit(
+            scenarios=options['scenario'],
+            repeat=options['repeat'],
+            top=options['top'],
+            log=self.stdout.write
+        ).run()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
+
+        over = [name for name, result in results.items() if not result['within_budget']]
+        if over:
+            raise CommandError(f"Over budget: {', '.join(over)}")
@@ -0,0 +1,31 @@
+import json
+from django.core.management.base import BaseCommand
+from core.benchmarks.message_ids import MessageIdBenchmark
+
+class Command(BaseCommand):
+    help = (
+        'Compare random uuid4 and time-ordered message ids: bulk insert throughput and primary key '
+        'index size of a chronological import into scratch SQLite files.'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1_000_000, help='Messages to insert per scheme')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Messages per transaction')
+        parser.add_argument('--work-dir', type=str, default=None,
+                            help='Where to create the scratch databases (default: system temp)')
+        parser.add_argument('--output', type=str, default=None,
+                            help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        results = MessageIdBenchmark(
+            size=options['size'],
+            batch_size=options['batch_size'],
+            work_dir=options['work_dir'],
+            log=self.stdout.write
+        ).run()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from core.generators.chat_generator import SyntheticChatGenerator
+
+class Command(BaseCommand):
+    help = 'Write a deterministic synthetic WhatsApp chat export'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str, help='Where to write the chat file')
+        parser.add_argument('--messages', type=int, default=10000, help='Number of messages')
+        parser.add_argument('--users', type=int, default=50, help='Number of distinct senders')
+        parser.add_argument('--media-ratio', type=float, default=0.1,
+                            help='Fraction of messages that are media')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of sender activity (0 is uniform)')
+        parser.add_argument('--per-day', type=int, default=300,
+                            help='Average number of messages per day')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        generator = SyntheticChatGenerator(
+            options['messages'],
+            user_count=options['users'],
+            media_ratio=options['media_ratio'],
+            skew=options['skew'],
+            messages_per_day=options['per_day'],
+            seed=options['seed']
+        )
+        written = generator.write_file(options['file_path'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} messages from {options['users']} users to {options['file_path']}"
+        ))
@@ -0,0 +1,54 @@
+import json
+import tempfile
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from core.benchmarks.pipeline import DEFAULT_SIZES, PipelineBenchmark
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark parsing, import and the analytics endpoints on synthetic chats. '
+        'Runs against the test database, never the configured one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default=','.join(map(str, DEFAULT_SIZES)),
+                            help='Comma separated message counts')
+        parser.add_argument('--users', type=int, default=200, help='Number of distinct senders')
+        parser.add_argument('--media-ratio', type=float, default=0.1,
+                            help='Fraction of messages that are media')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of sender activity (0 is uniform)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument('--repeat', type=int, default=3, help='Requests per endpoint')
+        parser.add_argument('--output', type=str, default='benchmark_results.json',
+                            help='Where to write the JSON results')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with tempfile.TemporaryDirectory() as work_dir:
+                results = PipelineBenchmark(
+                    work_dir,
+                    sizes=sizes,
+                    user_count=options['users'],
+                    media_ratio=options['media_ratio'],
+                    skew=options['skew'],
+                    seed=options['seed'],
+                    repeat=options['repeat'],
+                    log=self.stdout.write
+                ).run()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Length
+from django.utils import timezone
+
+
+def backfill_derived_columns(apps, schema_editor):
+    Message = apps.get_model('whatsapp_messages', 'Message')
+    db_alias = schema_editor.connection.alias
+    messages = Message.objects.using(db_alias)
+
+    messages.update(content_length=Length('content'))
+    messages.exclude(message_type='TEXT').update(is_media=True)
+
+    batch = []
+    for message in messages.only('id', 'timestamp').iterator(chunk_size=2000):
+        local_time = timezone.localtime(message.timestamp)
+        message.local_date = local_time.date()
+        message.local_hour = local_time.hour
+        message.weekday = local_time.isoweekday() % 7 + 1
+        batch.append(message)
+        if len(batch) >= 2000:
+            Message.objects.using(db_alias).bulk_update(batch, ['local_date', 'local_hour', 'weekday'])
+            batch = []
+    if batch:
+        Message.objects.using(db_alias).bulk_update(batch, ['local_date', 'local_hour', 'weekday'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='content_length',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='is_media',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='local_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='local_hour',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='weekday',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunPython(backfill_derived_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'local_date'], name='whatsapp_me_sender__de7184_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['local_date', 'sender'], name='whatsapp_me_local_d_ac4788_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['local_date', 'local_hour'], name='whatsapp_me_local_d_43d247_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['local_date', 'weekday'], name='whatsapp_me_local_d_1666e5_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0002_message_derived_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='whatsapp_me_message_263bdd_idx',
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['message_type', 'timestamp'], name='whatsapp_me_message_002631_idx'),
+        ),
+    ]
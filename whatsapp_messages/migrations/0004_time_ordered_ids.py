@@ -0,0 +1,114 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:23
+
+import os
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import migrations, models
+
+# analytics.graph.CURSOR_NAME; its state lists the ids of the messages at its position
+INTERACTION_CURSOR = 'interaction_graph'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MAX_MILLIS = (1 << 48) - 1
+MAX_COUNTER = (1 << 12) - 1
+
+
+class MessageIds:
+    """Frozen copy of ``whatsapp_messages.ids.message_id`` as it was when this migration was written.
+
+    UUIDv7 ids for timestamps given in ascending order: the millisecond,
+    then a 12-bit counter that starts at a random value in its lower half
+    for each new millisecond and counts up, carrying into the millisecond
+    when it is full.
+    """
+
+    def __init__(self):
+        self.requested = self.stamped = -1
+        self.counter = 0
+
+    def __call__(self, timestamp: datetime) -> uuid.UUID:
+        millis = min(max((timestamp - EPOCH) // timedelta(milliseconds=1), 0), MAX_MILLIS)
+        random_bits = int.from_bytes(os.urandom(10), 'big')
+        if self.requested <= millis <= self.stamped:
+            if self.counter < MAX_COUNTER:
+                self.counter += 1
+            else:
+                self.stamped, self.counter = self.stamped + 1, 0
+        else:
+            self.stamped, self.counter = millis, random_bits >> 69
+        self.requested = millis
+        return uuid.UUID(int=(
+            min(self.stamped, MAX_MILLIS) << 80
+            | 0x7 << 76
+            | self.counter << 64
+            | 0b10 << 62
+            | random_bits & ((1 << 62) - 1)
+        ))
+
+
+def rekey_messages(apps, schema_editor):
+    """Replace the random uuid4 ids of existing messages with ids made from their timestamps.
+
+    No foreign key points at a message, but the interaction graph cursor
+    keeps the ids of the messages it has read at its position; those are
+    rewritten too, or the next update would count their replies again.
+    Rows already keyed by a version 7 id are left alone, so an interrupted
+    run can be repeated. Archived years keep their ids; their files are
+    never written again.
+    """
+    Message = apps.get_model('whatsapp_messages', 'Message')
+    AnalyticsCursor = apps.get_model('analytics', 'AnalyticsCursor')
+    connection = schema_editor.connection
+    db_alias = connection.alias
+    id_field = Message._meta.pk
+    update = (
+        f'UPDATE {connection.ops.quote_name(Message._meta.db_table)} '
+        f'SET {connection.ops.quote_name(id_field.column)} = %s '
+        f'WHERE {connection.ops.quote_name(id_field.column)} = %s'
+    )
+
+    def prepare(value):
+        return id_field.get_db_prep_value(value, connection)
+
+    message_id = MessageIds()
+    graph_cursor = AnalyticsCursor.objects.using(db_alias).filter(name=INTERACTION_CURSOR).first()
+    seen_ids = set(graph_cursor.state.get('ids_at_position', [])) if graph_cursor else set()
+    renamed = {}
+
+    batch = []
+    with connection.cursor() as cursor:
+        rows = Message.objects.using(db_alias).order_by('timestamp').values_list('id', 'timestamp')
+        for old_id, timestamp in rows.iterator(chunk_size=2000):
+            if old_id.version == 7:
+                continue
+            new_id = message_id(timestamp)
+            if str(old_id) in seen_ids:
+                renamed[str(old_id)] = str(new_id)
+            batch.append((prepare(new_id), prepare(old_id)))
+            if len(batch) >= 2000:
+                cursor.executemany(update, batch)
+                batch = []
+        if batch:
+            cursor.executemany(update, batch)
+
+    if renamed:
+        graph_cursor.state['ids_at_position'] = sorted(renamed.get(seen, seen) for seen in seen_ids)
+        graph_cursor.save(update_fields=['state'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0003_message_type_timestamp_index'),
+        ('analytics', '0006_analyticscursor_interaction'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_messages, migrations.RunPython.noop),
+        # On SQLite this rebuilds the table, which also lays the rewritten primary key index out afresh
+        migrations.AlterField(
+            model_name='message',
+            name='id',
+            field=models.UUIDField(editable=False, primary_key=True, serialize=False),
+        ),
+    ]
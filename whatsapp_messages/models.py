@@ -1,6 +1,30 @@
-import uuid
 from django.db import models
+from django.utils import timezone
 from users.models import User
+from .ids import message_id
+
+
+def derived_message_fields(timestamp, content: str, message_type: str) -> dict:
+    """Per-row values the analytics queries filter and group on, in the local timezone."""
+    local_time = timezone.localtime(timestamp)
+    return {
+        'content_length': len(content),
+        'local_date': local_time.date(),
+        'local_hour': local_time.hour,
+        # Same numbering as ExtractWeekDay: 1 = Sunday ... 7 = Saturday
+        'weekday': local_time.isoweekday() % 7 + 1,
+        'is_media': message_type != 'TEXT',
+    }
+
+
+class MessageQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for message in objs:
+            if message.id is None:
+                message.id = message_id(message.timestamp)
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class Message(models.Model):
     MESSAGE_TYPES = (
@@ -11,7 +35,8 @@ class Message(models.Model):
         ('DOCUMENT', 'Document')
     )
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    # Set from the timestamp on save (see ids.py), so ids sort in time order
+    id = models.UUIDField(primary_key=True, editable=False)
     sender = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -24,14 +49,37 @@ class Message(models.Model):
         choices=MESSAGE_TYPES,
         default='TEXT'
     )
+    content_length = models.IntegerField(default=0)
+    local_date = models.DateField(null=True)
+    local_hour = models.PositiveSmallIntegerField(null=True)
+    weekday = models.PositiveSmallIntegerField(null=True)
+    is_media = models.BooleanField(default=False)
+
+    objects = MessageQuerySet.as_manager()
     
     class Meta:
         indexes = [
             models.Index(fields=['timestamp']),
             models.Index(fields=['sender', 'timestamp']),
-            models.Index(fields=['message_type'])
+            models.Index(fields=['message_type', 'timestamp']),
+            models.Index(fields=['sender', 'local_date']),
+            models.Index(fields=['local_date', 'sender']),
+            models.Index(fields=['local_date', 'local_hour']),
+            models.Index(fields=['local_date', 'weekday'])
         ]
         ordering = ['-timestamp']
     
     def __str__(self):
-        return f"{self.sender.phone_number} - {self.timestamp}"
\ No newline at end of file
+        return f"{self.sender.phone_number} - {self.timestamp}"
+
+    def save(self, *args, **kwargs):
+        # Re-derived on every save: an edited timestamp, content or type changes them
+        derived = derived_message_fields(self.timestamp, self.content, self.message_type)
+        for field, value in derived.items():
+            setattr(self, field, value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'timestamp', 'content', 'message_type'}.intersection(update_fields):
+            kwargs['update_fields'] = set(update_fields) | set(derived)
+        if self.id is None:
+            self.id = message_id(self.timestamp)
+        super().save(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""Keyset pagination of messages, newest first.
+
+A page is found by seeking to the (timestamp, id) of the row it starts
+after, never by counting rows to skip, so the thousandth page costs the
+same index range scan as the first and no request runs ``COUNT(*)``.
+``id`` breaks ties between messages sent in the same second. Pages are
+read from every partition overlapping the requested dates and merged.
+"""
+import heapq
+import itertools
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import List, NamedTuple, Optional
+from urllib import parse
+from uuid import UUID
+from django.db.models import QuerySet
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from . import partitions
+
+
+class Cursor(NamedTuple):
+    timestamp: datetime
+    id: UUID
+    # Walking towards newer messages (a "previous" link)
+    reverse: bool = False
+
+
+def position(message) -> tuple:
+    return message.timestamp, message.id
+
+
+class KeysetPagination(BasePagination):
+    """Opaque ``cursor`` links over messages ordered by ``(-timestamp, -id)``."""
+
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None,
+                          first_day: Optional[date] = None, last_day: Optional[date] = None) -> List:
+        """One page of ``queryset``; ``first_day``/``last_day`` bound the partitions it is read from."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        if self.cursor is not None:
+            timestamp, message_id = self.cursor.timestamp, self.cursor.id
+            day = timezone.localdate(timestamp)
+            # timestamp <= t AND NOT (timestamp = t AND id >= x) keeps the range on the timestamp index
+            if reverse:
+                queryset = queryset.filter(timestamp__gte=timestamp).exclude(
+                    timestamp=timestamp, id__lte=message_id
+                )
+                first_day = max(first_day, day) if first_day else day
+            else:
+                queryset = queryset.filter(timestamp__lte=timestamp).exclude(
+                    timestamp=timestamp, id__gte=message_id
+                )
+                last_day = min(last_day, day) if last_day else day
+        queryset = queryset.order_by(*(('timestamp', 'id') if reverse else ('-timestamp', '-id')))
+
+        fetch = self.page_size + 1
+        rows = list(itertools.islice(heapq.merge(
+            *[list(partition[:fetch]) for partition in partitions.querysets(queryset, first_day, last_day)],
+            key=position, reverse=not reverse
+        ), fetch))
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_cursor = self.previous_cursor = None
+        if rows:
+            first, last = position(rows[0]), position(rows[-1])
+            if reverse:
+                # A page reached going back always has older messages after it
+                self.next_cursor = Cursor(*last)
+                self.previous_cursor = Cursor(*first, reverse=True) if has_more else None
+            else:
+                self.next_cursor = Cursor(*last) if has_more else None
+                self.previous_cursor = Cursor(*first, reverse=True) if self.cursor is not None else None
+        return rows
+
+    def get_page_size(self, request) -> int:
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(requested, 1), self.max_page_size)
+
+    def decode_cursor(self, request) -> Optional[Cursor]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'), keep_blank_values=True)
+            timestamp = datetime.fromisoformat(tokens['t'][0])
+            if timestamp.tzinfo is None:
+                raise ValueError('naive cursor timestamp')
+            return Cursor(timestamp, UUID(tokens['i'][0]), tokens.get('r', ['0'])[0] == '1')
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor: Cursor) -> str:
+        tokens = OrderedDict(t=cursor.timestamp.isoformat(), i=cursor.id.hex)
+        if cursor.reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self) -> Optional[str]:
+        return self.encode_cursor(self.next_cursor) if self.next_cursor else None
+
+    def get_previous_link(self) -> Optional[str]:
+        return self.encode_cursor(self.previous_cursor) if self.previous_cursor else None
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view) -> List[dict]:
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque position from a next or previous link',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Messages per page (1-{self.max_page_size}, default {self.page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
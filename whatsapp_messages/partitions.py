@@ -0,0 +1,268 @@
+"""Per-year message partitions.
+
+Messages of open years live in the ``Message`` table of the primary
+database, the hot partition. ``manage.py archive_year`` moves a closed
+year into ``MESSAGE_ARCHIVE_DIR/messages_<year>.sqlite3``: a compact,
+indexed copy of its rows that is never written again and is opened
+read-only as the database alias ``messages_<year>``. Archiving a year
+keeps every rollup, session and edge derived from it in the primary.
+
+Readers pass a ``Message`` queryset and the local date range they need
+to ``querysets``, ``collect`` or ``stream``, which run it against the
+archives of the overlapping years and against the hot partition (unless
+every year in the range is archived). The hot partition keeps the
+normal routing, so reads from it still go to the replica when one is
+fresh enough.
+"""
+import heapq
+import itertools
+import os
+import re
+import sqlite3
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import QuerySet
+from django.utils import timezone
+
+ALIAS_PREFIX = 'messages_'
+ALIAS_PATTERN = re.compile(rf'^{ALIAS_PREFIX}(\d{{4}})$')
+TABLE = 'whatsapp_messages_message'
+
+
+class ArchivedYearError(ValueError):
+    """Messages were written to, or an archive requested for, a year that cannot take them."""
+
+
+def archive_alias(year: int) -> str:
+    return f'{ALIAS_PREFIX}{year}'
+
+
+def archive_path(year: int) -> Path:
+    return Path(settings.MESSAGE_ARCHIVE_DIR) / f'{archive_alias(year)}.sqlite3'
+
+
+def archive_database(path) -> dict:
+    """Connection settings of an archive file."""
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # Archives never change, so SQLite can skip locking and change detection
+        'NAME': f'file:{path}?mode=ro&immutable=1',
+        'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+    }
+
+
+def archived_years() -> List[int]:
+    return sorted(
+        int(match.group(1))
+        for match in map(ALIAS_PATTERN.match, connections.settings)
+        if match
+    )
+
+
+def year_bounds(year: int) -> tuple:
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def _aliases(first_day: Optional[date], last_day: Optional[date]) -> List[Optional[str]]:
+    """Archive aliases overlapping the range, oldest first, then ``None`` for the hot partition."""
+    archived = archived_years()
+    first_year = first_day.year if first_day else None
+    last_year = last_day.year if last_day else None
+    aliases: List[Optional[str]] = [
+        archive_alias(year) for year in archived
+        if (first_year is None or year >= first_year) and (last_year is None or year <= last_year)
+    ]
+    covered = first_year is not None and last_year is not None and all(
+        year in archived for year in range(first_year, last_year + 1)
+    )
+    if not covered:
+        aliases.append(None)
+    return aliases
+
+
+def querysets(queryset: QuerySet, first_day: Optional[date] = None,
+              last_day: Optional[date] = None) -> List[QuerySet]:
+    """``queryset`` once per partition overlapping ``first_day``..``last_day`` (open-ended if omitted)."""
+    return [
+        queryset if alias is None else queryset.using(alias)
+        for alias in _aliases(first_day, last_day)
+    ]
+
+
+def collect(queryset: QuerySet, first_day: Optional[date] = None,
+            last_day: Optional[date] = None) -> list:
+    """Every row of ``queryset`` from the overlapping partitions, partition by partition."""
+    return [row for partition in querysets(queryset, first_day, last_day) for row in partition]
+
+
+def stream(queryset: QuerySet, first_day: Optional[date] = None, last_day: Optional[date] = None,
+           key: Optional[Callable] = None, chunk_size: int = 2000) -> Iterator:
+    """Iterate ``queryset`` across partitions without loading it.
+
+    With ``key``, rows are merged into one sequence sorted by it (each
+    partition must already be ordered by the same key); otherwise the
+    partitions follow each other.
+    """
+    iterators = [
+        partition.iterator(chunk_size=chunk_size)
+        for partition in querysets(queryset, first_day, last_day)
+    ]
+    if len(iterators) == 1:
+        return iterators[0]
+    if key is None:
+        return itertools.chain.from_iterable(iterators)
+    return heapq.merge(*iterators, key=key)
+
+
+def aggregate(queryset: QuerySet, first_day: Optional[date] = None,
+              last_day: Optional[date] = None, **aggregates) -> dict:
+    """``queryset.aggregate`` summed over partitions; only for additive aggregates (Count, Sum)."""
+    return merge_counts(
+        [partition.aggregate(**aggregates) for partition in querysets(queryset, first_day, last_day)],
+        keys=()
+    )[0]
+
+
+def merge_counts(rows: Iterable[dict], keys: Sequence[str]) -> List[dict]:
+    """Combine grouped rows from several partitions by summing every field not in ``keys``.
+
+    ``None`` (an empty SUM) only survives when every partition had it.
+    """
+    merged: Dict[tuple, dict] = {}
+    for row in rows:
+        group = tuple(row[field] for field in keys)
+        current = merged.get(group)
+        if current is None:
+            merged[group] = dict(row)
+            continue
+        for field, value in row.items():
+            if field in keys or value is None:
+                continue
+            current[field] = value if current[field] is None else current[field] + value
+    return list(merged.values())
+
+
+def check_writable(days: Iterable[date]) -> None:
+    """Refuse messages dated in an archived year; archives are never written again."""
+    archived = set(archived_years())
+    blocked = sorted({day.year for day in days if day.year in archived})
+    if blocked:
+        raise ArchivedYearError(
+            f"{', '.join(map(str, blocked))} {'is' if len(blocked) == 1 else 'are'} archived; "
+            'messages for archived years cannot be imported'
+        )
+
+
+def register_archives() -> List[int]:
+    """Register every archive file in ``MESSAGE_ARCHIVE_DIR``; runs when the app loads."""
+    years = []
+    for path in sorted(Path(settings.MESSAGE_ARCHIVE_DIR).glob(f'{ALIAS_PREFIX}*.sqlite3')):
+        match = ALIAS_PATTERN.match(path.stem)
+        if match:
+            years.append(int(match.group(1)))
+            register_archive(years[-1])
+    return years
+
+
+def register_archive(year: int) -> str:
+    """Open ``messages_<year>`` as a database alias, e.g. right after archiving it."""
+    alias = archive_alias(year)
+    if alias not in connections.settings:
+        # configure_settings fills in Django's defaults but insists on seeing 'default'
+        configured = connections.configure_settings(
+            {**connections.settings, alias: archive_database(archive_path(year))}
+        )
+        connections.settings[alias] = configured[alias]
+    return alias
+
+
+def unregister_archive(year: int) -> None:
+    alias = archive_alias(year)
+    if alias in connections.settings:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+def archive_year(year: int) -> int:
+    """Move the messages of a closed year into their own read-only SQLite file.
+
+    The copy keeps the table's columns and indexes but no foreign key, as
+    users stay in the primary. Rows are written in timestamp order and
+    the file is vacuumed, so it is as small as SQLite can make it. The
+    hot rows are only deleted once the file is in place and holds the
+    same number of rows; running it again after an interruption finishes
+    the move. Returns the number of rows archived.
+    """
+    from .models import Message
+
+    if year >= timezone.localdate().year:
+        raise ArchivedYearError(f'{year} is not over yet; only closed years can be archived')
+
+    first_day, last_day = year_bounds(year)
+    hot = Message.objects.using(DEFAULT_DB_ALIAS).filter(local_date__range=(first_day, last_day))
+    path = archive_path(year)
+
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_archive(path, first_day, last_day)
+
+    archived = _count_rows(path)
+    remaining = hot.count()
+    if remaining and remaining != archived:
+        raise ArchivedYearError(
+            f'{path} holds {archived} messages but the primary has {remaining} for {year}; '
+            'remove the file and archive again'
+        )
+
+    register_archive(year)
+    hot.delete()
+    return archived
+
+
+def _write_archive(path: Path, first_day: date, last_day: date) -> None:
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != 'sqlite':
+        raise ArchivedYearError('Archiving needs the primary database to be SQLite')
+    if connection.in_atomic_block:
+        # SQLite cannot ATTACH inside a transaction
+        raise ArchivedYearError('archive_year cannot run inside a transaction')
+
+    temporary = path.with_suffix('.tmp')
+    temporary.unlink(missing_ok=True)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, sql FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL",
+            [TABLE]
+        )
+        schema = cursor.fetchall()
+        cursor.execute('ATTACH DATABASE %s AS archive', [str(temporary)])
+        try:
+            table_sql = next(sql for kind, sql in schema if kind == 'table')
+            cursor.execute(_archive_table_sql(table_sql))
+            cursor.execute(
+                f'INSERT INTO archive."{TABLE}" SELECT * FROM main."{TABLE}" '
+                'WHERE local_date BETWEEN %s AND %s ORDER BY timestamp, id',
+                [first_day.isoformat(), last_day.isoformat()]
+            )
+            for kind, sql in schema:
+                if kind == 'index':
+                    cursor.execute(re.sub(r'^CREATE (UNIQUE )?INDEX "', r'CREATE \1INDEX archive."', sql))
+            cursor.execute('ANALYZE archive')
+            cursor.execute('VACUUM archive')
+        finally:
+            cursor.execute('DETACH DATABASE archive')
+    os.replace(temporary, path)
+
+
+def _archive_table_sql(table_sql: str) -> str:
+    table_sql = table_sql.replace(f'CREATE TABLE "{TABLE}"', f'CREATE TABLE archive."{TABLE}"', 1)
+    return re.sub(r' REFERENCES "\w+" \("\w+"\)( DEFERRABLE INITIALLY DEFERRED)?', '', table_sql)
+
+
+def _count_rows(path: Path) -> int:
+    with sqlite3.connect(f'file:{path}?mode=ro', uri=True) as archive:
+        return archive.execute(f'SELECT COUNT(*) FROM "{TABLE}"').fetchone()[0]
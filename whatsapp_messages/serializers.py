@@ -0,0 +1,35 @@
+from rest_framework import serializers
+from users.phone_numbers import InvalidPhoneNumber, normalize_phone_number
+from .models import Message
+
+class MessageSerializer(serializers.ModelSerializer):
+    # The phone number is the user's key, so no join is needed to show it
+    sender = serializers.CharField(source='sender_id')
+
+    class Meta:
+        model = Message
+        fields = [
+            'id',
+            'sender',
+            'timestamp',
+            'message_type',
+            'content'
+        ]
+
+class MessageFilterSerializer(serializers.Serializer):
+    sender = serializers.CharField(max_length=17, required=False, help_text='Sender phone number')
+    type = serializers.ChoiceField(choices=Message.MESSAGE_TYPES, required=False, help_text='Message type')
+    start_date = serializers.DateField(required=False, help_text='First local date (YYYY-MM-DD)')
+    end_date = serializers.DateField(required=False, help_text='Last local date (YYYY-MM-DD)')
+
+    def validate_sender(self, value):
+        # Senders are stored in E.164, however the number is written here
+        try:
+            return normalize_phone_number(value)
+        except InvalidPhoneNumber:
+            raise serializers.ValidationError("Invalid phone number format")
+
+    def validate(self, data):
+        if 'start_date' in data and 'end_date' in data and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError('start_date must not be after end_date')
+        return data
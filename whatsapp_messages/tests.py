@@ -1,3 +1,544 @@
-from django.test import TestCase
+import importlib
+import os
+import sqlite3
+import tempfile
+import unittest
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import quote
+from django.apps import apps
+from django.db import OperationalError, connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from analytics.graph import InteractionGraphService
+from analytics.models import ConversationSession, GroupStatistics, Interaction
+from analytics.rollups import DailyRollupService
+from analytics.services import AnalyticsService
+from analytics.sessions import SessionService
+from core.benchmarks.message_ids import MessageIdBenchmark
+from core.benchmarks.pipeline import DEFAULT_SIZES, MAX_SPAN_DAYS, PipelineBenchmark
+from core.benchmarks.startup import StartupAudit, parse_importtime
+from core.generators.chat_generator import SyntheticChatGenerator
+from core.parsers.whatsapp_parser import ChatImportService, WhatsAppMessageParser
+from users.models import User
+from users.phone_numbers import normalize_phone_number
+from . import partitions
+from .ids import id_timestamp, message_id
+from .models import Message, derived_message_fields
 
-# Create your tests here.
+derived_columns_migration = importlib.import_module('whatsapp_messages.migrations.0002_message_derived_columns')
+time_ordered_ids_migration = importlib.import_module('whatsapp_messages.migrations.0004_time_ordered_ids')
+
+
+class SyntheticChatGeneratorTests(SimpleTestCase):
+    def setUp(self):
+        self.parser = WhatsAppMessageParser()
+
+    def test_every_line_parses(self):
+        generator = SyntheticChatGenerator(2000, user_count=30, media_ratio=0.2, seed=7)
+        parsed = [self.parser.parse_line(line) for line in generator.lines()]
+
+        self.assertNotIn(None, parsed)
+        self.assertLessEqual(
+            {self.parser.senders[m.sender] for m in parsed},
+            {normalize_phone_number(phone_number) for phone_number in generator.phone_numbers()}
+        )
+        timestamps = [m.timestamp for m in parsed]
+        self.assertEqual(timestamps, sorted(timestamps))
+        media = sum(m.message_type != 'TEXT' for m in parsed)
+        self.assertAlmostEqual(media / len(parsed), 0.2, delta=0.05)
+
+    def test_deterministic_for_a_seed(self):
+        first = list(SyntheticChatGenerator(500, seed=3).lines())
+        self.assertEqual(first, list(SyntheticChatGenerator(500, seed=3).lines()))
+        self.assertNotEqual(first, list(SyntheticChatGenerator(500, seed=4).lines()))
+
+    def test_skew_concentrates_activity(self):
+        def top_share(skew):
+            senders = Counter(
+                self.parser.parse_line(line).sender
+                for line in SyntheticChatGenerator(3000, user_count=50, skew=skew).lines()
+            )
+            return senders.most_common(1)[0][1] / 3000
+
+        self.assertLess(top_share(0), 0.1)
+        self.assertGreater(top_share(1.5), 0.3)
+
+    def test_rate_sets_the_span(self):
+        for messages_per_day in (300, 10_000):
+            with self.subTest(messages_per_day=messages_per_day):
+                generator = SyntheticChatGenerator(20_000, messages_per_day=messages_per_day, seed=9)
+                *_, last_line = generator.lines()
+                last = self.parser.parse_line(last_line).timestamp.replace(tzinfo=None)
+                self.assertAlmostEqual((last - generator.start) / generator.span, 1, delta=0.05)
+
+    def test_benchmark_sizes_end_before_two_digit_years_wrap(self):
+        benchmark = PipelineBenchmark(work_dir='')
+        for size in DEFAULT_SIZES:
+            with self.subTest(size=size):
+                generator = benchmark.generator(size)
+                self.assertLess((generator.start + generator.span).year, 2069)
+                self.assertLessEqual(generator.span.days, MAX_SPAN_DAYS)
+        *_, last_line = benchmark.generator(DEFAULT_SIZES[0]).lines()
+        self.assertLess(self.parser.parse_line(last_line).timestamp.year, 2069)
+
+        with self.assertRaises(ValueError):
+            SyntheticChatGenerator(DEFAULT_SIZES[-1], messages_per_day=300)
+
+
+class StartupAuditTests(SimpleTestCase):
+    def test_cold_start_skips_forbidden_modules(self):
+        results = StartupAudit(repeat=1).run()
+
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertEqual(result['forbidden_imported'], [])
+
+    # Wall-clock budgets depend on the machine; also enforced by manage.py audit_startup
+    @unittest.skipUnless(os.environ.get('CHECK_STARTUP_BUDGETS'), 'set CHECK_STARTUP_BUDGETS=1 to check')
+    def test_cold_start_within_budget(self):
+        results = StartupAudit(repeat=2).run()
+
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertLessEqual(
+                    result['total_ms'], result['budget_ms'],
+                    f"{name} imports are over budget; slowest: {result['top'][:5]}"
+                )
+
+    def test_parse_importtime(self):
+        modules = parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   yaml.error\n'
+            'import time:      2000 |       2120 | yaml\n'
+        )
+        self.assertEqual(modules['yaml'], {'self_us': 2000, 'cumulative_us': 2120, 'depth': 0})
+        self.assertEqual(modules['yaml.error']['depth'], 1)
+
+
+class MessageIdTests(TestCase):
+    def test_ids_sort_by_timestamp(self):
+        start = timezone.make_aware(datetime(2024, 3, 1, 9, 30))
+        timestamps = [start + timedelta(milliseconds=step * 7) for step in range(500)]
+        ids = [message_id(timestamp) for timestamp in timestamps]
+
+        self.assertEqual({generated.version for generated in ids}, {7})
+        self.assertEqual({generated.variant for generated in ids}, {uuid.RFC_4122})
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual([generated.hex for generated in ids], sorted(generated.hex for generated in ids))
+        self.assertEqual(id_timestamp(ids[0]), start)
+        # Naive values are read in the default time zone, like Django stores them
+        self.assertEqual(id_timestamp(message_id(datetime(2024, 3, 1, 9, 30))), start)
+
+    def test_new_messages_get_time_ordered_ids(self):
+        sender = User.objects.create(phone_number='+2348030000001')
+        start = timezone.make_aware(datetime(2024, 3, 1, 9, 30))
+        created = Message.objects.create(sender=sender, content='first', timestamp=start)
+        bulk = Message.objects.bulk_create(
+            Message(sender=sender, content=f'later {minute}', timestamp=start + timedelta(minutes=minute))
+            for minute in range(1, 50)
+        )
+
+        ids = [created.id] + [message.id for message in bulk]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(
+            list(Message.objects.order_by('id').values_list('id', flat=True)),
+            list(Message.objects.order_by('timestamp').values_list('id', flat=True))
+        )
+
+    def test_counter_overflow_carries_into_the_timestamp(self):
+        start = timezone.make_aware(datetime(2024, 3, 2, 9, 30))
+        # More than the 4096 a millisecond's counter can hold
+        ids = [message_id(start) for _ in range(5000)]
+
+        self.assertEqual(len(set(ids)), 5000)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(id_timestamp(ids[0]), start)
+        self.assertEqual(id_timestamp(ids[-1]), start + timedelta(milliseconds=1))
+        # A message of the millisecond carried into still sorts after them
+        self.assertGreater(message_id(start + timedelta(milliseconds=1)), ids[-1])
+
+    def test_rekey_keeps_the_interaction_cursor(self):
+        members = User.objects.bulk_create([
+            User(phone_number='+2348030000001'), User(phone_number='+2348030000002')
+        ])
+        start = timezone.make_aware(datetime(2024, 3, 1, 9, 30))
+        messages = []
+        for index in range(20):
+            # Two messages a minute, so the cursor ends on a timestamp shared by two ids
+            timestamp = start + timedelta(minutes=index // 2)
+            messages.append(Message(
+                id=uuid.uuid4(), sender=members[index % 2], content='hello', timestamp=timestamp,
+                **derived_message_fields(timestamp, 'hello', 'TEXT')
+            ))
+        Message.objects.bulk_create(messages)
+        graph = InteractionGraphService()
+        graph.update()
+        edges = set(Interaction.objects.values_list('source_id', 'target_id', 'reply_count'))
+
+        time_ordered_ids_migration.rekey_messages(apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual({rekeyed.version for rekeyed in Message.objects.values_list('id', flat=True)}, {7})
+        self.assertEqual(graph.update(), 0)
+        self.assertEqual(set(Interaction.objects.values_list('source_id', 'target_id', 'reply_count')), edges)
+
+    def test_benchmark_shows_unfragmented_primary_key(self):
+        results = MessageIdBenchmark(size=20000).run()
+
+        self.assertEqual(set(results), {'uuid4', 'uuid7'})
+        self.assertLess(results['uuid7']['pk_index_fragmentation'], 0.05)
+        self.assertGreater(results['uuid4']['pk_index_fragmentation'], 0.2)
+
+
+class ChatImportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.generator = SyntheticChatGenerator(2500, user_count=25, seed=11)
+        self.chat_path = os.path.join(directory.name, 'chat.txt')
+        self.generator.write_file(self.chat_path)
+
+    def test_parser_interns_senders(self):
+        parser = WhatsAppMessageParser()
+        parsed = [message for batch in parser.process_chat_file(self.chat_path) for message in batch]
+
+        self.assertEqual(len(parsed), 2500)
+        self.assertEqual(len(set(parser.senders.phone_numbers)), len(parser.senders))
+        self.assertEqual(parser.senders.intern('+2348030000001'), parser.senders.intern('+234 803 000 0001'))
+        self.assertEqual(
+            [parser.senders[message.sender] for message in parsed],
+            [normalize_phone_number(line.split(' - ', 1)[1].split(':', 1)[0]) for line in self.generator.lines()]
+        )
+
+    def test_import_resolves_each_sender_once(self):
+        def user_queries(context):
+            return [
+                query['sql'] for query in context.captured_queries
+                if query['sql'].startswith(('SELECT "users_user"."phone_number" FROM', 'INSERT INTO "users_user"'))
+            ]
+
+        service = ChatImportService()
+        with CaptureQueriesContext(connection) as context:
+            result = service.import_chat(self.chat_path)
+
+        # One lookup and one insert, in the first batch only: every sender appears in it
+        self.assertEqual(len(user_queries(context)), 2)
+        self.assertEqual(result, {'total_messages': 2500, 'total_users': len(service.parser.senders),
+                                  'invalid_senders': 0})
+        self.assertEqual(
+            set(Message.objects.values_list('sender_id', flat=True)),
+            set(service.parser.senders.phone_numbers)
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            ChatImportService().import_chat(self.chat_path)
+        self.assertEqual(len(user_queries(context)), 1)
+        self.assertEqual(User.objects.count(), len(service.parser.senders))
+        self.assertEqual(Message.objects.count(), 5000)
+
+    def test_older_history_updates_sessions_once_per_import(self):
+        ChatImportService().import_chat(self.chat_path)
+        older_path = os.path.join(os.path.dirname(self.chat_path), 'older.txt')
+        SyntheticChatGenerator(2500, user_count=25, seed=12, start=datetime(2019, 1, 1, 8, 0)).write_file(older_path)
+
+        with mock.patch.object(SessionService, 'update_from', autospec=True,
+                               side_effect=SessionService.update_from) as update_from, \
+                mock.patch.object(InteractionGraphService, 'rebuild', autospec=True,
+                                  side_effect=InteractionGraphService.rebuild) as rebuild:
+            ChatImportService().import_chat(older_path)
+        # Every one of the three batches is older than the stored history
+        self.assertEqual((update_from.call_count, rebuild.call_count), (1, 1))
+
+        sessions = list(ConversationSession.objects.order_by('started_at').values_list(
+            'started_at', 'ended_at', 'starter_id', 'message_count'
+        ))
+        edges = set(Interaction.objects.values_list('source_id', 'target_id', 'reply_count'))
+        SessionService().rebuild()
+        InteractionGraphService().rebuild()
+        self.assertEqual(sessions, list(ConversationSession.objects.order_by('started_at').values_list(
+            'started_at', 'ended_at', 'starter_id', 'message_count'
+        )))
+        self.assertEqual(edges, set(Interaction.objects.values_list('source_id', 'target_id', 'reply_count')))
+
+
+class DerivedFieldTests(TestCase):
+    # Sunday 00:30 in Lagos is still Saturday 23:30 in UTC
+    LINES = [
+        '3/3/24, 00:30 - +234 803 000 0001: Hello there',
+        '3/3/24, 00:31 - +234 803 000 0001: image omitted',
+    ]
+    EXPECTED = [
+        ('Hello there', 'TEXT', 11, date(2024, 3, 3), 0, 1, False),
+        ('image omitted', 'IMAGE', 13, date(2024, 3, 3), 0, 1, True),
+    ]
+    FIELDS = ('content', 'message_type', 'content_length', 'local_date', 'local_hour', 'weekday', 'is_media')
+
+    def stored(self) -> list:
+        return list(Message.objects.order_by('timestamp').values_list(*self.FIELDS))
+
+    def test_parser_derives_local_fields(self):
+        parser = WhatsAppMessageParser()
+        parsed = [parser.parse_line(line) for line in self.LINES]
+        self.assertEqual(parsed[0].timestamp.astimezone(dt_timezone.utc), datetime(2024, 3, 2, 23, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual([tuple(getattr(message, field) for field in self.FIELDS) for message in parsed], self.EXPECTED)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'chat.txt')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('\n'.join(self.LINES) + '\n')
+            ChatImportService().import_chat(path)
+        self.assertEqual(self.stored(), self.EXPECTED)
+
+    def test_parser_counts_senders_that_are_not_phone_numbers(self):
+        parser = WhatsAppMessageParser()
+        with self.assertLogs('core.parsers.whatsapp_parser', 'WARNING') as logs:
+            self.assertIsNone(parser.parse_line('3/3/24, 00:32 - +0 000 000 0: Hello there'))
+        self.assertEqual(parser.invalid_senders, 1)
+        self.assertIn("'+0 000 000 0'", logs.output[0])
+        self.assertIsNotNone(parser.parse_line(self.LINES[0]))
+        self.assertEqual(parser.invalid_senders, 1)
+
+    def test_migration_backfills_local_fields(self):
+        user = User.objects.create(phone_number='+2348030000001')
+        for minute, (content, message_type, *_) in enumerate(self.EXPECTED, start=30):
+            Message.objects.create(sender=user, content=content, message_type=message_type,
+                                   timestamp=datetime(2024, 3, 2, 23, minute, tzinfo=dt_timezone.utc))
+        Message.objects.update(content_length=0, local_date=None, local_hour=None, weekday=None, is_media=False)
+
+        derived_columns_migration.backfill_derived_columns(apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(self.stored(), self.EXPECTED)
+
+    def test_save_rederives_edited_fields(self):
+        user = User.objects.create(phone_number='+2348030000001')
+        message = Message.objects.create(sender=user, content='Hello there',
+                                         timestamp=datetime(2024, 3, 2, 23, 30, tzinfo=dt_timezone.utc))
+        message.content, message.message_type = 'image omitted', 'IMAGE'
+        message.save(update_fields=['content', 'message_type'])
+        message.timestamp = datetime(2024, 3, 4, 9, 0, tzinfo=dt_timezone.utc)
+        message.save()
+
+        self.assertEqual(self.stored(), [('image omitted', 'IMAGE', 13, date(2024, 3, 4), 10, 2, True)])
+
+
+class MessageBrowsingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(phone_number=f'+234803000000{index}') for index in range(3)]
+        start = timezone.make_aware(datetime(2024, 3, 1, 22, 0))
+        for index in range(60):
+            Message.objects.create(
+                sender=cls.users[index % 3],
+                content=f'message {index}',
+                # Groups of three share a timestamp, so ties need the id to order them
+                timestamp=start + timedelta(hours=index // 3),
+                message_type='IMAGE' if index % 4 == 0 else 'TEXT'
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def expected(self, **filters) -> list:
+        return [str(message_id) for message_id in Message.objects.filter(**filters).order_by(
+            '-timestamp', '-id'
+        ).values_list('id', flat=True)]
+
+    def walk(self, url: str, link: str = 'next') -> list:
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([message['id'] for message in response.json()['results']])
+            url = response.json()[link]
+        return pages
+
+    def test_pages_walk_forward_and_back(self):
+        pages = self.walk('/api/messages/?page_size=7')
+        self.assertEqual([message_id for page in pages for message_id in page], self.expected())
+        self.assertEqual([len(page) for page in pages], [7] * 8 + [4])
+
+        last = self.client.get('/api/messages/?page_size=7')
+        for _ in range(len(pages) - 1):
+            last = self.client.get(last.json()['next'])
+        self.assertIsNone(last.json()['next'])
+        back = self.walk(last.json()['previous'], link='previous')
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_filters(self):
+        day = date(2024, 3, 2)
+        for query, filters in (
+            (f'sender={quote(self.users[1].phone_number)}', {'sender': self.users[1]}),
+            # Any spelling of the number finds the sender
+            (f"sender={quote('0803 000 0001')}", {'sender': self.users[1]}),
+            ('type=IMAGE', {'message_type': 'IMAGE'}),
+            (f'start_date={day}&end_date={day}', {'local_date': day}),
+            (f'start_date={day}&type=TEXT', {'local_date__gte': day, 'message_type': 'TEXT'}),
+        ):
+            with self.subTest(query):
+                pages = self.walk(f'/api/messages/?page_size=5&{query}')
+                self.assertEqual([message_id for page in pages for message_id in page], self.expected(**filters))
+        self.assertEqual(self.client.get('/api/messages/?sender=not-a-number').status_code, 400)
+
+        message = Message.objects.order_by('-timestamp', '-id').first()
+        self.assertEqual(self.client.get('/api/messages/?page_size=1').json()['results'], [{
+            'id': str(message.id),
+            'sender': message.sender_id,
+            'timestamp': timezone.localtime(message.timestamp).isoformat(),
+            'message_type': message.message_type,
+            'content': message.content,
+        }])
+
+    def test_deep_pages_seek_on_an_index_without_counting(self):
+        for query in ('', f'sender={quote(self.users[2].phone_number)}', 'type=TEXT'):
+            with self.subTest(query):
+                url = self.client.get(f'/api/messages/?page_size=3&{query}').json()['next']
+                for _ in range(4):
+                    url = self.client.get(url).json()['next']
+
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                page_queries = [query for query in queries if 'whatsapp_messages_message' in query['sql']]
+                self.assertEqual(len(page_queries), 1)
+                self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {page_queries[0]['sql']}")
+                    plan = ' '.join(row[3] for row in cursor.fetchall())
+                self.assertIn('USING INDEX', plan)
+                self.assertIn('timestamp<?', plan)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/messages/?cursor=bm9wZQ==').status_code, 404)
+        self.assertEqual(self.client.get('/api/messages/?type=STICKER').status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/messages/?start_date=2024-03-02&end_date=2024-03-01').status_code, 400
+        )
+        self.assertEqual(APIClient().get('/api/messages/').status_code, 401)
+
+
+class MessagePartitionTests(TransactionTestCase):
+    """A chat crossing from 2023 into 2024, with 2023 archived halfway through each test."""
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        overrides = self.settings(MESSAGE_ARCHIVE_DIR=archive_dir.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(partitions.unregister_archive, 2023)
+
+        chat_path = os.path.join(archive_dir.name, 'chat.txt')
+        SyntheticChatGenerator(
+            1200, user_count=20, messages_per_day=300, seed=5, start=datetime(2023, 12, 29, 8, 0)
+        ).write_file(chat_path)
+        ChatImportService().import_chat(chat_path)
+
+        self.service = AnalyticsService()
+        self.user = User.objects.order_by('phone_number').first()
+        self.both_years = (datetime(2023, 1, 1), datetime(2024, 12, 31, 23, 59, 59))
+        self.only_2023 = (datetime(2023, 1, 1), datetime(2023, 12, 31, 23, 59, 59))
+        self.only_2024 = (datetime(2024, 1, 1), datetime(2024, 12, 31, 23, 59, 59))
+
+    def archive_2023(self) -> int:
+        archived = partitions.archive_year(2023)
+        # The test runner only knows the aliases that existed at start-up
+        databases = type(self).databases
+        type(self).databases = databases | {'messages_2023'}
+        self.addCleanup(setattr, type(self), 'databases', databases)
+        return archived
+
+    def results(self, date_range):
+        metrics = self.service.calculate_group_metrics(date_range)
+        return {
+            'group': {**metrics, 'top_users': sorted(
+                (row['sender__phone_number'], row['message_count']) for row in metrics['top_users']
+            )},
+            'hourly': self.service.calculate_group_metrics(date_range, 'hour')['daily_stats'],
+            'user': self.service.calculate_user_metrics(self.user, date_range),
+            'patterns': self.service.get_activity_patterns(date_range),
+        }
+
+    def test_archived_year_reads_match_the_hot_table(self):
+        before = {name: self.results(date_range) for name, date_range in (
+            ('both', self.both_years), ('2023', self.only_2023), ('2024', self.only_2024)
+        )}
+        in_2023 = Message.objects.filter(local_date__year=2023).count()
+        self.assertGreater(in_2023, 0)
+
+        self.assertEqual(self.archive_2023(), in_2023)
+
+        self.assertFalse(Message.objects.filter(local_date__year=2023).exists())
+        self.assertEqual(partitions.archived_years(), [2023])
+        self.assertEqual(Message.objects.using('messages_2023').count(), in_2023)
+        for name, date_range in (('both', self.both_years), ('2023', self.only_2023), ('2024', self.only_2024)):
+            with self.subTest(range=name):
+                self.assertEqual(self.results(date_range), before[name])
+
+    @override_settings(ANALYTICS_QUERY_WORKERS=1)
+    def test_reads_touch_only_overlapping_partitions(self):
+        self.archive_2023()
+        archive = connections['messages_2023']
+
+        with CaptureQueriesContext(archive) as archived, CaptureQueriesContext(connection) as hot:
+            self.service.get_activity_patterns(self.only_2024)
+        self.assertEqual(len(archived), 0)
+        self.assertTrue(any('whatsapp_messages_message' in query['sql'] for query in hot))
+
+        with CaptureQueriesContext(archive) as archived, CaptureQueriesContext(connection) as hot:
+            self.service.get_activity_patterns(self.only_2023)
+        self.assertGreater(len(archived), 0)
+        self.assertFalse(any('whatsapp_messages_message' in query['sql'] for query in hot))
+
+    def test_archive_is_read_only_and_indexed(self):
+        self.archive_2023()
+
+        with self.assertRaises(OperationalError):
+            Message.objects.using('messages_2023').filter(local_date__year=2023).update(content='')
+        index_query = (
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            f"AND tbl_name = '{partitions.TABLE}'"
+        )
+        with sqlite3.connect(partitions.archive_path(2023)) as archive:
+            archived = {row[0] for row in archive.execute(index_query)}
+        with connection.cursor() as cursor:
+            cursor.execute(index_query)
+            self.assertEqual(archived, {row[0] for row in cursor.fetchall()})
+
+    def test_archived_years_take_no_new_messages(self):
+        self.archive_2023()
+        service = ChatImportService()
+        batch = [service.parser.parse_line('12/31/23, 10:00 - +234 803 000 0001: late message')]
+        with self.assertRaises(partitions.ArchivedYearError):
+            service.process_messages_batch(batch)
+        with self.assertRaises(partitions.ArchivedYearError):
+            partitions.archive_year(date.today().year)
+
+    def test_browsing_spans_archived_years(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        def browse(query=''):
+            ids, url = [], f'/api/messages/?page_size=250{query}'
+            while url:
+                body = client.get(url).json()
+                ids.extend(message['id'] for message in body['results'])
+                url = body['next']
+            return ids
+
+        before = browse(), browse('&end_date=2023-12-31'), browse('&start_date=2024-01-01')
+        self.archive_2023()
+        self.assertEqual((browse(), browse('&end_date=2023-12-31'), browse('&start_date=2024-01-01')), before)
+
+    def test_rebuilds_read_archived_years(self):
+        sessions = ConversationSession.objects.count()
+        days = set(GroupStatistics.objects.values_list('date', 'total_messages'))
+        self.archive_2023()
+
+        self.assertEqual(SessionService().rebuild(), sessions)
+        DailyRollupService().rebuild()
+        self.assertEqual(set(GroupStatistics.objects.values_list('date', 'total_messages')), days)
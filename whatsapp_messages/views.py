@@ -1,3 +1,59 @@
-from django.shortcuts import render
+from datetime import datetime, time, timedelta
+from rest_framework import status, viewsets
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema, OpenApiResponse
+from analytics.encoders import encode
+from whatsapp_analytics.db_router import ReplicaReadMixin
+from .models import Message
+from .pagination import KeysetPagination
+from .serializers import MessageFilterSerializer, MessageSerializer
 
-# Create your views here.
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class MessageViewSet(ReplicaReadMixin, viewsets.GenericViewSet):
+    permission_classes = [IsAuthenticated]
+    serializer_class = MessageSerializer
+    pagination_class = KeysetPagination
+    queryset = Message.objects.only('id', 'sender', 'timestamp', 'message_type', 'content')
+
+    @extend_schema(
+        tags=['messages'],
+        parameters=[MessageFilterSerializer],
+        responses={
+            200: MessageSerializer(many=True),
+            400: OpenApiResponse(description="Invalid filter"),
+            404: OpenApiResponse(description="Invalid cursor")
+        },
+        description=(
+            "Browse the group history, newest first. Follow the next and previous links to page; "
+            "every page costs the same however deep it is."
+        ),
+    )
+    def list(self, request):
+        """List messages with keyset pagination on (timestamp, id)."""
+        filters = MessageFilterSerializer(data=request.query_params)
+        if not filters.is_valid():
+            return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = filters.validated_data
+
+        # Dates become timestamp bounds so the timestamp indexes serve every filter combination
+        queryset = self.get_queryset()
+        if 'sender' in params:
+            queryset = queryset.filter(sender_id=params['sender'])
+        if 'type' in params:
+            queryset = queryset.filter(message_type=params['type'])
+        first_day, last_day = params.get('start_date'), params.get('end_date')
+        if first_day:
+            queryset = queryset.filter(timestamp__gte=_local_midnight(first_day))
+        if last_day:
+            queryset = queryset.filter(timestamp__lt=_local_midnight(last_day + timedelta(days=1)))
+
+        page = self.paginator.paginate_queryset(
+            queryset, request, view=self, first_day=first_day, last_day=last_day
+        )
+        return self.get_paginated_response(encode(MessageSerializer, page, many=True))